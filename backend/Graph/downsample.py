@@ -0,0 +1,105 @@
+from typing import Tuple
+import numpy as np
+
+DOWNSAMPLE_MODES = ("lttb", "min-max", "avg")
+# Smallest max_points that leaves LTTB three points per channel
+MIN_POINTS = 6
+
+Series = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (ts_ms, h, t); NaN marks a missing value
+
+
+def _time_buckets(ts: np.ndarray, n_buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Equal-width time buckets; returns each sample's bucket and each bucket's first index
+    span = max(int(ts[-1] - ts[0]), 1)
+    bucket = ((ts - ts[0]) * n_buckets // (span + 1)).astype(np.int64)
+    _, starts = np.unique(bucket, return_index=True)
+    return bucket, starts
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: keep the point of each bucket that forms
+    # the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.unique([0, n - 1])  # No room for interior buckets: keep the endpoints
+
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    x = x.astype(np.float64)
+    sums_x = np.concatenate(([0.0], np.cumsum(x)))
+    sums_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        count = max(next_hi - next_lo, 1)
+        avg_x = (sums_x[next_hi] - sums_x[next_lo]) / count
+        avg_y = (sums_y[next_hi] - sums_y[next_lo]) / count
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        picked[i + 1] = prev
+    return picked
+
+
+def lttb(series: Series, max_points: int) -> Series:
+    ts, h, t = series
+    # Split the budget between both channels and keep the union of their picks;
+    # both share the endpoints, so the union never exceeds max_points
+    keep = np.union1d(lttb_indices(ts, h, max_points // 2), lttb_indices(ts, t, max_points - max_points // 2))
+    return ts[keep], h[keep], t[keep]
+
+
+def min_max(series: Series, max_points: int) -> Series:
+    ts, h, t = series
+    # Keep the extreme samples of each channel in every bucket
+    bucket, _ = _time_buckets(ts, max(max_points // 4, 1))
+    picks = []
+    for values in (h, t):
+        low = np.where(np.isnan(values), np.inf, values)
+        high = np.where(np.isnan(values), -np.inf, values)
+        order_low = np.lexsort((low, bucket))
+        order_high = np.lexsort((-high, bucket))
+        first = np.concatenate(([True], bucket[order_low][1:] != bucket[order_low][:-1]))
+        picks.append(order_low[first])
+        picks.append(order_high[first])
+    keep = np.unique(np.concatenate(picks))
+    if len(keep) > max_points:
+        # Fewer than four points per bucket requested: thin evenly to the limit
+        keep = keep[np.linspace(0, len(keep) - 1, max_points).astype(np.int64)]
+    return ts[keep], h[keep], t[keep]
+
+
+def _nanmean_reduce(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def bucket_average(series: Series, max_points: int) -> Series:
+    ts, h, t = series
+    _, starts = _time_buckets(ts, max_points)
+    counts = np.diff(np.append(starts, len(ts)))
+    mean_ts = ts[0] + np.add.reduceat(ts - ts[0], starts) // counts
+    return mean_ts, np.round(_nanmean_reduce(h, starts), 2), np.round(_nanmean_reduce(t, starts), 2)
+
+
+def downsample(series: Series, max_points: int, mode: str = "lttb") -> Series:
+    if mode not in DOWNSAMPLE_MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    if max_points <= 0 or len(series[0]) <= max_points:
+        return series
+    if mode == "lttb":
+        return lttb(series, max_points)
+    if mode == "min-max":
+        return min_max(series, max_points)
+    return bucket_average(series, max_points)
@@ -0,0 +1,76 @@
+"""Wire encodings of a graph series (epoch ms, humidity, temperature).
+
+``json`` keeps the ``[time, humidity, temperature]`` rows with site-local ISO
+timestamps.  ``msgpack`` carries the columns as ``ts`` (epoch ms), ``h`` and
+``t`` lists.  ``binary`` is a typed-array frame a browser can view without
+parsing:
+
+    0   4 bytes   magic b"HGS1"
+    4   uint32    header length N (little-endian)
+    8   N bytes   JSON header, space-padded to a multiple of 8: the message
+                  fields plus count, scale, missing and columns
+    8+N int64[count] ts, then int16[count] h, then int16[count] t
+
+Values are ``raw / scale``; ``missing`` (-32768) marks readings without a
+value.  ``scale`` is 1 for whole-number readings and 10 for averages.
+"""
+import struct
+from typing import Tuple, Union
+import numpy as np
+from backend.broadcast.encoding import dumps, encode, msgpack, JSON, MSGPACK, BINARY
+from backend.Graph.timeseries import graph_rows, to_optional_list
+
+GRAPH_FORMATS = (JSON, MSGPACK, BINARY)
+GRAPH_HEADER = ['Time', 'Humidity', 'Temperature']
+FRAME_MAGIC = b"HGS1"
+FRAME_COLUMNS = ["ts:int64", "h:int16", "t:int16"]
+INT16_MAX = int(np.iinfo(np.int16).max)
+INT16_MISSING = int(np.iinfo(np.int16).min)
+
+
+def series_scale(h: np.ndarray, t: np.ndarray) -> int:
+    # 1 when every value is whole, 10 (one decimal) when that still fits int16
+    values = np.concatenate([h, t])
+    values = values[~np.isnan(values)]
+    if not len(values) or np.array_equal(values, np.round(values)):
+        return 1
+    return 10 if np.abs(values).max() * 10 <= INT16_MAX else 1
+
+
+def to_int16(values: np.ndarray, scale: int) -> np.ndarray:
+    missing = np.isnan(values)
+    scaled = np.clip(np.round(np.where(missing, 0.0, values) * scale), -INT16_MAX, INT16_MAX).astype("<i2")
+    scaled[missing] = INT16_MISSING
+    return scaled
+
+
+def series_frame(meta: dict, ts: np.ndarray, h: np.ndarray, t: np.ndarray) -> bytes:
+    scale = series_scale(h, t)
+    header = dumps({**meta, "count": len(ts), "scale": scale, "missing": INT16_MISSING, "columns": FRAME_COLUMNS})
+    header += b" " * (-len(header) % 8)  # Keeps the int64 column 8-byte aligned
+    return b"".join((
+        FRAME_MAGIC, struct.pack("<I", len(header)), header,
+        np.asarray(ts, dtype="<i8").tobytes(), to_int16(h, scale).tobytes(), to_int16(t, scale).tobytes(),
+    ))
+
+
+def encode_series(meta: dict, series: Tuple[np.ndarray, np.ndarray, np.ndarray], fmt: str, header_row: bool = True) -> bytes:
+    ts, h, t = series
+    if fmt == BINARY:
+        return series_frame(meta, ts, h, t)
+    if fmt == MSGPACK:
+        return msgpack.packb({**meta, "ts": np.asarray(ts, dtype=np.int64).tolist(),
+                              "h": to_optional_list(h), "t": to_optional_list(t)}, use_bin_type=True)
+    rows = graph_rows(ts, h, t)
+    if header_row:
+        rows.insert(0, GRAPH_HEADER)
+    return dumps({**meta, "data": rows})
+
+
+def encode_graph_message(message: dict, fmt: str) -> Union[str, bytes]:
+    # BroadcastHub encoder: snapshot/delta messages carry their points as a "series" tuple
+    if "series" not in message:
+        return encode(message, MSGPACK if fmt == MSGPACK else JSON)  # Binary clients get other messages as JSON text
+    meta = {key: value for key, value in message.items() if key != "series"}
+    frame = encode_series(meta, message["series"], fmt, header_row=message.get("type") == "snapshot")
+    return frame.decode("utf-8") if fmt == JSON else frame
@@ -1,41 +1,52 @@
-from fastapi import FastAPI, WebSocket, APIRouter, Query
+from fastapi import FastAPI, WebSocket, APIRouter, Query, Request
 from typing import List, Optional, Dict
 from datetime import datetime, date ,timedelta ,timezone
-import pytz
-from configuration.database import Board_1, Board_2, Board_3
+from configuration.database import readings
+from configuration.shift_day import shift_day, to_utc_naive, utc_now, SITE_TIMEZONE
 from collections import defaultdict
+from backend.Graph.timeseries import SeriesStore, to_epoch_ms
+from backend.Graph.frames import encode_series, encode_graph_message, GRAPH_FORMATS
+from backend.Graph.downsample import downsample, DOWNSAMPLE_MODES, MIN_POINTS
+from backend.rollup.rollups import update_rollups, choose_granularity, rollup_series
+from backend.Settings.registry import unit_registry
+from backend.broadcast.hub import BroadcastHub
+from backend.broadcast.bus import message_bus, BROADCAST_BUS
+from backend.broadcast.encoding import negotiate, MEDIA_TYPES
+from backend.metrics.registry import timed, INGEST_READINGS
+from backend.retention.archive import archive_store
+from backend.cache.response_cache import response_cache, cached_response, unit_tag, window_closed
+import asyncio
+import numpy as np
+import json
+import logging
+import os
 
 app = FastAPI()
 GraphRouter = APIRouter()
+logger = logging.getLogger("my_logger")
 
-# Map unit_IDs to their corresponding collections
-BOARD_COLLECTIONS = {
-    1: Board_1,
-    2: Board_2,
-    3: Board_3,
-}
+# Graph WebSocket subscribers per unit and a bounded recent history per unit.
+# Readings stored by other workers only reach this buffer over a shared bus,
+# so with the local bus it is used only when the deployment declares a single
+# worker (the worker count itself is not visible to the process).
+graph_hub = BroadcastHub("graph", encoder=encode_graph_message)
+series_store = SeriesStore(
+    capacity=int(os.getenv("GRAPH_BUFFER_CAPACITY", "20000")),
+    horizon_ms=int(float(os.getenv("GRAPH_BUFFER_HORIZON_HOURS", "26")) * 3600 * 1000),
+    complete=BROADCAST_BUS != "local" or os.getenv("GRAPH_BUFFER_SINGLE_WORKER", "0") == "1",
+)
 
-# Define the IST timezone
-IST = pytz.timezone('Asia/Kolkata')
-UTC = pytz.utc
-
-# Store connected clients and data history
-clients = defaultdict(list)
-data_history = defaultdict(list)  # Store history per unit
-
-# Function to update the collection and broadcast the latest data
-async def update_graph_collection(
+# Build the history document stored for a single reading
+def build_log_entry(
     unit_ID: int, t: Optional[int], h: Optional[int], w: Optional[int],
-    eb: Optional[int], ups: Optional[int], x: Optional[int], y: Optional[int]
+    eb: Optional[int], ups: Optional[int], x: Optional[int], y: Optional[int],
+    created_at: Optional[datetime] = None
 ):
-    if unit_ID not in BOARD_COLLECTIONS:
-        raise ValueError(f"Invalid unit_ID: {unit_ID}")
-
-    collection = BOARD_COLLECTIONS[unit_ID]
-    now_ist = datetime.now(IST)  # Get current time in IST
+    # Use the reading's own timestamp when the board sent one, else now;
+    # stored as naive UTC like every other timestamp
+    created_utc = utc_now() if created_at is None else to_utc_naive(created_at)
 
-    # Create the log entry with IST time
-    log_entry = {
+    return {
         "unit_ID": unit_ID,
         "t": t,
         "h": h,
@@ -44,91 +55,208 @@ async def update_graph_collection(
         "ups": ups,
         "x": x,
         "y": y,
-        "created_at": now_ist.replace(tzinfo=None),  # Remove timezone info
-        "updated_at": now_ist.replace(tzinfo=None),  # Remove timezone info
+        "created_at": created_utc,
+        "updated_at": created_utc,
     }
 
+# Function to update the collection and broadcast the latest data
+@timed
+async def update_graph_collection(
+    unit_ID: int, t: Optional[int], h: Optional[int], w: Optional[int],
+    eb: Optional[int], ups: Optional[int], x: Optional[int], y: Optional[int]
+):
+    if not await unit_registry.exists(unit_ID):
+        raise ValueError(f"Invalid unit_ID: {unit_ID}")
+
+    log_entry = build_log_entry(unit_ID, t, h, w, eb, ups, x, y)
+
     # Insert the log entry into the database
-    result = collection.insert_one(log_entry)
+    result = await readings.insert_one(log_entry)
+    INGEST_READINGS.labels(unit_ID).inc()
     
-    # Store the entry in data history for future broadcasts
-    data_history[unit_ID].append(log_entry)
+    # Keep the entry in the in-memory buffer for recent-window reads
+    series_store.append(log_entry)
 
-    # Broadcast the latest graph data to clients
-    await broadcast_graph_data(unit_ID)
+    # Fold the reading into the minute/hour/day rollups
+    await update_rollups([log_entry])
 
-    return {"status": "success", "inserted_id": str(result.inserted_id)}
+    # Cached graph responses whose window holds the new reading are stale now
+    response_cache.invalidate(unit_tag(unit_ID), [to_epoch_ms(log_entry["created_at"])])
 
+    # Push the new point to connected graph clients, here and on other workers
+    await broadcast_graph_data(unit_ID, [log_entry])
+    await message_bus.publish("readings", {"unit_ID": unit_ID, "entries": [log_entry]})
 
-async def broadcast_graph_data(unit_ID: int):
-    if unit_ID not in clients:
-        return  # No clients connected for this unit_ID
+    return {"status": "success", "inserted_id": str(result.inserted_id)}
 
-    collection = BOARD_COLLECTIONS[unit_ID]
 
-    # Get the current time in IST
-    now = datetime.now(IST)
+# Per-unit sequence number of the last delta pushed to graph clients
+graph_seq = defaultdict(int)
+# Start of the daily window each unit's clients were last snapshotted for
+graph_windows: Dict[int, datetime] = {}
 
-    # Calculate the start and end times (8:30 AM to next day 8:29:59 AM)
-    start_of_window = now.replace(hour=14, minute=00, second=0, microsecond=0)
-    end_of_window = (start_of_window + timedelta(days=1)).replace(hour=13, minute=29, second=59, microsecond=999999)
+def entries_series(entries: List[dict]):
+    # (ts_ms, h, t) arrays of freshly stored readings, NaN for missing values
+    ts = np.array([to_epoch_ms(entry["created_at"]) for entry in entries], dtype=np.int64)
+    h = np.array([entry.get("h") for entry in entries], dtype=np.float64)
+    t = np.array([entry.get("t") for entry in entries], dtype=np.float64)
+    return ts, h, t
 
-    # Convert to UTC before querying MongoDB
-    start_of_window_utc = start_of_window.astimezone(timezone.utc)
-    end_of_window_utc = end_of_window.astimezone(timezone.utc)
+async def fetch_graph_series(unit_ID: int, start_dt: datetime, end_dt: datetime):
+    # Recent windows are answered from the in-memory buffer
+    if series_store.covers(unit_ID, start_dt):
+        return series_store.graph_series(unit_ID, start_dt, end_dt)
 
-    # Fetch data for the given window
-    data = collection.find({
+    # Fetch only the graphed fields for the given window
+    data = readings.find({
+        "unit_ID": unit_ID,
         "created_at": {
-            "$gte": start_of_window_utc,
-            "$lt": end_of_window_utc
+            "$gte": start_dt,
+            "$lt": end_dt
         }
-    }).sort("created_at", 1)
+    }, {"_id": 0, "created_at": 1, "h": 1, "t": 1}).sort("created_at", 1).batch_size(10000)
 
-    response = [['Time', 'Humidity', 'Temperature']]
-    
-    # Prepare response with IST-converted timestamps
-    for entry in data:
-        time = entry["created_at"].astimezone(IST).isoformat()
-        humidity = entry.get("h", 0)
-        temperature = entry.get("t", 0)
-        response.append([time, humidity, temperature])
-
-    # Send the filtered graph data to all connected clients
-    message = {"data": response}
-    for client in clients[unit_ID]:
-        await client.send_json(message)
+    times, humidities, temperatures = [], [], []
+    async for entry in data:
+        times.append(to_epoch_ms(entry["created_at"]))
+        humidities.append(entry.get("h"))
+        temperatures.append(entry.get("t"))
+
+    series = (
+        np.array(times, dtype=np.int64),
+        np.array(humidities, dtype=np.float64),
+        np.array(temperatures, dtype=np.float64),
+    )
+
+    # Readings past their retention are read from the archive files
+    archived = await asyncio.get_running_loop().run_in_executor(None, archive_store.series, unit_ID, start_dt, end_dt)
+    if archived is None:
+        return series
+    ts, h, t = (np.concatenate([old, new]) for old, new in zip(archived, series))
+    order = np.argsort(ts, kind="stable")
+    return ts[order], h[order], t[order]
+
+async def fetch_graph_window(unit_ID: int, start_dt: datetime, end_dt: datetime, max_points: int = 0, mode: str = "lttb"):
+    # Downsampled ranges read the coarsest rollup with enough resolution
+    granularity = choose_granularity(start_dt, end_dt, max_points) if max_points else None
+    if granularity and not series_store.covers(unit_ID, start_dt):
+        series = await rollup_series(unit_ID, start_dt, end_dt, granularity, "min-max" if mode == "min-max" else "avg")
+    else:
+        series = await fetch_graph_series(unit_ID, start_dt, end_dt)
+    if max_points:
+        series = downsample(series, max_points, mode)
+    # Encoded per client format (site-local rows for JSON) by backend.Graph.frames
+    return series
+
+async def build_graph_snapshot(unit_ID: int):
+    # Current shift day, [start, end) in UTC
+    start_of_window, end_of_window = shift_day.current()
+
+    return {
+        "type": "snapshot",
+        "unit_ID": unit_ID,
+        "seq": graph_seq[unit_ID],
+        "window": [start_of_window.astimezone(SITE_TIMEZONE).isoformat(), end_of_window.astimezone(SITE_TIMEZONE).isoformat()],
+        "series": await fetch_graph_window(unit_ID, start_of_window, end_of_window),
+    }
+
+async def send_to_graph_clients(unit_ID: int, message: dict, key=None):
+    # Encoded once per wire format and queued per client; never waits on a slow socket
+    graph_hub.publish(unit_ID, message, key)
+
+@timed
+async def broadcast_graph_data(unit_ID: int, entries: List[dict]):
+    if not graph_hub.has_subscribers(unit_ID):
+        return  # No clients connected for this unit_ID
+
+    # A new daily window starts from a fresh snapshot instead of a delta
+    start_of_window, _ = shift_day.current()
+    if graph_windows.get(unit_ID) != start_of_window:
+        graph_windows[unit_ID] = start_of_window
+        await send_to_graph_clients(unit_ID, await build_graph_snapshot(unit_ID), key="snapshot")
+        return
+
+    # Push only the new points; clients resync when they see a gap in seq
+    graph_seq[unit_ID] += 1
+    message = {
+        "type": "delta",
+        "unit_ID": unit_ID,
+        "seq": graph_seq[unit_ID],
+        "series": entries_series(entries),
+    }
+    await send_to_graph_clients(unit_ID, message)
+
+# Readings stored by another worker: buffer them and push them to local clients
+async def receive_readings(payload: dict):
+    series_store.extend(payload["entries"])
+    response_cache.invalidate(unit_tag(payload["unit_ID"]), [to_epoch_ms(entry["created_at"]) for entry in payload["entries"]])
+    await broadcast_graph_data(payload["unit_ID"], payload["entries"])
+
+message_bus.subscribe("readings", receive_readings)
 
 # WebSocket endpoint to handle real-time data
+# Protocol: one "snapshot" message on connect, then "delta" messages carrying
+# only new points with a per-unit seq.  A client that misses a seq sends
+# {"type": "resync"} and receives a fresh snapshot.  ?format=msgpack or
+# ?format=binary switches the snapshot/delta frames to a compact encoding.
 @GraphRouter.websocket("/ws/graphdata/{unit_ID}")
-async def websocket_endpoint(websocket: WebSocket, unit_ID: int):
+async def websocket_endpoint(websocket: WebSocket, unit_ID: int, format: Optional[str] = None):
     await websocket.accept()
-    print(f"WebSocket connection established for unit_ID: {unit_ID}")
+    logger.info(f"WebSocket connection established for unit_ID: {unit_ID}")
+
+    if not await unit_registry.exists(unit_ID):
+        await websocket.send_json({"error": "Invalid unit ID"})
+        await websocket.close()
+        return
+
+    try:
+        fmt = negotiate(format, None, GRAPH_FORMATS)
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close()
+        return
 
-    clients[unit_ID].append(websocket)
+    # Snapshot queued first, so the client only sees later deltas after it
+    snapshot = await build_graph_snapshot(unit_ID)
+    graph_windows.setdefault(unit_ID, shift_day.current()[0])
+    subscriber = graph_hub.subscribe(websocket, [unit_ID], fmt)
+    subscriber.send(snapshot, key="snapshot")
 
     try:
         while True:
-            data = await websocket.receive_text()  # Receive data from client
-            print(f"Received data: {data}")
+            message = await websocket.receive_text()  # Receive data from client
+            try:
+                request = json.loads(message)
+            except ValueError:
+                request = {}
 
-            # Add new data to the history and broadcast it to clients
-            data_history[unit_ID].append(data)
-            for client in clients[unit_ID]:
-                await client.send_json(data_history[unit_ID])
+            if isinstance(request, dict) and request.get("type") == "resync":
+                subscriber.send(await build_graph_snapshot(unit_ID), key="snapshot")
     except Exception as e:
-        print(f"WebSocket connection closed: {e}")
+        logger.info(f"WebSocket connection closed: {e}")
     finally:
-        clients[unit_ID].remove(websocket)
-        if not clients[unit_ID]:  # Clean up if no clients remain
-            del clients[unit_ID]
+        await graph_hub.unsubscribe(subscriber)  # Drops the unit entry when no clients remain
 
 @GraphRouter.get("/api/v1/graphdata/{unit_ID}")
-async def get_graph_data(unit_ID: int, start_time: Optional[str] = None, end_time: Optional[str] = None):
-    if unit_ID not in BOARD_COLLECTIONS:
+async def get_graph_data(
+    request: Request,
+    unit_ID: int,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    max_points: Optional[int] = Query(None, ge=MIN_POINTS, description="Reduce the series to at most this many points"),
+    mode: str = Query("lttb", description="Downsampling mode: lttb, min-max or avg"),
+    format: Optional[str] = Query(None, description="json, msgpack or binary; defaults to the Accept header, else json"),
+):
+    if not await unit_registry.exists(unit_ID):
         return {"error": "Invalid unit ID"}
 
-    collection = BOARD_COLLECTIONS[unit_ID]
+    if mode not in DOWNSAMPLE_MODES:
+        return {"error": "Invalid mode"}
+
+    try:
+        fmt = negotiate(format, request.headers.get("accept"), GRAPH_FORMATS)
+    except ValueError as e:
+        return {"error": str(e)}
 
     # Parse start and end times from the query parameters
     try:
@@ -137,22 +265,23 @@ async def get_graph_data(unit_ID: int, start_time: Optional[str] = None, end_tim
     except ValueError:
         return {"error": "Invalid date format"}
 
-    # Query MongoDB with parsed UTC times
-    data = collection.find({
-        "created_at": {
-            "$gte": start_dt,
-            "$lt": end_dt
-        }
-    }).sort("created_at", 1)
+    # Query with parsed UTC times; JSON responses carry site-local timestamps
+    async def build():
+        return await fetch_graph_window(unit_ID, start_dt, end_dt, max_points or 0, mode)
+
+    def encode(series):
+        return encode_series({}, series, fmt)
 
-    # Prepare the response with IST-converted timestamps
-    response = [['Time', 'Humidity', 'Temperature']]
-    for entry in data:
-        time = entry["created_at"].astimezone(IST).isoformat()
-        humidity = entry.get("h", 0)
-        temperature = entry.get("t", 0)
-        response.append([time, humidity, temperature])
+    # Served from the response cache until a reading inside the window arrives;
+    # a window past the backfill horizon is also cacheable by the browser
+    window = (to_epoch_ms(start_dt), to_epoch_ms(end_dt))
+    key = ("graphdata", unit_ID, window, max_points or 0, mode, fmt)
+    closed = window_closed(window[1])
+    return await cached_response(request, key, build, encode, MEDIA_TYPES[fmt], (unit_tag(unit_ID),), window, closed)
 
-    return {"data": response}
+@GraphRouter.get("/api/v1/graphbuffer/stats")
+async def get_graph_buffer_stats():
+    # Memory held by the in-memory graph buffers
+    return series_store.memory_usage()
 
 #http://192.168.0.84:9001/api/v1/graphdata/1?start_time=2024-10-16T08:30:00Z&end_time=2024-10-17T08:29:59Z
@@ -0,0 +1,154 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from configuration.shift_day import format_local
+
+# Sentinel stored for readings that did not carry a value
+MISSING = np.iinfo(np.int32).min
+
+
+def to_epoch_ms(dt: datetime) -> int:
+    # Naive datetimes are read the way MongoDB stores them: as UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def to_float(values: np.ndarray) -> np.ndarray:
+    # int32 column -> float64 with NaN in place of the missing sentinel
+    return np.where(values == MISSING, np.nan, values.astype(np.float64))
+
+
+def to_optional_list(values: np.ndarray) -> list:
+    # float64 column -> JSON-ready list; whole numbers stay ints, NaN becomes None
+    missing = np.isnan(values)
+    whole = ~missing & (values == np.floor(np.where(missing, 0.0, values)))
+    out = values.astype(object)
+    out[whole] = values[whole].astype(np.int64).astype(object)
+    out[missing] = None
+    return out.tolist()
+
+
+def graph_rows(ts: np.ndarray, h: np.ndarray, t: np.ndarray) -> list:
+    # Rows in the [time, humidity, temperature] layout used by the graph API
+    return [list(row) for row in zip(format_local(ts).tolist(), to_optional_list(h), to_optional_list(t))]
+
+
+class UnitSeries:
+    """Fixed-capacity ring buffer of one unit's readings.
+
+    Timestamps are epoch milliseconds (int64) and t/h/w are int32 columns,
+    so memory use is constant once the buffer is full.  ``covered_from`` is
+    the earliest timestamp from which the buffer holds every reading; windows
+    starting before it must be read from MongoDB.
+    """
+
+    def __init__(self, capacity: int, horizon_ms: Optional[int] = None, covered_from: Optional[int] = None):
+        self.capacity = capacity
+        self.horizon_ms = horizon_ms
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.t = np.full(capacity, MISSING, dtype=np.int32)
+        self.h = np.full(capacity, MISSING, dtype=np.int32)
+        self.w = np.full(capacity, MISSING, dtype=np.int32)
+        self.head = 0  # Next slot to write
+        self.size = 0
+        self.newest = None
+        self.in_order = True
+        self.covered_from = covered_from if covered_from is not None else to_epoch_ms(datetime.now(timezone.utc))
+
+    def append(self, ts_ms: int, t: Optional[int], h: Optional[int], w: Optional[int]):
+        if self.size == self.capacity:
+            # Overwriting the oldest slot moves the covered range forward
+            self.covered_from = max(self.covered_from, int(self.ts[self.head]) + 1)
+        else:
+            self.size += 1
+
+        self.ts[self.head] = ts_ms
+        self.t[self.head] = MISSING if t is None else t
+        self.h[self.head] = MISSING if h is None else h
+        self.w[self.head] = MISSING if w is None else w
+        self.head = (self.head + 1) % self.capacity
+
+        if self.newest is not None and ts_ms < self.newest:
+            self.in_order = False
+        self.newest = ts_ms if self.newest is None else max(self.newest, ts_ms)
+
+        if self.horizon_ms is not None:
+            self.covered_from = max(self.covered_from, self.newest - self.horizon_ms)
+
+    def _ordered(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self.size < self.capacity:
+            index = np.arange(self.size)
+        else:
+            index = np.arange(self.head, self.head + self.capacity) % self.capacity
+        ts = self.ts[index]
+        if not self.in_order:
+            order = np.argsort(ts, kind="stable")
+            index, ts = index[order], ts[order]
+        return ts, self.t[index], self.h[index], self.w[index]
+
+    def covers(self, start_ms: int) -> bool:
+        return start_ms >= self.covered_from
+
+    def window(self, start_ms: int, end_ms: int):
+        ts, t, h, w = self._ordered()
+        lo = np.searchsorted(ts, max(start_ms, self.covered_from), side="left")
+        hi = np.searchsorted(ts, end_ms, side="left")
+        return ts[lo:hi], t[lo:hi], h[lo:hi], w[lo:hi]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.t.nbytes + self.h.nbytes + self.w.nbytes
+
+
+class SeriesStore:
+    """Per-unit ``UnitSeries`` buffers for recent graph windows.
+
+    ``complete`` says whether this process sees every stored reading; when
+    it does not (several workers without a shared bus) nothing is buffered
+    and ``covers`` is always false, so reads go to MongoDB.
+    """
+
+    def __init__(self, capacity: int, horizon_ms: Optional[int] = None, complete: bool = True):
+        self.capacity = capacity
+        self.horizon_ms = horizon_ms
+        self.complete = complete
+        self.units: Dict[int, UnitSeries] = {}
+        self.started_at = to_epoch_ms(datetime.now(timezone.utc))
+
+    def series(self, unit_ID: int) -> UnitSeries:
+        if unit_ID not in self.units:
+            # Only readings ingested after start-up are guaranteed present
+            self.units[unit_ID] = UnitSeries(self.capacity, self.horizon_ms, covered_from=self.started_at)
+        return self.units[unit_ID]
+
+    def append(self, entry: dict):
+        if not self.complete:
+            return
+        self.series(entry["unit_ID"]).append(
+            to_epoch_ms(entry["created_at"]), entry.get("t"), entry.get("h"), entry.get("w")
+        )
+
+    def extend(self, entries: Iterable[dict]):
+        for entry in entries:
+            self.append(entry)
+
+    def covers(self, unit_ID: int, start: datetime) -> bool:
+        return self.complete and self.series(unit_ID).covers(to_epoch_ms(start))
+
+    def window(self, unit_ID: int, start: datetime, end: datetime):
+        return self.series(unit_ID).window(to_epoch_ms(start), to_epoch_ms(end))
+
+    def graph_series(self, unit_ID: int, start: datetime, end: datetime):
+        # (ts_ms, h, t) arrays with NaN for missing values
+        ts, t, h, _ = self.window(unit_ID, start, end)
+        return ts, to_float(h), to_float(t)
+
+    def memory_usage(self) -> dict:
+        per_unit = {unit_ID: {"points": s.size, "capacity": s.capacity, "bytes": s.nbytes} for unit_ID, s in self.units.items()}
+        return {
+            "complete": self.complete,
+            "units": len(self.units),
+            "bytes": sum(s.nbytes for s in self.units.values()),
+            "per_unit": per_unit,
+        }
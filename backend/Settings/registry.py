@@ -0,0 +1,48 @@
+import asyncio
+import time
+import os
+from typing import Dict, List, Optional
+from configuration.database import setting
+
+
+class UnitRegistry:
+    """In-memory view of the units configured in the ``Setting`` collection.
+
+    Loaded lazily and reused until ``invalidate`` is called (the Settings
+    routes do so on add/update/delete) or ``ttl`` seconds pass, which keeps
+    other worker processes eventually consistent.
+    """
+
+    def __init__(self, collection, ttl: float = 30.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._units: Optional[Dict[int, dict]] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _load(self):
+        docs = await self.collection.find({}, {"_id": 0}).to_list(length=None)
+        self._units = {doc["unit_ID"]: doc for doc in docs if "unit_ID" in doc}
+        self._loaded_at = time.monotonic()
+
+    async def units(self) -> Dict[int, dict]:
+        if self._units is None or time.monotonic() - self._loaded_at > self.ttl:
+            async with self._lock:
+                if self._units is None or time.monotonic() - self._loaded_at > self.ttl:
+                    await self._load()
+        return self._units
+
+    async def exists(self, unit_ID: int) -> bool:
+        return unit_ID in await self.units()
+
+    async def get(self, unit_ID: int) -> Optional[dict]:
+        return (await self.units()).get(unit_ID)
+
+    async def unit_ids(self) -> List[int]:
+        return sorted(await self.units())
+
+    def invalidate(self):
+        self._units = None
+
+
+unit_registry = UnitRegistry(setting, ttl=float(os.getenv("UNIT_REGISTRY_TTL", "30")))
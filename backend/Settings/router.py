@@ -1,39 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from configuration.database import setting, Board_1 ,Board_3,Board_2# Import both collections
+from fastapi import APIRouter, HTTPException, Request
+from configuration.database import setting
 from backend.Settings.schemas import ServerData
-from backend.externalservice.router import send_to_all_clients
+from backend.Settings.registry import unit_registry
+from backend.externalservice.state import board_states
+from backend.externalservice.router import send_to_all_clients, alert_engine
+from backend.broadcast.bus import message_bus
+from backend.cache.response_cache import response_cache, cached_json, unit_tag, UNITS_TAG
 import logging
 
 serverRouter = APIRouter()
 logger = logging.getLogger("my_logger")
 
-# WebSocket Connections
-connected_websockets = []  # To hold connected WebSocket clients
+# Cached unit lists, and graph responses of a unit that was removed or re-added
+def forget_unit(unit_ID):
+    response_cache.invalidate(UNITS_TAG)
+    if unit_ID is not None:
+        response_cache.invalidate(unit_tag(unit_ID))
 
-async def broadcast_new_server(message: dict):
-    for websocket in connected_websockets:
-        await websocket.send_json(message)
+# Reload the unit list here and on every other worker
+async def units_changed(unit_ID: int):
+    unit_registry.invalidate()
+    forget_unit(unit_ID)
+    await message_bus.publish("units", {"unit_ID": unit_ID})
 
+async def receive_units_changed(payload: dict):
+    unit_registry.invalidate()
+    forget_unit(payload.get("unit_ID"))
+
+message_bus.subscribe("units", receive_units_changed)
 
 
 # SETTINGS PAGE
 @serverRouter.get("/api/v1/settings")
-async def get_servers():
-    servers = list(setting.find())  # Fetch all server data from the collection
-    for srv in servers:
-        srv['_id'] = str(srv['_id'])  # Convert ObjectId to string for JSON serialization
-    return {"servers": servers}
-
-
-def get_board_collection(unit_ID: int):
-    if unit_ID == 1:
-        return Board_1
-    elif unit_ID == 2:
-        return Board_2
-    elif unit_ID == 3:
-        return Board_3
-    else:
-        raise ValueError(f"Invalid unit_ID: {unit_ID}")
+async def get_servers(request: Request):
+    async def build():
+        servers = await setting.find().to_list(length=None)  # Fetch all server data from the collection
+        for srv in servers:
+            srv['_id'] = str(srv['_id'])  # Convert ObjectId to string for JSON serialization
+        return {"servers": servers}
+
+    # Cached until a server is added, updated or deleted
+    return await cached_json(request, "settings", build, (UNITS_TAG,))
+
 
 # Add Server
 @serverRouter.post("/api/v1/settings/add_server")
@@ -42,7 +50,7 @@ async def add_server(data: ServerData):
     server_dict = data.dict()
 
     # Assign unit_ID if not provided
-    existing_servers = list(setting.find())
+    existing_servers = await setting.find().to_list(length=None)
     if not data.unit_ID:
         if existing_servers:
             unit_ID = max(server['unit_ID'] for server in existing_servers) + 1
@@ -53,11 +61,12 @@ async def add_server(data: ServerData):
         unit_ID = data.unit_ID
 
     # Check for duplicate unit_ID
-    if setting.find_one({"unit_ID": unit_ID}):
+    if await setting.find_one({"unit_ID": unit_ID}):
         raise HTTPException(status_code=400, detail=f"Server with unit_ID {unit_ID} already exists")
 
     # Insert the server data into the 'Server' collection
-    setting.insert_one(server_dict)
+    await setting.insert_one(server_dict)
+    await units_changed(unit_ID)
 
     # Create a new entry in the corresponding Board collection
     board_entry = {
@@ -71,9 +80,8 @@ async def add_server(data: ServerData):
         "y": 0
     }
     
-    # Insert board entry into the respective Board collection
-    collection = get_board_collection(unit_ID)
-    collection.insert_one(board_entry)
+    # Insert board entry into the board state store
+    await board_states.create(board_entry)
 
     # Notify all connected clients (via WebSocket or other mechanisms)
     await send_to_all_clients(board_entry)
@@ -84,30 +92,28 @@ async def add_server(data: ServerData):
 # Edit Server
 @serverRouter.put("/api/v1/settings/update_server/{unit_ID}")
 async def update_server(unit_ID: int, data: ServerData):
-    result = setting.update_one(
+    result = await setting.update_one(
         {"unit_ID": unit_ID}, 
         {"$set": data.dict()}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Server not found")
+    await units_changed(unit_ID)
     return {"message": "Server updated successfully"}
 
 # Delete Server
 @serverRouter.delete("/api/v1/settings/delete_server/{unit_ID}")
 async def delete_server(unit_ID: int):
     # Delete the server from the settings collection
-    result = setting.delete_one({"unit_ID": unit_ID})
+    result = await setting.delete_one({"unit_ID": unit_ID})
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Server not found in settings")
+    await units_changed(unit_ID)
+    alert_engine.forget(unit_ID)
 
-    # Determine the correct board collection based on unit_ID
-    collection = get_board_collection(unit_ID)
-
-    # Additionally, delete the corresponding board entry from the correct Board collection
-    board_result = collection.delete_one({"unit_ID": unit_ID})
-
-    if board_result.deleted_count == 0:
+    # Additionally, delete the corresponding board entry from the board state store
+    if not await board_states.delete(unit_ID):
         raise HTTPException(status_code=404, detail="Board entry not found for the given unit_ID")
 
     return {"message": "Server and corresponding Board entry deleted successfully"}
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 
 class ServerData(BaseModel):
@@ -8,4 +9,5 @@ class ServerData(BaseModel):
     temp_high: float
     temp_low: float
     water_level_high: float
-    water_level_low: float
\ No newline at end of file
+    water_level_low: float
+    retention_days: Optional[int] = None  # Days of raw readings kept; None uses RETENTION_DAYS
\ No newline at end of file
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("my_logger")
+
+# Reading field -> (low, high) threshold keys of the unit's Setting document
+THRESHOLD_FIELDS = {
+    "t": ("temp_low", "temp_high"),
+    "h": ("humidity_low", "humidity_high"),
+    "w": ("water_level_low", "water_level_high"),
+}
+
+ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", "1.0"))
+ALERT_DEBOUNCE = int(os.getenv("ALERT_DEBOUNCE", "3"))
+
+RAISED = "raised"
+CLEARED = "cleared"
+
+
+class AlertState:
+    __slots__ = ("level", "pending", "count")
+
+    def __init__(self):
+        self.level: Optional[str] = None  # None, "low" or "high"
+        self.pending: Optional[str] = None
+        self.count = 0
+
+
+class AlertEngine:
+    """Checks readings against each unit's Setting limits.
+
+    Limits come from the unit registry, which is cached in memory and
+    reloaded when the Settings routes change it, so a check never waits on
+    the database.  An alert is raised after ``debounce`` consecutive
+    readings beyond a limit and cleared after ``debounce`` consecutive
+    readings back inside it by at least ``hysteresis``.  Events are stored
+    in the background and handed to ``on_alert``.
+    """
+
+    def __init__(
+        self,
+        registry,
+        collection,
+        hysteresis: float = 1.0,
+        debounce: int = 3,
+        on_alert: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    ):
+        self.registry = registry
+        self.collection = collection
+        self.hysteresis = hysteresis
+        self.debounce = max(1, debounce)
+        self.on_alert = on_alert
+        self.states: Dict[Tuple[int, str], AlertState] = {}
+        self._writes = set()
+
+    def _step(self, state: AlertState, value: float, low: float, high: float) -> Optional[str]:
+        if state.level is None:
+            level = "high" if value > high else "low" if value < low else None
+        elif state.level == "high":
+            level = None if value <= high - self.hysteresis else "high"
+        else:
+            level = None if value >= low + self.hysteresis else "low"
+
+        if level == state.level:
+            state.pending, state.count = None, 0
+            return None
+        if level == state.pending:
+            state.count += 1
+        else:
+            state.pending, state.count = level, 1
+        if state.count < self.debounce:
+            return None
+
+        state.level = level
+        state.pending, state.count = None, 0
+        return CLEARED if level is None else RAISED
+
+    async def check(self, unit_ID: int, reading: dict) -> List[dict]:
+        setting = await self.registry.get(unit_ID)
+        if not setting:
+            return []
+
+        events = []
+        for field, (low_key, high_key) in THRESHOLD_FIELDS.items():
+            value, low, high = reading.get(field), setting.get(low_key), setting.get(high_key)
+            if value is None or low is None or high is None:
+                continue
+            state = self.states.get((unit_ID, field))
+            if state is None:
+                state = self.states[(unit_ID, field)] = AlertState()
+            previous = state.level
+            change = self._step(state, value, low, high)
+            if change is None:
+                continue
+            level = state.level if change == RAISED else previous
+            events.append(self._event(unit_ID, field, change, level, value, low, high))
+
+        if events:
+            self._record(events)
+            if self.on_alert is not None:
+                await self.on_alert(events)
+        return events
+
+    async def check_many(self, unit_ID: int, readings: Iterable[dict]) -> List[dict]:
+        events = []
+        for reading in readings:
+            events.extend(await self.check(unit_ID, reading))
+        return events
+
+    @staticmethod
+    def _event(unit_ID, field, change, level, value, low, high) -> dict:
+        return {
+            "type": "alert",
+            "unit_ID": unit_ID,
+            "field": field,
+            "event": change,
+            "level": level,
+            "value": value,
+            "threshold": high if level == "high" else low,
+            "created_at": datetime.utcnow(),
+        }
+
+    def _record(self, events: List[dict]):
+        # Stored off the request path; events are rare (state changes only)
+        task = asyncio.create_task(self._insert([dict(event) for event in events]))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _insert(self, events: List[dict]):
+        try:
+            await self.collection.insert_many(events, ordered=False)
+        except Exception as e:
+            logger.error(f"Could not store alert events: {e}")
+
+    def active(self) -> List[dict]:
+        return [
+            {"unit_ID": unit_ID, "field": field, "level": state.level}
+            for (unit_ID, field), state in sorted(self.states.items()) if state.level is not None
+        ]
+
+    def forget(self, unit_ID: int):
+        for key in [key for key in self.states if key[0] == unit_ID]:
+            del self.states[key]
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Query
+from configuration.database import alert_events
+from backend.externalservice.router import alert_engine
+from backend.Settings.registry import unit_registry
+
+AlertRouter = APIRouter()
+
+
+# Alerts currently raised, from the in-memory engine state
+@AlertRouter.get("/api/v1/alerts/active")
+async def get_active_alerts():
+    return {"alerts": alert_engine.active()}
+
+
+# Most recent raise/clear events of a unit
+@AlertRouter.get("/api/v1/alerts/{unit_ID}")
+async def get_alert_events(unit_ID: int, limit: int = Query(100, ge=1, le=1000)):
+    if not await unit_registry.exists(unit_ID):
+        raise HTTPException(status_code=404, detail="Invalid unit ID")
+
+    events = await alert_events.find(
+        {"unit_ID": unit_ID}, {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(length=None)
+    return {"unit_ID": unit_ID, "events": events}
@@ -0,0 +1,179 @@
+import abc
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict
+from bson import json_util
+from configuration.database import broadcast_events
+
+logger = logging.getLogger("my_logger")
+
+# local (single process), redis (pub/sub) or mongo (change streams, needs a replica set)
+BROADCAST_BUS = os.getenv("BROADCAST_BUS", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "humidity-broadcast")
+BROADCAST_EVENT_TTL = int(os.getenv("BROADCAST_EVENT_TTL", "300"))
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class MessageBus:
+    """Shares broadcast events between worker processes and hosts.
+
+    Each process fans events out to its own WebSocket clients before calling
+    ``publish``; the bus only carries them to the *other* processes, whose
+    ``subscribe``d handlers apply them locally.  This base class has no
+    transport, which is what a single worker needs.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.handlers: Dict[str, Handler] = {}
+
+    def subscribe(self, topic: str, handler: Handler):
+        self.handlers[topic] = handler
+
+    async def publish(self, topic: str, payload: dict):
+        try:
+            await self._send(json_util.dumps({"origin": self.origin, "topic": topic, "payload": payload}))
+        except Exception as e:
+            # Local clients already have the event; other workers miss this one
+            logger.error(f"Broadcast bus publish failed: {e}")
+
+    async def _receive(self, raw):
+        envelope = json_util.loads(raw)
+        if envelope.get("origin") == self.origin:
+            return
+        handler = self.handlers.get(envelope.get("topic"))
+        if handler is None:
+            return
+        try:
+            await handler(envelope["payload"])
+        except Exception as e:
+            logger.error(f"Broadcast handler for {envelope.get('topic')} failed: {e}")
+
+    async def _send(self, data: str):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalBus(MessageBus):
+    # In-process transport: buses created with the same peers list (for
+    # instance one per simulated worker in a test) deliver to each other;
+    # a lone bus, the single-worker case, sends nothing
+    def __init__(self, peers: list = None):
+        super().__init__()
+        self.peers = peers if peers is not None else []
+        self.peers.append(self)
+
+    async def publish(self, topic: str, payload: dict):
+        if len(self.peers) > 1:
+            await super().publish(topic, payload)
+
+    async def _send(self, data: str):
+        for peer in self.peers:
+            if peer is not self:
+                await peer._receive(data)
+
+
+class _ListeningBus(MessageBus, abc.ABC):
+    # Runs _listen in a background task and restarts it after errors
+    def __init__(self):
+        super().__init__()
+        self._task = None
+
+    @abc.abstractmethod
+    async def _listen(self):
+        """Receive messages until the connection fails."""
+
+    async def _run(self):
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast bus listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class RedisBus(_ListeningBus):
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("BROADCAST_BUS=redis requires the 'redis' package")
+        self.redis = redis.from_url(url)
+        self.channel = channel
+
+    async def _listen(self):
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            async for item in pubsub.listen():
+                if item["type"] == "message":
+                    await self._receive(item["data"])
+        finally:
+            await pubsub.unsubscribe(self.channel)
+
+    async def _send(self, data: str):
+        await self.redis.publish(self.channel, data)
+
+    async def stop(self):
+        await super().stop()
+        await self.redis.close()
+
+
+class MongoBus(_ListeningBus):
+    # Events are inserted into a collection and read back through a change stream
+    def __init__(self, collection, ttl: int):
+        super().__init__()
+        self.collection = collection
+        self.ttl = ttl
+
+    async def start(self):
+        await self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+        await super().start()
+
+    async def _listen(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self.collection.watch(pipeline) as stream:
+            async for change in stream:
+                await self._receive(change["fullDocument"]["event"])
+
+    async def _send(self, data: str):
+        await self.collection.insert_one({"event": data, "created_at": datetime.utcnow()})
+
+
+def create_bus(kind: str) -> MessageBus:
+    if kind == "local":
+        return LocalBus()
+    if kind == "redis":
+        return RedisBus(REDIS_URL, BROADCAST_CHANNEL)
+    if kind == "mongo":
+        return MongoBus(broadcast_events, BROADCAST_EVENT_TTL)
+    raise ValueError(f"Unknown BROADCAST_BUS: {kind}")
+
+
+message_bus = create_bus(BROADCAST_BUS)
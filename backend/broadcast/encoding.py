@@ -0,0 +1,65 @@
+import json
+from typing import Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack frames need the optional msgpack package
+    msgpack = None
+
+# Wire formats a client can ask for with ?format= or the Accept header
+JSON = "json"
+MSGPACK = "msgpack"
+BINARY = "binary"
+
+MEDIA_TYPES = {
+    JSON: "application/json",
+    MSGPACK: "application/msgpack",
+    BINARY: "application/vnd.humidity.series",
+}
+ACCEPT_ALIASES = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.humidity.series": BINARY,
+    "application/octet-stream": BINARY,
+}
+
+
+def available(fmt: str) -> bool:
+    return fmt != MSGPACK or msgpack is not None
+
+
+def negotiate(requested: Optional[str], accept: Optional[str], supported: Iterable[str] = (JSON, MSGPACK)) -> str:
+    # An explicit ?format= wins; otherwise the first supported Accept type, else JSON.
+    # Raises ValueError for an unknown or unavailable explicit format.
+    supported = tuple(supported)
+    if requested:
+        if requested not in supported:
+            raise ValueError(f"Invalid format: {requested}")
+        if not available(requested):
+            raise ValueError(f"{requested} format requires the {requested} package")
+        return requested
+    for media_type in (accept or "").split(","):
+        fmt = ACCEPT_ALIASES.get(media_type.split(";")[0].strip().lower())
+        if fmt in supported and available(fmt):
+            return fmt
+    return JSON
+
+
+def dumps(message) -> bytes:
+    # Compact UTF-8 JSON; orjson when installed, identical output shape either way
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def encode(message: dict, fmt: str = JSON) -> Union[str, bytes]:
+    # Text frame for JSON, binary frame for MessagePack
+    if fmt == MSGPACK:
+        return msgpack.packb(message, default=str, use_bin_type=True)
+    return dumps(message).decode("utf-8")
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Union
+from backend.broadcast.encoding import encode, JSON
+from backend.metrics.registry import (
+    BROADCAST_FANOUT_SECONDS, WEBSOCKET_CLIENTS, WEBSOCKET_QUEUED, WEBSOCKET_QUEUE_MAX, WEBSOCKET_DROPPED,
+)
+
+logger = logging.getLogger("my_logger")
+
+ALL_UNITS = None  # Subscription key for clients that follow every unit
+
+# Per-client outbound queue length and the longest a single send may block
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+
+class Subscriber:
+    """One WebSocket with a bounded outbound queue drained by its own writer task.
+
+    Messages published with a ``key`` replace a queued message with the same
+    key, so a slow client only ever receives the newest state of a unit.
+    When the queue is full the oldest message is dropped.  ``format`` is the
+    wire format negotiated by the client; str frames go out as text and bytes
+    frames as binary.
+    """
+
+    def __init__(self, hub: "BroadcastHub", websocket, units: Optional[Set[int]], format: str = JSON):
+        self.hub = hub
+        self.websocket = websocket
+        self.units = units
+        self.format = format
+        self.pending: "OrderedDict[object, Union[str, bytes]]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.coalesced = 0
+        self.task: Optional[asyncio.Task] = None
+        self._ids = itertools.count()
+
+    def offer(self, frame: Union[str, bytes], key=None):
+        if key is not None and key in self.pending:
+            self.pending[key] = frame
+            self.coalesced += 1
+            return
+        if len(self.pending) >= self.hub.queue_size:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.pending[key if key is not None else next(self._ids)] = frame
+        self.ready.set()
+
+    def send(self, message: dict, key=None):
+        # Queue a message for this client only, behind anything already pending
+        self.offer(self.hub.encoder(message, self.format), key)
+
+    async def _run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.pending:
+                    _, frame = self.pending.popitem(last=False)
+                    send = self.websocket.send_text if isinstance(frame, str) else self.websocket.send_bytes
+                    await asyncio.wait_for(send(frame), self.hub.send_timeout)
+                self.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping slow WebSocket client {self.websocket.client}")
+            await self._close()
+        except Exception as e:
+            logger.info(f"WebSocket client {self.websocket.client} gone: {e}")
+        finally:
+            self.hub._remove(self)
+
+    async def _close(self):
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+class BroadcastHub:
+    """Fan-out of per-unit messages to subscribed WebSockets.
+
+    ``publish`` encodes a message once per wire format in use and only
+    enqueues it on each subscriber, so a slow client never delays ingest or
+    other clients.  ``encoder(message, format)`` turns a message into a frame.
+    """
+
+    def __init__(
+        self,
+        name: str = "hub",
+        queue_size: int = WS_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        encoder: Callable[[dict, str], Union[str, bytes]] = encode,
+    ):
+        self.name = name
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.encoder = encoder
+        self.subscriptions: Dict[Optional[int], Set[Subscriber]] = {}
+        self._fanout = BROADCAST_FANOUT_SECONDS.labels(name)
+
+        # Read from the live subscriber queues when /metrics is scraped
+        WEBSOCKET_CLIENTS.labels(name).set_function(lambda: len(self.subscribers()))
+        WEBSOCKET_QUEUED.labels(name).set_function(lambda: sum(len(s.pending) for s in self.subscribers()))
+        WEBSOCKET_QUEUE_MAX.labels(name).set_function(lambda: max((len(s.pending) for s in self.subscribers()), default=0))
+        WEBSOCKET_DROPPED.labels(name).set_function(lambda: sum(s.dropped for s in self.subscribers()))
+
+    def subscribers(self) -> Set[Subscriber]:
+        return set().union(*self.subscriptions.values()) if self.subscriptions else set()
+
+    def subscribe(self, websocket, units: Optional[Iterable[int]] = ALL_UNITS, format: str = JSON) -> Subscriber:
+        subscriber = Subscriber(self, websocket, None, format)
+        self.update(subscriber, units)
+        subscriber.task = asyncio.create_task(subscriber._run())
+        return subscriber
+
+    def update(self, subscriber: Subscriber, units: Optional[Iterable[int]] = ALL_UNITS):
+        self._remove(subscriber)
+        subscriber.units = None if units is ALL_UNITS else set(units)
+        for unit_ID in ([ALL_UNITS] if subscriber.units is None else subscriber.units):
+            self.subscriptions.setdefault(unit_ID, set()).add(subscriber)
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        self._remove(subscriber)
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+            try:
+                await subscriber.task
+            except asyncio.CancelledError:
+                pass
+
+    def _remove(self, subscriber: Subscriber):
+        for unit_ID in ([ALL_UNITS] if subscriber.units is None else subscriber.units):
+            subscribers = self.subscriptions.get(unit_ID)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscriptions[unit_ID]
+
+    def has_subscribers(self, unit_ID: Optional[int]) -> bool:
+        return bool(self.subscriptions.get(unit_ID) or self.subscriptions.get(ALL_UNITS))
+
+    def publish(self, unit_ID: Optional[int], message: dict, key=None) -> int:
+        # Returns the number of clients the message was queued for
+        recipients = set(self.subscriptions.get(ALL_UNITS, ()))
+        if unit_ID is not ALL_UNITS:
+            recipients.update(self.subscriptions.get(unit_ID, ()))
+        if not recipients:
+            return 0
+        started = time.perf_counter()
+        frames = {}
+        for subscriber in recipients:
+            frame = frames.get(subscriber.format)
+            if frame is None:
+                frame = frames[subscriber.format] = self.encoder(message, subscriber.format)
+            subscriber.offer(frame, key)
+        self._fanout.observe(time.perf_counter() - started)
+        return len(recipients)
+
+    def stats(self) -> dict:
+        subscribers = self.subscribers()
+        return {
+            "subscribers": len(subscribers),
+            "units": sorted(unit_ID for unit_ID in self.subscriptions if unit_ID is not ALL_UNITS),
+            "queued": sum(len(s.pending) for s in subscribers),
+            "dropped": sum(s.dropped for s in subscribers),
+            "coalesced": sum(s.coalesced for s in subscribers),
+        }
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from fastapi import Request, Response
+from backend.broadcast.encoding import dumps, MEDIA_TYPES, JSON
+from backend.metrics.registry import RESPONSE_CACHE_REQUESTS, RESPONSE_CACHE_ENTRIES
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Lifetime of responses for closed windows, in memory and in Cache-Control
+RESPONSE_CACHE_CLOSED_TTL = float(os.getenv("RESPONSE_CACHE_CLOSED_TTL", "86400"))
+# Boards may upload readings this late (batch ingest with created_at); a window
+# is only closed once it ended longer ago than that
+RESPONSE_CACHE_BACKFILL_HOURS = float(os.getenv("RESPONSE_CACHE_BACKFILL_HOURS", "24"))
+
+UNITS_TAG = "units"
+
+
+def unit_tag(unit_ID: int) -> str:
+    return f"unit:{unit_ID}"
+
+
+def window_closed(end_ms: int) -> bool:
+    # No reading can arrive for a window that ended before the backfill horizon
+    return end_ms <= time.time() * 1000 - RESPONSE_CACHE_BACKFILL_HOURS * 3600 * 1000
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "etag", "last_modified", "expires", "tags", "window", "closed")
+
+    def __init__(self, body: bytes, media_type: str, tags: Tuple[str, ...], window: Optional[Tuple[int, int]], closed: bool, ttl: float):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.last_modified = time.time()
+        self.expires = time.monotonic() + ttl
+        self.tags = tags
+        self.window = window
+        self.closed = closed
+
+
+class ResponseCache:
+    """In-process LRU of serialized GET responses.
+
+    Entries carry tags (``unit:<id>`` for a unit's readings, ``units`` for the
+    unit list) and are dropped by ``invalidate``; an entry with a time window
+    ``(start_ms, end_ms)`` is only dropped when an invalidated timestamp falls
+    inside it, so closed historical windows survive live ingest.  Open
+    entries also expire after ``ttl`` seconds, which keeps other worker
+    processes eventually consistent.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 60.0, closed_ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.closed_ttl = closed_ttl
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._tagged: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def generation(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key: Hashable, body: bytes, media_type: str = MEDIA_TYPES[JSON], tags: Tuple[str, ...] = (),
+            window: Optional[Tuple[int, int]] = None, closed: bool = False,
+            generation: Optional[Tuple[int, ...]] = None) -> CachedResponse:
+        entry = CachedResponse(body, media_type, tags, window, closed, self.closed_ttl if closed else self.ttl)
+        # A body built while its data was invalidated may already be stale; serve it once, keep nothing
+        if generation is not None and generation != self.generation(tags):
+            return entry
+
+        self._remove(key)
+        self._entries[key] = entry
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, tag: str, times_ms: Optional[Iterable[int]] = None):
+        # Drop entries for ``tag``; with ``times_ms`` only windows containing one of them
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        times = None if times_ms is None else list(times_ms)
+        for key in list(self._tagged.get(tag, ())):
+            window = self._entries[key].window
+            if times is None or window is None or any(window[0] <= t < window[1] for t in times):
+                self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._tagged.clear()
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_CLOSED_TTL)
+RESPONSE_CACHE_ENTRIES.labels().set_function(lambda: len(response_cache))
+
+
+def not_modified(request: Request, entry: CachedResponse) -> bool:
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_response(request: Request, entry: CachedResponse) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        # Closed windows no longer change; everything else is revalidated on every use
+        "Cache-Control": f"private, max-age={int(response_cache.closed_ttl)}" if entry.closed else "private, no-cache",
+        "Vary": "Accept",
+    }
+    if not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
+async def cached_response(
+    request: Request,
+    key: Hashable,
+    build: Callable[[], Awaitable],
+    encode: Callable[[object], bytes] = dumps,
+    media_type: str = MEDIA_TYPES[JSON],
+    tags: Tuple[str, ...] = (),
+    window: Optional[Tuple[int, int]] = None,
+    closed: bool = False,
+) -> Response:
+    # Serve ``key`` from the cache, building it with ``build`` and serializing it with ``encode`` on a miss
+    entry = response_cache.get(key)
+    if entry is None:
+        RESPONSE_CACHE_REQUESTS.labels("miss").inc()
+        generation = response_cache.generation(tags)
+        entry = response_cache.put(key, encode(await build()), media_type, tags, window, closed, generation)
+    else:
+        RESPONSE_CACHE_REQUESTS.labels("hit").inc()
+    return conditional_response(request, entry)
+
+
+async def cached_json(request: Request, key: Hashable, build: Callable[[], Awaitable], tags: Tuple[str, ...] = (), **kwargs) -> Response:
+    return await cached_response(request, key, build, tags=tags, **kwargs)
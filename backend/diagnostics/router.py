@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timedelta
+from typing import Optional
+from configuration.indexes import explain_queries
+from backend.Settings.registry import unit_registry
+
+DiagnosticsRouter = APIRouter()
+
+
+# explain() plans of the hot queries; flags collection scans and in-memory sorts
+@DiagnosticsRouter.get("/api/v1/diagnostics/query_plans")
+async def get_query_plans(
+    unit_ID: Optional[int] = None,
+    hours: int = Query(24, ge=1, description="Length of the history range that is explained"),
+):
+    if unit_ID is None:
+        unit_ids = await unit_registry.unit_ids()
+        if not unit_ids:
+            raise HTTPException(status_code=404, detail="No units configured")
+        unit_ID = unit_ids[0]
+
+    end = datetime.utcnow()
+    plans = await explain_queries(unit_ID, end - timedelta(hours=hours), end)
+    return {
+        "unit_ID": unit_ID,
+        "plans": plans,
+        "collection_scans": [plan["name"] for plan in plans if plan["collection_scan"]],
+        "in_memory_sorts": [plan["name"] for plan in plans if plan["in_memory_sort"]],
+    }
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List
+import asyncio
+import os
+from configuration.database import readings
+from backend.export.writers import EXPORT_FORMATS, EXPORT_FIELDS, pa
+from backend.Settings.registry import unit_registry
+from backend.retention.archive import archive_store, to_docs
+
+ExportRouter = APIRouter()
+
+# Rows read from the cursor and encoded per chunk; bounds memory per export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+
+def encode_archived(writer, unit_ID: int, columns: dict, offset: int) -> bytes:
+    batch = {name: values[offset:offset + EXPORT_BATCH_SIZE] for name, values in columns.items()}
+    return writer.write(to_docs(unit_ID, batch, EXPORT_FIELDS))
+
+
+async def export_chunks(writer, unit_IDs: List[int], start: datetime, end: datetime):
+    # Cursor batches are encoded on a thread so the event loop keeps serving
+    loop = asyncio.get_running_loop()
+    projection = {"_id": 0, "unit_ID": 1, "created_at": 1, **{field: 1 for field in EXPORT_FIELDS}}
+    for unit_ID in sorted(set(unit_IDs)):
+        # Archived readings of the unit first, then what is still in MongoDB
+        columns = await loop.run_in_executor(None, archive_store.read, unit_ID, start, end)
+        for offset in range(0, len(columns["created_at"]) if columns else 0, EXPORT_BATCH_SIZE):
+            chunk = await loop.run_in_executor(None, encode_archived, writer, unit_ID, columns, offset)
+            if chunk:
+                yield chunk
+
+        query = {"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}}
+        cursor = readings.find(query, projection).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+        while True:
+            docs = await cursor.to_list(length=EXPORT_BATCH_SIZE)
+            if not docs:
+                break
+            chunk = await loop.run_in_executor(None, writer.write, docs)
+            if chunk:
+                yield chunk
+    yield await loop.run_in_executor(None, writer.close)
+
+
+# Bulk history of one or more units as Parquet, Arrow IPC stream or gzipped CSV
+# e.g. /api/v1/export?unit_ID=1&unit_ID=2&start_time=2024-10-01T00:00:00Z&end_time=2024-11-01T00:00:00Z&format=parquet
+@ExportRouter.get("/api/v1/export")
+async def export_history(
+    unit_ID: List[int] = Query(..., description="Unit to export; repeat for several units"),
+    start_time: str = Query(...),
+    end_time: str = Query(...),
+    format: str = Query("parquet", description="parquet, arrow or csv (gzipped)"),
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid export format")
+    writer_class, suffix, media_type, needs_arrow = EXPORT_FORMATS[format]
+    if needs_arrow and pa is None:
+        raise HTTPException(status_code=501, detail=f"{format} export requires the pyarrow package")
+
+    for unit in unit_ID:
+        if not await unit_registry.exists(unit):
+            raise HTTPException(status_code=404, detail=f"Invalid unit ID {unit}")
+
+    try:
+        start_dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+        end_dt = datetime.fromisoformat(end_time.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    filename = f"readings_{'-'.join(str(unit) for unit in unit_ID)}_{start_dt:%Y%m%d}_{end_dt:%Y%m%d}{suffix}"
+    return StreamingResponse(
+        export_chunks(writer_class(), unit_ID, start_dt, end_dt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,129 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import List
+import pytz
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet and Arrow exports need the optional pyarrow package
+    pa = pq = None
+
+# Reading fields included in exports, after unit_ID and created_at
+EXPORT_FIELDS = ("t", "h", "w", "eb", "ups")
+COLUMNS = ("unit_ID", "created_at") + EXPORT_FIELDS
+
+
+def _naive_utc(values: List[datetime]) -> List[datetime]:
+    # MongoDB returns naive UTC; only aware values need converting
+    if values and values[0].tzinfo is not None:
+        return [value.astimezone(pytz.utc).replace(tzinfo=None) for value in values]
+    return values
+
+
+class ChunkSink:
+    # Write-only file object that hands back what was written since the last drain
+    closed = False
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def arrow_schema():
+    return pa.schema(
+        [("unit_ID", pa.int32()), ("created_at", pa.timestamp("ms", tz="UTC"))]
+        + [(field, pa.float64()) for field in ("t", "h", "w")]
+        + [(field, pa.int32()) for field in ("eb", "ups")]
+    )
+
+
+def arrow_batch(docs: List[dict], schema):
+    arrays = [
+        pa.array([doc["unit_ID"] for doc in docs], pa.int32()),
+        pa.array(_naive_utc([doc["created_at"] for doc in docs]), pa.timestamp("ms")).cast(pa.timestamp("ms", tz="UTC")),
+    ]
+    for field in EXPORT_FIELDS:
+        arrays.append(pa.array([doc.get(field) for doc in docs], schema.field(field).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ParquetExport:
+    # One zstd-compressed row group per batch; the footer is written on close
+    def __init__(self):
+        self.sink = ChunkSink()
+        self.schema = arrow_schema()
+        self.writer = pq.ParquetWriter(
+            self.sink, self.schema, compression="zstd",
+            use_dictionary=[name for name in self.schema.names if name != "created_at"],
+            column_encoding={"created_at": "DELTA_BINARY_PACKED"},  # Regular intervals pack to a few bits
+        )
+
+    def write(self, docs: List[dict]) -> bytes:
+        self.writer.write_batch(arrow_batch(docs, self.schema))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+class ArrowExport:
+    # Arrow IPC stream format, readable with pyarrow.ipc.open_stream
+    def __init__(self):
+        self.sink = ChunkSink()
+        self.schema = arrow_schema()
+        self.writer = pa.ipc.new_stream(self.sink, self.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    def write(self, docs: List[dict]) -> bytes:
+        self.writer.write_batch(arrow_batch(docs, self.schema))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+class CsvExport:
+    # gzip member written incrementally; timestamps are UTC ISO 8601
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.header = True
+
+    def write(self, docs: List[dict]) -> bytes:
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator="\n")
+        if self.header:
+            writer.writerow(COLUMNS)
+            self.header = False
+        times = [value.isoformat(timespec="milliseconds") + "Z" for value in _naive_utc([doc["created_at"] for doc in docs])]
+        writer.writerows(
+            (doc["unit_ID"], time, *[doc.get(field) for field in EXPORT_FIELDS])
+            for doc, time in zip(docs, times)
+        )
+        return self.compressor.compress(text.getvalue().encode())
+
+    def close(self) -> bytes:
+        if self.header:
+            self.write([])
+        return self.compressor.flush()
+
+
+# format -> (writer class, file suffix, media type, needs pyarrow)
+EXPORT_FORMATS = {
+    "parquet": (ParquetExport, ".parquet", "application/vnd.apache.parquet", True),
+    "arrow": (ArrowExport, ".arrows", "application/vnd.apache.arrow.stream", True),
+    "csv": (CsvExport, ".csv.gz", "application/gzip", False),
+}
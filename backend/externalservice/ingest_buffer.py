@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from pymongo.errors import BulkWriteError
+from backend.externalservice.schemas import BoardReading
+from backend.Graph.router import build_log_entry, series_store
+from backend.Graph.timeseries import to_epoch_ms
+from backend.rollup.rollups import GRANULARITIES, backfill_rollups, bucket_start, update_rollups
+from backend.metrics.registry import INGEST_READINGS
+from backend.cache.response_cache import response_cache, unit_tag
+
+logger = logging.getLogger("my_logger")
+
+# Fields merged into the latest-state document of each board
+STATE_FIELDS = ("t", "h", "w", "eb", "ups", "x", "y")
+DUPLICATE_KEY = 11000
+# Stage reached once the history rows (1) and states (2) are written, then
+# one stage per rollup granularity
+ROLLUP_STAGES = {granularity: stage for stage, granularity in enumerate(GRANULARITIES, start=3)}
+DONE = len(GRANULARITIES) + 2
+
+
+class BufferFull(Exception):
+    """Raised by ``add`` when the buffer is full and cannot be flushed; nothing was queued."""
+
+
+class PendingBatch:
+    """Readings taken from the buffer by one flush, kept until all its writes succeed.
+
+    ``stage`` counts the writes already done (history rows, state, each
+    rollup granularity), so a retry after a failure never repeats a finished
+    write.  Rollup writes increment, so one that failed part way may have
+    been applied in part; ``rebuild`` then has the retry rebuild the touched
+    buckets from the stored rows instead of incrementing them again.
+    """
+
+    def __init__(self, readings: List[BoardReading]):
+        self.size = len(readings)
+        self.stage = 0
+        self.rebuild = False
+
+        # Group history rows per unit and merge the latest state of each unit
+        self.history: Dict[int, List[dict]] = OrderedDict()
+        self.latest: Dict[int, dict] = OrderedDict()
+        for reading in readings:
+            self.history.setdefault(reading.unit_ID, []).append(build_log_entry(
+                reading.unit_ID, reading.t, reading.h, reading.w,
+                reading.eb, reading.ups, reading.x, reading.y,
+                created_at=reading.created_at,
+            ))
+            state = self.latest.setdefault(reading.unit_ID, {})
+            for field in STATE_FIELDS:
+                value = getattr(reading, field)
+                if value is not None:
+                    state[field] = value
+        self.entries = [entry for unit_entries in self.history.values() for entry in unit_entries]
+
+
+class IngestBuffer:
+    """Bounded in-process buffer that writes sensor readings in bulk.
+
+    Readings are queued by ``add`` and written on ``flush``, which runs
+    when ``batch_size`` readings are waiting or every ``flush_interval``
+    seconds.  A flush issues one ``insert_many`` for the history rows and one
+    bulk update of the state store holding the merged latest state per unit.
+    Once ``max_pending`` readings are queued, ``add`` waits for a flush,
+    pushing back on the caller, and raises ``BufferFull`` without queueing
+    anything when that flush fails.  A batch whose writes fail is kept and
+    retried ahead of newer readings by the next flush.
+    """
+
+    def __init__(
+        self,
+        collection,
+        registry,
+        states,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        on_flush: Optional[Callable[[Dict[int, dict], Dict[int, List[dict]]], Awaitable[None]]] = None,
+    ):
+        self.collection = collection
+        self.registry = registry
+        self.states = states
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self.on_flush = on_flush
+        self._pending: List[BoardReading] = []
+        self._failed: Optional[PendingBatch] = None
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._pending) + (self._failed.size if self._failed is not None else 0)
+
+    async def add(self, readings: List[BoardReading]):
+        for reading in readings:
+            if not await self.registry.exists(reading.unit_ID):
+                raise ValueError(f"Invalid unit_ID: {reading.unit_ID}")
+
+        # Back-pressure: a full buffer must drain before it accepts more
+        while len(self) and len(self) + len(readings) > self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                raise BufferFull(f"Ingest buffer is full and could not be flushed: {e}") from e
+        self._pending.extend(readings)
+
+        # The readings are queued now; a failed flush leaves them to the next one
+        if len(self._pending) >= self.batch_size:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ingest buffer flush failed: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            # A batch that failed before is finished first; newer readings wait for the next flush
+            if self._failed is not None:
+                batch = self._failed
+            elif self._pending:
+                batch = self._failed = PendingBatch(self._pending)
+                self._pending = []
+            else:
+                return
+
+            if batch.stage < 1:
+                await self._insert(batch.entries)
+                batch.stage = 1
+                # In-process views only learn about rows that are stored
+                for unit_ID, unit_entries in batch.history.items():
+                    INGEST_READINGS.labels(unit_ID).inc(len(unit_entries))
+                    response_cache.invalidate(unit_tag(unit_ID), [to_epoch_ms(entry["created_at"]) for entry in unit_entries])
+                series_store.extend(batch.entries)
+
+            if batch.stage < 2:
+                await self.states.update_many(batch.latest)
+                batch.stage = 2
+
+            if batch.rebuild:
+                await self._rebuild_rollups(batch)
+                batch.stage = DONE
+            for granularity, stage in ROLLUP_STAGES.items():
+                if batch.stage < stage:
+                    try:
+                        await update_rollups(batch.entries, [granularity])
+                    except Exception:
+                        batch.rebuild = True
+                        raise
+                    batch.stage = stage
+            self._failed = None
+
+            logger.info(f"Flushed {batch.size} readings for {len(batch.history)} units")
+
+        if self.on_flush is not None:
+            await self.on_flush(batch.latest, batch.history)
+
+    async def _insert(self, entries: List[dict]):
+        # insert_many sets each entry's _id, so rows stored by an earlier
+        # partial attempt come back as duplicate-key errors and are skipped
+        try:
+            await self.collection.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if e.details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in errors):
+                raise
+
+    async def _rebuild_rollups(self, batch: PendingBatch):
+        # Whole days around the batch's readings, per unit, from the stored rows
+        for unit_ID, unit_entries in batch.history.items():
+            created_at = [entry["created_at"] for entry in unit_entries]
+            await backfill_rollups(unit_ID, min(created_at), bucket_start(max(created_at), "1d") + GRANULARITIES["1d"])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ingest buffer flush failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
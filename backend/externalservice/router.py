@@ -1,29 +1,79 @@
-from fastapi import WebSocket, APIRouter, HTTPException, Query, WebSocketDisconnect
-from configuration.database import Board_1, Board_2, Board_3  # Assuming this is the DB connection setup
-from typing import Optional, List
-from backend.externalservice.schemas import BoardData
-from backend.Graph.router import update_graph_collection
+from fastapi import WebSocket, APIRouter, HTTPException, Query, WebSocketDisconnect, Request, Depends
+from configuration.database import readings, alert_events  # Assuming this is the DB connection setup
+from typing import Optional, List, Dict
+from pydantic import ValidationError
+from backend.externalservice.schemas import BoardData, BoardReading
+from backend.externalservice.ingest_buffer import BufferFull, IngestBuffer, STATE_FIELDS
+from backend.externalservice.state import board_states
+from backend.Graph.router import update_graph_collection, broadcast_graph_data, graph_hub
+from backend.broadcast.hub import BroadcastHub
+from backend.broadcast.bus import message_bus
+from backend.broadcast.encoding import negotiate
+from backend.Settings.registry import unit_registry
+from backend.userauth.tokens import require_user
+from backend.alerts.engine import AlertEngine, ALERT_HYSTERESIS, ALERT_DEBOUNCE
+from backend.metrics.registry import timed
+from backend.cache.response_cache import cached_json, UNITS_TAG
 import logging
 import json
+import os
 
 BoardRouter = APIRouter()
 logger = logging.getLogger("my_logger")
 
-# Global list to keep track of connected WebSocket clients
-connected_clients = []
-
-# Mapping of unit_ID to corresponding board collections
-BOARD_COLLECTIONS = {
-    1: Board_1,
-    2: Board_2,
-    3: Board_3,
-    # You can add more mappings here if needed
-}
-
-@BoardRouter.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+# Dashboard WebSocket subscribers; every client follows all units until it subscribes
+dashboard_hub = BroadcastHub("dashboard")
+
+
+# Alert events go to the dashboard clients of the unit, here and on other workers
+async def broadcast_alerts(events: List[dict]):
+    for event in events:
+        dashboard_hub.publish(event["unit_ID"], event)
+        await message_bus.publish("alert", event)
+
+async def receive_alert(event: dict):
+    dashboard_hub.publish(event["unit_ID"], event)
+
+message_bus.subscribe("alert", receive_alert)
+
+alert_engine = AlertEngine(
+    unit_registry,
+    alert_events,
+    hysteresis=ALERT_HYSTERESIS,
+    debounce=ALERT_DEBOUNCE,
+    on_alert=broadcast_alerts,
+)
+
+# Broadcast the merged state of every unit touched by a buffered flush
+async def broadcast_flushed_readings(latest: Dict[int, dict], history: Dict[int, List[dict]]):
+    for unit_ID, state in latest.items():
+        await alert_engine.check_many(unit_ID, history[unit_ID])
+        await send_to_all_clients({"unit_ID": unit_ID, **state})
+        await broadcast_graph_data(unit_ID, history[unit_ID])
+        await message_bus.publish("readings", {"unit_ID": unit_ID, "entries": history[unit_ID]})
+
+# Buffer for the batch ingest endpoint, flushed on size or time
+ingest_buffer = IngestBuffer(
+    readings,
+    unit_registry,
+    board_states,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0")),
+    max_pending=int(os.getenv("INGEST_MAX_PENDING", "10000")),
+    on_flush=broadcast_flushed_readings,
+)
+
+# ?format=msgpack sends state updates as MessagePack binary frames instead of JSON text
+@BoardRouter.websocket("/ws", dependencies=[Depends(require_user)])
+async def websocket_endpoint(websocket: WebSocket, format: Optional[str] = None):
     await websocket.accept()  # Accept the WebSocket connection
-    connected_clients.append(websocket)  # Add the client to the connected clients list
+    try:
+        fmt = negotiate(format, None)
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close()
+        return
+    subscriber = dashboard_hub.subscribe(websocket, format=fmt)  # Queue and writer task for this client
 
     try:
         while True:
@@ -32,13 +82,20 @@ async def websocket_endpoint(websocket: WebSocket):
 
             # Parse the message as JSON
             data = json.loads(message)  # Convert the JSON string to a dictionary
+
+            # {"type": "subscribe", "unit_IDs": [1, 2]} narrows the client to those units
+            if data.get("type") == "subscribe":
+                unit_IDs = data.get("unit_IDs")
+                dashboard_hub.update(subscriber, None if unit_IDs is None else [int(u) for u in unit_IDs])
+                continue
+
             unit_ID = int(data.get("unit_ID"))  # Get unit_ID from the parsed dictionary
 
-            if unit_ID not in BOARD_COLLECTIONS:
+            if not await unit_registry.exists(unit_ID):
                 raise ValueError("Invalid unit_ID")
 
             # Handle the unit_ID message
-            board_data = BOARD_COLLECTIONS[unit_ID].find_one({"unit_ID": unit_ID})
+            board_data = await board_states.get(unit_ID)
 
             if board_data:
                 response = {
@@ -53,38 +110,50 @@ async def websocket_endpoint(websocket: WebSocket):
                 }
                 await send_to_all_clients(response)  # Send data to all connected clients
             else:
-                await send_to_all_clients({"error": "Unit ID not found"})  # Notify all clients if unit_ID is not found
+                subscriber.send({"error": "Unit ID not found"})  # Notify the requesting client
 
     except WebSocketDisconnect:
         logging.info(f"Client disconnected: {websocket.client}")
-        connected_clients.remove(websocket)  # Remove client from the list
 
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
     finally:
-        await websocket.close()  # Ensure the connection is closed
+        await dashboard_hub.unsubscribe(subscriber)  # Remove client and stop its writer
+        try:
+            await websocket.close()  # Ensure the connection is closed
+        except Exception:
+            pass
 
+def publish_state(message: dict):
+    # Encoded once and queued for every client following the unit; a newer
+    # state of the same unit replaces one a slow client has not received yet
+    unit_ID = message.get("unit_ID")
+    dashboard_hub.publish(unit_ID, message, key=f"state:{unit_ID}" if unit_ID is not None else None)
+
+@timed
 async def send_to_all_clients(message: dict):
-    for client in connected_clients:
-        try:
-            # Ensure the complete message with all necessary fields
-            await client.send_json(message)
-        except Exception as e:
-            logging.error(f"Error sending message to client: {e}")
-            if client in connected_clients:
-                connected_clients.remove(client)  # Remove if failed
+    publish_state(message)
+    await message_bus.publish("state", message)
+
+# State changed by another worker: refresh the cached copy and notify local clients
+async def receive_state(message: dict):
+    unit_ID = message.get("unit_ID")
+    if unit_ID is not None:
+        board_states.apply(unit_ID, {k: v for k, v in message.items() if k != "unit_ID"})
+    publish_state(message)
 
+message_bus.subscribe("state", receive_state)
 
-@BoardRouter.get("/api/v1/dashboard/create")
+
+@BoardRouter.get("/api/v1/dashboard/create", dependencies=[Depends(require_user)])
 async def create_server(unit_ID: int):
     logger.info(f"Creating new server with unit_ID: {unit_ID}")
     
     # Check if the unit_ID is valid
-    if unit_ID not in BOARD_COLLECTIONS:
+    if not await unit_registry.exists(unit_ID):
         raise HTTPException(status_code=400, detail=f"Invalid unit_ID {unit_ID}")
 
-    collection = BOARD_COLLECTIONS[unit_ID]
-    existing_server = collection.find_one({"unit_ID": unit_ID})
+    existing_server = await board_states.get(unit_ID)
     
     if existing_server:
         raise HTTPException(status_code=400, detail=f"Server with unit_ID {unit_ID} already exists")
@@ -100,14 +169,11 @@ async def create_server(unit_ID: int):
         "y": 0
     }
 
-    result = collection.insert_one(new_server)
+    new_server = await board_states.create(new_server)
 
-    if result.acknowledged:
-        logger.info(f"Server created successfully: {new_server}")
-        await send_to_all_clients(new_server)  # Notify all connected clients about the new server
-        return {"unit_ID": unit_ID, "status": "Server created successfully"}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to create server")
+    logger.info(f"Server created successfully: {new_server}")
+    await send_to_all_clients(new_server)  # Notify all connected clients about the new server
+    return {"unit_ID": unit_ID, "status": "Server created successfully"}
 
 @BoardRouter.get("/api/v1/dashboard/{unit_ID}", response_model=BoardData)
 async def get_and_update_dashboard(
@@ -123,39 +189,26 @@ async def get_and_update_dashboard(
     logger.info(f"Updating data for unit_ID: {unit_ID}")
 
     # Check if the unit_ID is valid
-    if unit_ID not in BOARD_COLLECTIONS:
+    if not await unit_registry.exists(unit_ID):
         raise HTTPException(status_code=404, detail="Invalid unit_ID")
 
-    collection = BOARD_COLLECTIONS[unit_ID]
-    board_data = collection.find_one({"unit_ID": unit_ID})
+    # Only the supplied values change; the rest of the latest state is kept
+    supplied = {"t": t, "h": h, "w": w, "eb": eb, "ups": ups, "x": x, "y": y}
+    board_data = await board_states.update(unit_ID, {k: v for k, v in supplied.items() if v is not None})
 
     if board_data is None:
         raise HTTPException(status_code=404, detail="Data not found")
 
-    # Update board values
-    update_values = {
-        "t": t if t is not None else board_data["t"],
-        "h": h if h is not None else board_data["h"],
-        "w": w if w is not None else board_data["w"],
-        "eb": eb if eb is not None else board_data["eb"],
-        "ups": ups if ups is not None else board_data["ups"],
-        "x": x,
-        "y": y,
-        
-
-    }
-
-    # Update the document with new values
-    result = collection.update_one({"unit_ID": unit_ID}, {"$set": update_values})
-
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Failed to update data, unit_ID not found")
+    update_values = {field: board_data.get(field) for field in STATE_FIELDS}
 
     logger.info(f"Board data updated successfully: {update_values}")
 
     # Update the Graph collection to store the temperature and humidity
     await update_graph_collection(unit_ID, t, h, w, eb, ups, x, y)
 
+    # Check the reading against the unit's limits (in memory, no database read)
+    await alert_engine.check(unit_ID, {"t": t, "h": h, "w": w})
+
     await send_to_all_clients({
         "unit_ID": unit_ID,
         **update_values
@@ -167,16 +220,42 @@ async def get_and_update_dashboard(
         **update_values
     }
 
-@BoardRouter.get("/api/v1/unitIDs", response_model=List[int])
-def get_unit_ids():
+# Batch ingest: a JSON array or NDJSON body with readings from many units
+@BoardRouter.post("/api/v1/dashboard/batch", status_code=202)
+async def ingest_batch(request: Request):
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+            if isinstance(items, dict):
+                items = [items]
+        batch = [BoardReading(**item) for item in items]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch payload: {e}")
+
+    try:
+        await ingest_buffer.add(batch)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BufferFull as e:
+        # Nothing was queued, so the client can safely send the batch again
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    logger.info(f"Queued {len(batch)} readings for batch ingest")
+    return {"status": "queued", "accepted": len(batch), "pending": len(ingest_buffer)}
+
+@BoardRouter.get("/api/v1/broadcast/stats", dependencies=[Depends(require_user)])
+async def get_broadcast_stats():
+    # Subscribers, queued and dropped messages of the WebSocket hubs
+    return {"dashboard": dashboard_hub.stats(), "graph": graph_hub.stats()}
+
+@BoardRouter.get("/api/v1/unitIDs", response_model=List[int], dependencies=[Depends(require_user)])
+async def get_unit_ids(request: Request):
     logger.info("Fetching all unit IDs")
-    
-    # Collect unit IDs from all board collections
-    unit_ids = set()  # Use a set to avoid duplicates
-    for collection in BOARD_COLLECTIONS.values():
-        ids = [board["unit_ID"] for board in collection.find({}, {"unit_ID": 1})]
-        unit_ids.update(ids)  # Add the IDs to the set
-
-    unit_ids = list(unit_ids)  # Convert set back to list
-    logger.info(f"Unit IDs retrieved: {unit_ids}")
-    return unit_ids
+
+    # Served from the cached unit registry; the encoded list is cached until units change
+    return await cached_json(request, "unitIDs", unit_registry.unit_ids, (UNITS_TAG,))
@@ -12,4 +12,15 @@ class BoardData(BaseModel):
     x: int
     y: int
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+class BoardReading(BaseModel):
+    unit_ID: int
+    t: Optional[int] = None
+    h: Optional[int] = None
+    w: Optional[int] = None
+    eb: Optional[int] = None
+    ups: Optional[int] = None
+    x: Optional[int] = 1
+    y: Optional[int] = 1
+    created_at: Optional[datetime] = None  # Time the board took the reading
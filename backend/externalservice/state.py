@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from configuration.database import board_state
+
+
+class BoardStateStore:
+    """Latest state of every board, one document per unit, kept apart from history.
+
+    Reads are served from an in-process cache that every write through this
+    store updates.  Cached entries expire after ``ttl`` seconds so writes made
+    by other worker processes become visible.
+    """
+
+    def __init__(self, collection, ttl: float = 5.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._cache: Dict[int, Tuple[dict, float]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def _cached(self, unit_ID: int) -> Optional[dict]:
+        entry = self._cache.get(unit_ID)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            return entry[0]
+        return None
+
+    def _store(self, unit_ID: int, state: Optional[dict]):
+        if state is None:
+            self._cache.pop(unit_ID, None)
+        else:
+            self._cache[unit_ID] = (state, time.monotonic())
+
+    async def get(self, unit_ID: int) -> Optional[dict]:
+        state = self._cached(unit_ID)
+        if state is not None:
+            return state
+        # One database read per unit however many callers miss at once
+        async with self._locks.setdefault(unit_ID, asyncio.Lock()):
+            state = self._cached(unit_ID)
+            if state is None:
+                state = await self.collection.find_one({"unit_ID": unit_ID}, {"_id": 0})
+                self._store(unit_ID, state)
+        return state
+
+    async def create(self, state: dict) -> dict:
+        state = dict(state)
+        await self.collection.insert_one(state)
+        state.pop("_id", None)
+        self._store(state["unit_ID"], state)
+        return state
+
+    async def update(self, unit_ID: int, values: dict) -> Optional[dict]:
+        # Returns the merged state, or None when the unit has no state document
+        state = await self.collection.find_one_and_update(
+            {"unit_ID": unit_ID},
+            {"$set": values},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        self._store(unit_ID, state)
+        return state
+
+    async def update_many(self, latest: Dict[int, dict]):
+        # One bulk write for many units; cached entries are merged in place
+        operations = [UpdateOne({"unit_ID": unit_ID}, {"$set": values}) for unit_ID, values in latest.items() if values]
+        if not operations:
+            return
+        await self.collection.bulk_write(operations, ordered=False)
+        for unit_ID, values in latest.items():
+            self.apply(unit_ID, values)
+
+    def apply(self, unit_ID: int, values: dict):
+        # Merge a change that is already stored into the cached state, if any
+        cached = self._cached(unit_ID)
+        if cached is not None:
+            self._store(unit_ID, {**cached, **values})
+
+    async def delete(self, unit_ID: int) -> bool:
+        result = await self.collection.delete_one({"unit_ID": unit_ID})
+        self._store(unit_ID, None)
+        return result.deleted_count > 0
+
+    def invalidate(self, unit_ID: Optional[int] = None):
+        if unit_ID is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(unit_ID, None)
+
+
+board_states = BoardStateStore(board_state, ttl=float(os.getenv("BOARD_STATE_CACHE_TTL", "5")))
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from pymongo import monitoring
+from backend.metrics.registry import METRICS_ENABLED, MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES, EVENT_LOOP_LAG
+
+logger = logging.getLogger("my_logger")
+
+# How often the event loop is probed for scheduling delay, in seconds
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command per collection and command name.
+
+    The driver reports start and end separately, so the collection name seen
+    on start is kept by request id until the command finishes.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, int], Tuple[str, str]] = {}
+
+    def started(self, event):
+        command = event.command_name
+        target = event.command.get("collection") if command == "getMore" else event.command.get(command)
+        collection = target if isinstance(target, str) else "-"
+        self._inflight[(event.request_id, event.operation_id)] = (collection, command)
+
+    def _finish(self, event) -> Optional[Tuple[str, str]]:
+        return self._inflight.pop((event.request_id, event.operation_id), None)
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        if labels is not None:
+            MONGO_COMMAND_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        if labels is not None:
+            MONGO_COMMAND_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+            MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+
+def mongo_listeners() -> List[monitoring.CommandListener]:
+    # Passed as event_listeners when the Mongo clients are created
+    return [MongoCommandListener()] if METRICS_ENABLED else []
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up on the event loop.
+
+    A wake-up delayed beyond ``interval`` means something held the loop:
+    blocking I/O, heavy CPU work or a long callback.
+    """
+
+    def __init__(self, interval: float = EVENT_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.labels().observe(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        if METRICS_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_lag_monitor = LoopLagMonitor()
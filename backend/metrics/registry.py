@@ -0,0 +1,226 @@
+import abc
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# METRICS_ENABLED=0 turns timing hooks and the Mongo listener off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Upper bounds in seconds, from sub-millisecond Mongo calls to slow reports
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        # Children are created once per label set and reused on the hot path
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    @abc.abstractmethod
+    def _child(self):
+        """A new child holding the value of one label set."""
+
+    @abc.abstractmethod
+    def _samples(self, values: Tuple, child) -> List[str]:
+        """Exposition lines of one child."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        # Read when /metrics is scraped, for values that already live elsewhere
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeChild()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.get())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()  # Mongo events arrive on driver threads
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values, child):
+        with child.lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics exposed at ``/metrics`` in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+INGEST_READINGS = registry.register(Counter(
+    "ingest_readings_total", "Readings stored, per unit.", ("unit_ID",)))
+MONGO_COMMAND_SECONDS = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", ("collection", "command")))
+MONGO_COMMAND_FAILURES = registry.register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed.", ("collection", "command")))
+WEBSOCKET_CLIENTS = registry.register(Gauge(
+    "websocket_clients", "Connected WebSocket clients.", ("hub",)))
+WEBSOCKET_QUEUED = registry.register(Gauge(
+    "websocket_queued_messages", "Messages waiting in client send queues.", ("hub",)))
+WEBSOCKET_QUEUE_MAX = registry.register(Gauge(
+    "websocket_queue_depth_max", "Longest client send queue.", ("hub",)))
+WEBSOCKET_DROPPED = registry.register(Gauge(
+    "websocket_dropped_messages", "Messages dropped from full queues of connected clients.", ("hub",)))
+BROADCAST_FANOUT_SECONDS = registry.register(Histogram(
+    "broadcast_fanout_seconds", "Time to encode a message and queue it for every recipient.", ("hub",)))
+REPORT_RENDER_SECONDS = registry.register(Histogram(
+    "report_render_seconds", "Report rendering time, queueing excluded.", ("format", "status")))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "event_loop_lag_seconds", "Delay of a scheduled wake-up on the event loop.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+FUNCTION_SECONDS = registry.register(Histogram(
+    "function_duration_seconds", "Time spent in instrumented hot-path functions.", ("function",)))
+RESPONSE_CACHE_REQUESTS = registry.register(Counter(
+    "response_cache_requests_total", "Cached GET responses served, by hit or miss.", ("result",)))
+RESPONSE_CACHE_ENTRIES = registry.register(Gauge(
+    "response_cache_entries", "Responses held in the in-process response cache."))
+
+
+def timed(function):
+    # Records every call of ``function`` in function_duration_seconds
+    if not METRICS_ENABLED:
+        return function
+    histogram = FUNCTION_SECONDS.labels(function.__name__)
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
@@ -0,0 +1,19 @@
+import hmac
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from backend.metrics.registry import registry
+
+MetricsRouter = APIRouter()
+
+# Optional bearer token for scrapers; /metrics is open when unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@MetricsRouter.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
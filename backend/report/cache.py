@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+PINNED_PREFIX = "pinned-"
+
+
+class ReportCache:
+    """On-disk cache of rendered reports keyed by their inputs.
+
+    Keys hash the unit, window, format and a version of the window's rows
+    (count and newest ``_id``), so a new reading simply produces a new key and stale files age out through
+    LRU eviction once ``max_entries`` or ``max_bytes`` is exceeded.  Reports
+    for closed days never change; they are stored pinned and never evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_entries: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (path, size, pinned)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # Re-index files left by a previous run, oldest access first
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                files.append((os.stat(path).st_atime, name, path))
+        for _, name, path in sorted(files):
+            pinned = name.startswith(PINNED_PREFIX)
+            key = os.path.splitext(name[len(PINNED_PREFIX):] if pinned else name)[0]
+            self.entries[key] = (path, os.path.getsize(path), pinned)
+
+    @staticmethod
+    def key(unit_ID: int, start, end, fmt: str, version: Optional[str]) -> str:
+        raw = f"{unit_ID}|{start.isoformat()}|{end.isoformat()}|{fmt}|{version or '-'}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or not os.path.exists(entry[0]):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, source_path: str, suffix: str, pinned: bool = False) -> str:
+        # Move the rendered file into the cache and return its new path
+        name = f"{PINNED_PREFIX if pinned else ''}{key}{suffix}"
+        path = os.path.join(self.directory, name)
+        os.replace(source_path, path)
+        with self._lock:
+            self.entries[key] = (path, os.path.getsize(path), pinned)
+            self.entries.move_to_end(key)
+            self._evict()
+        return path
+
+    def _evict(self):
+        unpinned = [key for key, (_, _, pinned) in self.entries.items() if not pinned]
+        total = sum(size for _, size, _ in self.entries.values())
+        # Least recently used first; pinned reports are kept indefinitely
+        for key in unpinned:
+            if total <= self.max_bytes and len(self.entries) <= self.max_entries:
+                break
+            path, size, _ = self.entries.pop(key)
+            total -= size
+            self.evictions += 1
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "pinned": sum(1 for _, _, pinned in self.entries.values() if pinned),
+                "bytes": sum(size for _, size, _ in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from backend.report.render import render_report_file
+from backend.metrics.registry import REPORT_RENDER_SECONDS, FUNCTION_SECONDS
+
+logger = logging.getLogger("my_logger")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+
+
+class JobQueueFull(Exception):
+    """Raised by ``submit`` when ``max_queued`` jobs are already waiting."""
+
+
+class ReportJob:
+    def __init__(self, fmt: str, unit_ID: int):
+        self.id = uuid.uuid4().hex
+        self.format = fmt
+        self.unit_ID = unit_ID
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "unit_ID": self.unit_ID,
+            "format": self.format,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ReportJobs:
+    """Bounded report rendering on a process pool.
+
+    At most ``max_concurrency`` jobs render at once; the rest wait in
+    submission order, up to ``max_queued`` of them.  A job running longer
+    than ``timeout`` seconds is marked timed out and the pool is recycled so
+    the stuck worker cannot hold a slot.  Finished results are kept for
+    ``ttl`` seconds.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, timeout: float, ttl: float, max_queued: int = 20):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_queued = max_queued
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.jobs: Dict[str, ReportJob] = {}
+        self.out_dir = tempfile.mkdtemp(prefix="humidity-reports-")
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers must not inherit the parent's event loop or Mongo sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _recycle_executor(self, executor: ProcessPoolExecutor):
+        # Jobs that failed on a pool already replaced must not recycle its successor
+        if self._executor is not executor:
+            return
+        self._executor = None
+        # No public API stops a single running task; terminate this pool's workers
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fmt: str, unit_ID: int, collection_name: str, query: dict, graph_points) -> ReportJob:
+        self.expire()
+        if sum(job.status == PENDING for job in self.jobs.values()) >= self.max_queued:
+            raise JobQueueFull(f"{self.max_queued} report jobs are already waiting")
+        job = ReportJob(fmt, unit_ID)
+        self.jobs[job.id] = job
+        asyncio.create_task(self._run(job, collection_name, query, graph_points))
+        return job
+
+    async def _run(self, job: ReportJob, collection_name: str, query: dict, graph_points):
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            job.status = RUNNING
+            started = time.perf_counter()
+            executor = self.executor
+            try:
+                future = loop.run_in_executor(
+                    executor, render_report_file,
+                    job.format, job.unit_ID, collection_name, query, graph_points, self.out_dir,
+                )
+                job.path, graph_seconds = await asyncio.wait_for(future, self.timeout)
+                FUNCTION_SECONDS.labels("generate_graph").observe(graph_seconds)
+                job.status = DONE
+            except asyncio.TimeoutError:
+                job.status = TIMED_OUT
+                job.error = f"Report rendering exceeded {self.timeout} seconds"
+                self._recycle_executor(executor)
+            except BrokenProcessPool as e:
+                job.status = FAILED
+                job.error = f"Report worker stopped: {e}"
+                self._recycle_executor(executor)
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+            REPORT_RENDER_SECONDS.labels(job.format, job.status).observe(time.perf_counter() - started)
+            logger.info(f"Report job {job.id} {job.status} in {time.perf_counter() - started:.2f}s")
+
+    async def wait(self, job: ReportJob) -> ReportJob:
+        await job.done.wait()
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        self.expire()
+        return self.jobs.get(job_id)
+
+    def discard(self, job: ReportJob):
+        self.jobs.pop(job.id, None)
+        if job.path and os.path.exists(job.path):
+            os.unlink(job.path)
+
+    def expire(self):
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl:
+                self.discard(job)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        shutil.rmtree(self.out_dir, ignore_errors=True)
@@ -0,0 +1,171 @@
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from fpdf import FPDF
+from configuration.database import get_sync_db
+from configuration.shift_day import to_local_datetime64, LOCAL_TIME_LABEL
+from backend.Graph.timeseries import to_epoch_ms
+from backend.retention.archive import archive_store
+
+logger = logging.getLogger("my_logger")
+
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PDF_MEDIA_TYPE = "application/pdf"
+TIME_FORMAT = "%Y-%m-%d %I:%M:%S %p"
+CHUNK_SIZE = 64 * 1024
+ROW_BATCH_SIZE = 1000
+TIME_HEADER = f"Time ({LOCAL_TIME_LABEL})"
+
+
+def local_times(created_ats) -> list:
+    # Stored naive-UTC datetimes -> naive site-local datetimes, converted in one pass
+    ms = np.array([to_epoch_ms(created_at) for created_at in created_ats], dtype=np.int64)
+    return to_local_datetime64(ms).astype(datetime).tolist()
+
+
+# Function to generate the graph, returned as PNG bytes
+def generate_graph(times, temperatures, humidities, unit_ID):
+    # A private Figure per call: no shared pyplot state between concurrent renders
+    figure = Figure(figsize=(10, 5))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.plot(times, temperatures, label='Temperature (°C)', color='r')
+    axes.plot(times, humidities, label='Humidity (%)', color='b')
+    axes.set_title(f'Graph Data for Unit ID: {unit_ID}')
+    axes.set_xlabel(TIME_HEADER)
+    axes.set_ylabel('Values')
+    axes.tick_params(axis='x', labelrotation=45)
+    axes.legend()
+    axes.grid()
+
+    # Render into memory so concurrent reports never share a file
+    buffer = io.BytesIO()
+    try:
+        figure.savefig(buffer, format="png")
+        return buffer.getvalue()
+    except Exception:
+        logger.exception("Error saving graph")
+        return None
+
+
+class ExcelReport:
+    # Write-only workbook: rows are streamed to disk by openpyxl as they are appended
+    def __init__(self, unit_ID: int):
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title=f"Unit {unit_ID} Data")
+        self.sheet.append([TIME_HEADER, "Temperature (°C)", "Humidity (%)"])
+
+    def add_graph(self, png: bytes):
+        self.sheet.add_image(Image(io.BytesIO(png)), 'E5')  # Place image at cell E5
+
+    def append(self, time: datetime, temperature, humidity):
+        self.sheet.append([time.strftime(TIME_FORMAT), temperature, humidity])
+
+    def save(self, fileobj):
+        self.workbook.save(fileobj)
+
+
+class PdfReport:
+    def __init__(self, unit_ID: int):
+        self.pdf = FPDF()
+        self.pdf.add_page()
+        self.pdf.set_font("Arial", size=12)
+        self.graph = None
+
+        self.pdf.cell(200, 10, txt=f"Graph Data for Unit {unit_ID}", ln=True, align='C')
+        self.pdf.ln(10)
+
+        self.pdf.cell(60, 10, txt=TIME_HEADER, border=1, align='C')
+        self.pdf.cell(60, 10, txt="Temperature (°C)", border=1, align='C')
+        self.pdf.cell(60, 10, txt="Humidity (%)", border=1, align='C')
+        self.pdf.ln(10)
+
+    def add_graph(self, png: bytes):
+        self.graph = png
+
+    def append(self, time: datetime, temperature, humidity):
+        self.pdf.cell(60, 10, txt=time.strftime(TIME_FORMAT), border=1, align='C')
+        self.pdf.cell(60, 10, txt=str(temperature), border=1, align='C')
+        self.pdf.cell(60, 10, txt=str(humidity), border=1, align='C')
+        self.pdf.ln(10)
+
+    def save(self, fileobj):
+        if self.graph:
+            # FPDF only places images from a path; use a private file per report
+            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as image:
+                image.write(self.graph)
+            try:
+                self.pdf.image(image.name, x=10, y=80, w=190)
+            finally:
+                os.unlink(image.name)
+
+        output = self.pdf.output(dest="S")
+        fileobj.write(output.encode("latin-1") if isinstance(output, str) else bytes(output))
+
+
+def iter_file(fileobj, chunk_size: int = CHUNK_SIZE):
+    # Stream a finished report in chunks and release it afterwards
+    try:
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+REPORT_CLASSES = {
+    "excel": (ExcelReport, ".xlsx", EXCEL_MEDIA_TYPE),
+    "pdf": (PdfReport, ".pdf", PDF_MEDIA_TYPE),
+}
+
+
+def append_rows(report, entries: list):
+    for time, entry in zip(local_times(entry["created_at"] for entry in entries), entries):
+        report.append(time, entry.get("t", 0), entry.get("h", 0))
+
+
+# Runs in a report worker process: reads rows with a blocking cursor and
+# writes the finished report to a private file.  Returns the file's path and
+# the seconds spent in generate_graph, which the parent records in /metrics
+def render_report_file(fmt: str, unit_ID: int, collection_name: str, query: dict, graph_points, out_dir: str):
+    report_class, suffix, _ = REPORT_CLASSES[fmt]
+    report = report_class(unit_ID)
+
+    started = time.perf_counter()
+    graph = generate_graph(*graph_points, unit_ID)
+    graph_seconds = time.perf_counter() - started
+    if graph is None:
+        raise RuntimeError("Graph image could not be generated.")
+    report.add_graph(graph)
+
+    # Archived readings are older than anything left in MongoDB, so they come first
+    window = query["created_at"]
+    for docs in archive_store.iter_docs(unit_ID, window["$gte"], window["$lt"], ("t", "h"), ROW_BATCH_SIZE):
+        append_rows(report, docs)
+
+    cursor = get_sync_db()[collection_name].find(
+        query, {"_id": 0, "created_at": 1, "t": 1, "h": 1}
+    ).sort("created_at", 1).batch_size(ROW_BATCH_SIZE)
+
+    batch = []
+    for entry in cursor:
+        batch.append(entry)
+        if len(batch) == ROW_BATCH_SIZE:
+            append_rows(report, batch)
+            batch = []
+    append_rows(report, batch)
+
+    with tempfile.NamedTemporaryFile(dir=out_dir, suffix=suffix, delete=False) as output:
+        report.save(output)
+    return output.name, graph_seconds
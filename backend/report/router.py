@@ -1,196 +1,250 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.responses import JSONResponse
-from datetime import datetime, timedelta
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image
-import matplotlib.pyplot as plt
-import pytz 
-import os 
-from fpdf import FPDF
-from configuration.database import Board_1, Board_2, Board_3,db
+from datetime import datetime, timedelta, date, timezone
+import os
+from configuration.database import readings
+from configuration.shift_day import shift_day, to_local_datetime64
+from backend.rollup.rollups import rollup_series
+from backend.report.render import iter_file, REPORT_CLASSES
+from backend.report.jobs import ReportJobs, JobQueueFull, DONE, TIMED_OUT
+from backend.report.cache import ReportCache
+from backend.cache.response_cache import window_closed
+from backend.Graph.timeseries import to_epoch_ms
+from backend.Settings.registry import unit_registry
+from backend.report.stats import reading_stats, period_averages, month_bounds, DEFAULT_PERCENTILES, PERIODS
 from statistics import mean
-from typing import Dict
+from typing import Dict, Optional
 
 
 # Initialize FastAPI and Router
 app = FastAPI()
 ReportRouter = APIRouter()
 
-# MongoDB Collections Mapping
-BOARD_COLLECTIONS = {
-    1: Board_1,
-    2: Board_2,
-    3: Board_3,
-}
-
-# Timezone and Directory Setup
-IST = pytz.timezone('Asia/Kolkata')
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TEMP_DIR = os.path.join(BASE_DIR, "excel_temp")
-IMAGE_DIR = os.path.join(BASE_DIR, "graph_images")
-os.makedirs(TEMP_DIR, exist_ok=True)
-os.makedirs(IMAGE_DIR, exist_ok=True)
-
-# Function to query MongoDB data
-def query_data(unit_ID: int):
-    if unit_ID not in BOARD_COLLECTIONS:
+# Report rendering runs on a bounded process pool, off the event loop
+report_jobs = ReportJobs(
+    max_workers=int(os.getenv("REPORT_WORKERS", "2")),
+    max_concurrency=int(os.getenv("REPORT_MAX_CONCURRENCY", "2")),
+    timeout=float(os.getenv("REPORT_JOB_TIMEOUT", "120")),
+    ttl=float(os.getenv("REPORT_RESULT_TTL", "600")),
+    max_queued=int(os.getenv("REPORT_MAX_QUEUED", "20")),
+)
+
+# Rendered reports, reused until a new reading lands in their window
+report_cache = ReportCache(
+    directory=os.getenv("REPORT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_cache")),
+    max_bytes=int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    max_entries=int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "1000")),
+)
+
+# Shift day window [start, end) in UTC: the given day's, or the one in progress
+def report_window(day: Optional[date] = None):
+    return shift_day.window(day)
+
+# Query for the report window; the worker iterates it lazily in batches
+async def report_query(unit_ID: int, day: Optional[date] = None):
+    if not await unit_registry.exists(unit_ID):
         raise HTTPException(status_code=404, detail="Invalid unit ID")
-    
-    collection = BOARD_COLLECTIONS[unit_ID]
-    now = datetime.now(IST)
-    start_dt = now.replace(hour=8, minute=30, second=0, microsecond=0)
-    end_dt = (start_dt + timedelta(days=1)).replace(hour=8, minute=29, second=59)
-
-    data = collection.find({
-        "created_at": {"$gte": start_dt, "$lt": end_dt}
-    }).sort("created_at", 1)
-    return list(data)
-
-# Function to generate the graph
-def generate_graph(times, temperatures, humidities, unit_ID):
-    plt.switch_backend('Agg')  # Use non-interactive backend
-    plt.figure(figsize=(10, 5))
-    plt.plot(times, temperatures, label='Temperature (°C)', color='r')
-    plt.plot(times, humidities, label='Humidity (%)', color='b')
-    plt.title(f'Graph Data for Unit ID: {unit_ID}')
-    plt.xlabel('Time (IST)')
-    plt.ylabel('Values')
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.grid()
-
-    # Save graph image
-    graph_image_path = f"{IMAGE_DIR}/graph_data_unit_{unit_ID}.png"
+
+    start_dt, end_dt = report_window(day)
+    return {"unit_ID": unit_ID, "created_at": {"$gte": start_dt, "$lt": end_dt}}
+
+# Graph points for the report window, read from the 1-minute rollup
+async def query_graph_points(unit_ID: int, day: Optional[date] = None):
+    start_dt, end_dt = report_window(day)
+    ts, humidities, temperatures = await rollup_series(unit_ID, start_dt, end_dt, "1m")
+    times = to_local_datetime64(ts)
+    return times, temperatures, humidities
+
+# Queue a report for the worker pool
+async def submit_report(unit_ID: int, fmt: str, day: Optional[date] = None):
+    if fmt not in REPORT_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid report format")
+    query = await report_query(unit_ID, day)
+    graph_points = await query_graph_points(unit_ID, day)
     try:
-        plt.savefig(graph_image_path)
-        plt.close()
-        return graph_image_path  # Ensure path is returned
-    except Exception as e:
-        print(f"Error saving graph: {e}")
+        return report_jobs.submit(fmt, unit_ID, readings.name, query, graph_points)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def report_filename(unit_ID: int, fmt: str):
+    _, suffix, media_type = REPORT_CLASSES[fmt]
+    return f"graph_data_unit_{unit_ID}{suffix}", media_type
+
+# Row count and newest created_at in the window; part of the cache key for open
+# windows. Both come from the (unit_ID, created_at) index without reading any
+# document. A backdated reading changes the count even when it is not the
+# newest, and so does retention moving rows to the archive.
+async def window_version(unit_ID: int, start_dt: datetime, end_dt: datetime):
+    query = {"unit_ID": unit_ID, "created_at": {"$gte": start_dt, "$lt": end_dt}}
+    newest = await readings.find_one(query, {"_id": 0, "created_at": 1}, sort=[("created_at", -1)])
+    if newest is None:
         return None
+    count = await readings.count_documents(query)
+    return f"{count}:{to_epoch_ms(newest['created_at'])}"
+
+def stream_file(path: str, filename: str, media_type: str):
+    # Opened before streaming, so a concurrent eviction cannot cut the download short
+    return StreamingResponse(
+        iter_file(open(path, "rb")),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Serve from the report cache, or render on the pool and cache the result
+async def render_and_stream(unit_ID: int, fmt: str, day: Optional[date] = None):
+    if fmt not in REPORT_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid report format")
+    await report_query(unit_ID, day)  # Validates the unit_ID
+
+    start_dt, end_dt = report_window(day)
+    filename, media_type = report_filename(unit_ID, fmt)
+
+    # Windows past the backfill horizon never change: no version lookup, cached indefinitely
+    closed = window_closed(to_epoch_ms(end_dt))
+    version = None if closed else await window_version(unit_ID, start_dt, end_dt)
+    key = report_cache.key(unit_ID, start_dt, end_dt, fmt, version)
+
+    cached_path = report_cache.get(key)
+    if cached_path is not None:
+        return stream_file(cached_path, filename, media_type)
+
+    job = await report_jobs.wait(await submit_report(unit_ID, fmt, day))
+    if job.status != DONE:
+        report_jobs.discard(job)
+        raise HTTPException(status_code=504 if job.status == TIMED_OUT else 500, detail=job.error)
+
+    cached_path = report_cache.put(key, job.path, REPORT_CLASSES[fmt][1], pinned=closed)
+    report_jobs.discard(job)
+    return stream_file(cached_path, filename, media_type)
 
 # Excel Generation Endpoint
-@ReportRouter.get("/download/excel/{unit_ID}", response_class=FileResponse)
-async def download_excel(unit_ID: int):
-    data = query_data(unit_ID)
-    filename = os.path.join(TEMP_DIR, f"graph_data_unit_{unit_ID}.xlsx")
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = f"Unit {unit_ID} Data"
-
-    headers = ["Time (IST)", "Temperature (°C)", "Humidity (%)"]
-    sheet.append(headers)
-
-    times, temperatures, humidities = [], [], []
-
-    for entry in data:
-        time = entry["created_at"].astimezone(IST)
-        temperature = entry.get("t", 0)
-        humidity = entry.get("h", 0)
-        sheet.append([time.strftime("%Y-%m-%d %I:%M:%S %p"), temperature, humidity])
-        times.append(time)
-        temperatures.append(temperature)
-        humidities.append(humidity)
-
-    graph_image_path = generate_graph(times, temperatures, humidities, unit_ID)
-    img = Image(graph_image_path)
-    sheet.add_image(img, 'E5')  # Place image at cell E5
-    workbook.save(filename)
-
-    return FileResponse(filename, filename=f"graph_data_unit_{unit_ID}.xlsx")
+@ReportRouter.get("/download/excel/{unit_ID}")
+async def download_excel(unit_ID: int, day: Optional[date] = None):
+    return await render_and_stream(unit_ID, "excel", day)
 
 # PDF Generation Endpoint
-@ReportRouter.get("/download/pdf/{unit_ID}", response_class=FileResponse)
-async def download_pdf(unit_ID: int):
-    data = query_data(unit_ID)
-    filename = os.path.join(TEMP_DIR, f"graph_data_unit_{unit_ID}.pdf")
-
-    times, temperatures, humidities = [], [], []
-
-    for entry in data:
-        time = entry["created_at"].astimezone(IST)
-        temperature = entry.get("t", 0)
-        humidity = entry.get("h", 0)
-        times.append(time)
-        temperatures.append(temperature)
-        humidities.append(humidity)
-
-    graph_image_path = generate_graph(times, temperatures, humidities, unit_ID)
-
-    if not graph_image_path or not os.path.exists(graph_image_path):
-        raise HTTPException(status_code=500, detail="Graph image could not be generated.")
-
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    pdf.cell(200, 10, txt=f"Graph Data for Unit {unit_ID}", ln=True, align='C')
-    pdf.ln(10)
-
-    pdf.cell(60, 10, txt="Time (IST)", border=1, align='C')
-    pdf.cell(60, 10, txt="Temperature (°C)", border=1, align='C')
-    pdf.cell(60, 10, txt="Humidity (%)", border=1, align='C')
-    pdf.ln(10)
-
-    for t, temp, hum in zip(times, temperatures, humidities):
-        pdf.cell(60, 10, txt=t.strftime("%Y-%m-%d %I:%M:%S %p"), border=1, align='C')
-        pdf.cell(60, 10, txt=str(temp), border=1, align='C')
-        pdf.cell(60, 10, txt=str(hum), border=1, align='C')
-        pdf.ln(10)
-
-    # Add the graph image
-    pdf.image(graph_image_path, x=10, y=80, w=190)
-
-    pdf.output(filename)
-    return FileResponse(filename, filename=f"graph_data_unit_{unit_ID}.pdf")
-
-def get_monthly_avg(unit_ID: int, month: int, year: int):
-    collection_name = BOARD_COLLECTIONS.get(unit_ID)
-    
-    if collection_name is None:
+@ReportRouter.get("/download/pdf/{unit_ID}")
+async def download_pdf(unit_ID: int, day: Optional[date] = None):
+    return await render_and_stream(unit_ID, "pdf", day)
+
+# Asynchronous report jobs: submit, poll status, fetch result
+@ReportRouter.post("/api/v1/reports/{unit_ID}", status_code=202)
+async def create_report_job(unit_ID: int, format: str = "excel", day: Optional[date] = None):
+    job = await submit_report(unit_ID, format, day)
+    return job.to_dict()
+
+@ReportRouter.get("/api/v1/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job.to_dict()
+
+@ReportRouter.get("/api/v1/reports/jobs/{job_id}/result")
+async def get_report_result(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+
+    filename, media_type = report_filename(job.unit_ID, job.format)
+    return FileResponse(job.path, media_type=media_type, filename=filename)
+
+@ReportRouter.get("/api/v1/reports/cache/stats")
+async def get_report_cache_stats():
+    return report_cache.stats()
+
+async def get_monthly_avg(unit_ID: int, month: int, year: int):
+    if not await unit_registry.exists(unit_ID):
         raise HTTPException(status_code=404, detail="Unit ID not found in the database.")
-    
-    # Ensure collection_name is a string and not a collection object
-    if isinstance(collection_name, str):
-        collection = db[collection_name]
-    else:
-        # If it's a Collection object, get the name using `collection.name`
-        collection = collection_name
-        collection_name = collection.name
-    
-    print(f"Using collection: {collection_name}")
 
-    # Date range for the given month and year
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month + 1, 1) if month < 12 else datetime(year + 1, 1, 1)
-    
-    data = collection.find({
-        "created_at": {"$gte": start_date, "$lt": end_date}
-    })
-    
-    total_temp = total_humidity = count = 0
-    for entry in data:
-        # Safely handle None values for "t" and "h" by treating them as 0 if None
-        temp = entry.get("t", 0) or 0
-        humidity = entry.get("h", 0) or 0
-        total_temp += temp
-        total_humidity += humidity
-        count += 1
-    
-    if count == 0:
+    # The local calendar month; its edges fall inside UTC days, so it is read
+    # from the hourly (or minute) rollup like any other period
+    start_date, end_date = month_bounds(year, month)
+    period, = await period_averages(unit_ID, start_date, end_date, "month")
+
+    avg_temp = period["t"]["avg"]
+    avg_humidity = period["h"]["avg"]
+    if avg_temp is None and avg_humidity is None:
         raise HTTPException(status_code=404, detail="No data found for the given month.")
     
-    avg_temp = total_temp / count
-    avg_humidity = total_humidity / count
-    
     return {"unit_ID": unit_ID, "month": month, "year": year, "avg_temp": avg_temp, "avg_humidity": avg_humidity}
 
-# FastAPI endpoint to fetch monthly averages
-@ReportRouter.get("/average/{unit_ID}")
-async def monthly_average(unit_ID: int, month: int, year: int):
+def parse_range(start_time: str, end_time: str):
     try:
-        result = get_monthly_avg(unit_ID, month, year)
+        start_dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+        end_dt = datetime.fromisoformat(end_time.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    if start_dt.tzinfo is None:
+        start_dt = start_dt.replace(tzinfo=timezone.utc)
+    if end_dt.tzinfo is None:
+        end_dt = end_dt.replace(tzinfo=timezone.utc)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    return start_dt, end_dt
+
+# Averages of one calendar month, or per day/week/month over any range
+# e.g. /average/1?month=10&year=2024
+#      /average/1?start_time=2024-10-01T00:00:00+05:30&end_time=2024-12-01T00:00:00+05:30&granularity=week
+@ReportRouter.get("/average/{unit_ID}")
+async def monthly_average(
+    unit_ID: int,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    granularity: str = Query("month", description="Period length: day, week or month"),
+):
+    if start_time is None and end_time is None:
+        if month is None or year is None:
+            raise HTTPException(status_code=400, detail="Give month and year, or start_time and end_time")
+        result = await get_monthly_avg(unit_ID, month, year)
         return JSONResponse(content=result)
-    except HTTPException as e:
-        raise e
+
+    if start_time is None or end_time is None:
+        raise HTTPException(status_code=400, detail="Give both start_time and end_time")
+    if granularity not in PERIODS:
+        raise HTTPException(status_code=400, detail="granularity must be day, week or month")
+    if not await unit_registry.exists(unit_ID):
+        raise HTTPException(status_code=404, detail="Unit ID not found in the database.")
+
+    start_dt, end_dt = parse_range(start_time, end_time)
+    try:
+        periods = await period_averages(unit_ID, start_dt, end_dt, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"unit_ID": unit_ID, "granularity": granularity, "periods": periods}
+
+# Server-side statistics of the readings in a range (default: the current shift day)
+# e.g. /api/v1/stats/1?day=2024-10-16&percentiles=50,90,99
+@ReportRouter.get("/api/v1/stats/{unit_ID}")
+async def get_reading_stats(
+    unit_ID: int,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    day: Optional[date] = None,
+    percentiles: str = Query(",".join(str(p) for p in DEFAULT_PERCENTILES), description="Comma separated, 0-100"),
+):
+    unit = await unit_registry.get(unit_ID)
+    if unit is None:
+        raise HTTPException(status_code=404, detail="Invalid unit ID")
+
+    try:
+        points = [float(p) for p in percentiles.split(",") if p]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid percentiles")
+    if any(not 0 <= p <= 100 for p in points):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+
+    if start_time is not None or end_time is not None:
+        if start_time is None or end_time is None:
+            raise HTTPException(status_code=400, detail="Give both start_time and end_time")
+        start_dt, end_dt = parse_range(start_time, end_time)
+    else:
+        start_dt, end_dt = report_window(day)
+
+    stats = await reading_stats(unit, start_dt, end_dt, points)
+    return {"unit_ID": unit_ID, "start": start_dt.isoformat(), "end": end_dt.isoformat(), **stats}
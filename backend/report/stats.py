@@ -0,0 +1,309 @@
+import asyncio
+import math
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from configuration.database import readings
+from configuration.shift_day import SITE_TIMEZONE
+from backend.alerts.engine import THRESHOLD_FIELDS
+from backend.rollup.rollups import ROLLUP_COLLECTIONS, ROLLUP_FIELDS
+from backend.Graph.timeseries import to_float
+from backend.retention.archive import archive_store
+
+# Longest gap a reading is taken to cover; a longer silence counts as no data
+STATS_MAX_GAP = float(os.getenv("STATS_MAX_GAP", "300"))
+DEFAULT_PERCENTILES = (5, 50, 95, 99)
+PERIODS = ("day", "week", "month")
+MAX_PERIODS = 1000
+
+
+def _present(field: str) -> dict:
+    return {"$ne": [{"$ifNull": [f"${field}", None]}, None]}
+
+
+def stats_pipeline(unit_ID: int, start: datetime, end: datetime, limits: Dict[str, Tuple[float, float]]) -> List[dict]:
+    """Statistics of one unit's readings, computed on the server.
+
+    Each reading is weighted by the time until the next one (capped at
+    STATS_MAX_GAP) for the time spent above and below the unit's limits.
+    Percentiles come from the per-value distribution, so only a few hundred
+    (value, count) pairs cross the wire.  Needs MongoDB 5.0 ($setWindowFields).
+    """
+    max_gap_ms = int(STATS_MAX_GAP * 1000)
+    group = {
+        "_id": None,
+        "readings": {"$sum": 1},
+        "first": {"$min": "$created_at"},
+        "last": {"$max": "$created_at"},
+        "covered_ms": {"$sum": "$duration_ms"},
+    }
+    for field in ROLLUP_FIELDS:
+        group[f"{field}_count"] = {"$sum": {"$cond": [_present(field), 1, 0]}}
+        group[f"{field}_sum"] = {"$sum": f"${field}"}
+        group[f"{field}_sumsq"] = {"$sum": {"$multiply": [f"${field}", f"${field}"]}}
+        group[f"{field}_min"] = {"$min": f"${field}"}
+        group[f"{field}_max"] = {"$max": f"${field}"}
+        if field in limits:
+            low, high = limits[field]
+            group[f"{field}_above_ms"] = {"$sum": {"$cond": [{"$gt": [f"${field}", high]}, "$duration_ms", 0]}}
+            group[f"{field}_below_ms"] = {"$sum": {"$cond": [
+                {"$and": [_present(field), {"$lt": [f"${field}", low]}]}, "$duration_ms", 0,
+            ]}}
+
+    facets = {"summary": [{"$group": group}]}
+    for field in ROLLUP_FIELDS:
+        facets[field] = [
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+
+    return [
+        {"$match": {"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}}},
+        {"$project": {"_id": 0, "created_at": 1, **{field: 1 for field in ROLLUP_FIELDS}}},
+        {"$setWindowFields": {
+            "sortBy": {"created_at": 1},
+            "output": {"next_at": {"$shift": {"output": "$created_at", "by": 1}}},
+        }},
+        {"$set": {"duration_ms": {"$min": [
+            {"$ifNull": [{"$subtract": ["$next_at", "$created_at"]}, 0]}, max_gap_ms,
+        ]}}},
+        {"$facet": facets},
+    ]
+
+
+def archive_stats(columns: Dict[str, np.ndarray], limits: Dict[str, Tuple[float, float]], next_at: Optional[datetime]) -> dict:
+    # The summary and distribution facets of stats_pipeline for archived columns;
+    # the last archived reading lasts until ``next_at``, the first one still in MongoDB
+    max_gap_ms = int(STATS_MAX_GAP * 1000)
+    ts = columns["created_at"]
+    following = np.append(ts[1:], ts[-1] if next_at is None else int(next_at.replace(tzinfo=timezone.utc).timestamp() * 1000))
+    duration = np.minimum(following - ts, max_gap_ms)
+
+    epoch = datetime(1970, 1, 1)
+    summary = {
+        "readings": len(ts),
+        "first": epoch + timedelta(milliseconds=int(ts[0])),
+        "last": epoch + timedelta(milliseconds=int(ts[-1])),
+        "covered_ms": int(duration.sum()),
+    }
+    result = {"summary": [summary]}
+    for field in ROLLUP_FIELDS:
+        values = to_float(columns[field])
+        present = ~np.isnan(values)
+        kept = values[present]
+        summary[f"{field}_count"] = len(kept)
+        summary[f"{field}_sum"] = float(kept.sum())
+        summary[f"{field}_sumsq"] = float((kept * kept).sum())
+        summary[f"{field}_min"] = float(kept.min()) if len(kept) else None
+        summary[f"{field}_max"] = float(kept.max()) if len(kept) else None
+        if field in limits:
+            low, high = limits[field]
+            summary[f"{field}_above_ms"] = int(duration[present & (values > high)].sum())
+            summary[f"{field}_below_ms"] = int(duration[present & (values < low)].sum())
+        distinct, counts = np.unique(kept, return_counts=True)
+        result[field] = [{"_id": float(value), "n": int(n)} for value, n in zip(distinct, counts)]
+    return result
+
+
+def merge_stats(a: dict, b: dict) -> dict:
+    # Combine two stats_pipeline results over disjoint readings
+    summaries = [result["summary"][0] for result in (a, b) if result.get("summary")]
+    summary = {}
+    for part in summaries:
+        for key, value in part.items():
+            if key == "_id" or value is None:
+                continue
+            if key not in summary:
+                summary[key] = value
+            elif key == "first" or key.endswith("_min"):
+                summary[key] = min(summary[key], value)
+            elif key == "last" or key.endswith("_max"):
+                summary[key] = max(summary[key], value)
+            else:
+                summary[key] += value
+    merged = {"summary": [summary] if summaries else []}
+    for field in ROLLUP_FIELDS:
+        counts: Dict[float, int] = {}
+        for result in (a, b):
+            for bucket in result.get(field) or []:
+                counts[bucket["_id"]] = counts.get(bucket["_id"], 0) + bucket["n"]
+        merged[field] = [{"_id": value, "n": counts[value]} for value in sorted(counts)]
+    return merged
+
+
+def distribution_percentiles(values: np.ndarray, counts: np.ndarray, percentiles: Sequence[float]) -> np.ndarray:
+    # Linear interpolation between ranks, as numpy.percentile does on the expanded values
+    cumulative = np.cumsum(counts)
+    ranks = np.asarray(percentiles, dtype=np.float64) / 100 * (cumulative[-1] - 1)
+    low, high = np.floor(ranks), np.ceil(ranks)
+    below = values[np.searchsorted(cumulative, low, side="right")]
+    above = values[np.searchsorted(cumulative, high, side="right")]
+    return below + (above - below) * (ranks - low)
+
+
+def _round(value) -> Optional[float]:
+    return None if value is None or not math.isfinite(value) else round(float(value), 2)
+
+
+def summarize_stats(result: dict, limits: Dict[str, Tuple[float, float]], percentiles: Sequence[float]) -> dict:
+    summary = result["summary"][0] if result.get("summary") else {}
+    covered_ms = summary.get("covered_ms", 0)
+    out = {
+        "readings": summary.get("readings", 0),
+        "first": summary.get("first"),
+        "last": summary.get("last"),
+        "covered_seconds": covered_ms / 1000,
+        "fields": {},
+    }
+    for field in ROLLUP_FIELDS:
+        count = summary.get(f"{field}_count", 0)
+        if not count:
+            out["fields"][field] = {"count": 0}
+            continue
+        avg = summary[f"{field}_sum"] / count
+        variance = max(summary[f"{field}_sumsq"] / count - avg * avg, 0.0)
+        stats = {
+            "count": count,
+            "avg": _round(avg),
+            "min": summary[f"{field}_min"],
+            "max": summary[f"{field}_max"],
+            "stddev": _round(math.sqrt(variance)),
+        }
+
+        distribution = result.get(field) or []
+        if distribution and percentiles:
+            values = np.array([bucket["_id"] for bucket in distribution], dtype=np.float64)
+            counts = np.array([bucket["n"] for bucket in distribution], dtype=np.int64)
+            stats["percentiles"] = {
+                f"p{p:g}": _round(value)
+                for p, value in zip(percentiles, distribution_percentiles(values, counts, percentiles))
+            }
+
+        if field in limits:
+            low, high = limits[field]
+            for side, limit in (("above", high), ("below", low)):
+                spent = summary.get(f"{field}_{side}_ms", 0)
+                stats[f"time_{side}"] = {
+                    "limit": limit,
+                    "seconds": spent / 1000,
+                    "fraction": _round(spent / covered_ms) if covered_ms else None,
+                }
+        out["fields"][field] = stats
+    return out
+
+
+def unit_limits(unit: dict) -> Dict[str, Tuple[float, float]]:
+    # (low, high) per field from the unit's Setting document
+    limits = {}
+    for field, (low_key, high_key) in THRESHOLD_FIELDS.items():
+        if unit.get(low_key) is not None and unit.get(high_key) is not None:
+            limits[field] = (unit[low_key], unit[high_key])
+    return limits
+
+
+async def reading_stats(unit: dict, start: datetime, end: datetime, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> dict:
+    limits = unit_limits(unit)
+    pipeline = stats_pipeline(unit["unit_ID"], start, end, limits)
+    result = await readings.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    result = result[0] if result else {}
+
+    # Readings past their retention are folded in from the archive files
+    archived = await asyncio.get_running_loop().run_in_executor(None, archive_store.read, unit["unit_ID"], start, end)
+    if archived is not None:
+        summary = result["summary"][0] if result.get("summary") else {}
+        result = merge_stats(result, archive_stats(archived, limits, summary.get("first")))
+    return summarize_stats(result, limits, percentiles)
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day: date, period: str) -> date:
+    if period == "week":
+        return day + timedelta(days=7)
+    if period == "month":
+        return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def period_boundaries(start: datetime, end: datetime, period: str) -> List[datetime]:
+    # Local calendar periods touching [start, end), as naive UTC boundaries
+    def to_utc(day: date) -> datetime:
+        local = SITE_TIMEZONE.localize(datetime.combine(day, datetime.min.time()))
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    aware_start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    aware_end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    end_utc = aware_end.astimezone(timezone.utc).replace(tzinfo=None)
+
+    day = _period_start(aware_start.astimezone(SITE_TIMEZONE).date(), period)
+    boundaries = [to_utc(day)]
+    while boundaries[-1] < end_utc:
+        if len(boundaries) > MAX_PERIODS:
+            raise ValueError(f"More than {MAX_PERIODS} periods requested")
+        day = _next_period(day, period)
+        boundaries.append(to_utc(day))
+    return boundaries
+
+
+def month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    # One local calendar month as naive UTC [start, end)
+    first = SITE_TIMEZONE.localize(datetime(year, month, 1))
+    start, end = period_boundaries(first, first + timedelta(days=1), "month")
+    return start, end
+
+
+def boundary_granularity(boundaries: List[datetime]) -> str:
+    # Rollups are bucketed on UTC: hours when every boundary is a whole UTC
+    # hour, otherwise (e.g. a +05:30 zone) minutes keep the boundaries exact
+    return "1h" if all(b.minute == 0 for b in boundaries) else "1m"
+
+
+def period_pipeline(unit_ID: int, boundaries: List[datetime]) -> List[dict]:
+    output = {}
+    for field in ROLLUP_FIELDS:
+        output[f"{field}_sum"] = {"$sum": f"${field}_sum"}
+        output[f"{field}_count"] = {"$sum": f"${field}_count"}
+        output[f"{field}_min"] = {"$min": f"${field}_min"}
+        output[f"{field}_max"] = {"$max": f"${field}_max"}
+    return [
+        {"$match": {"unit_ID": unit_ID, "bucket": {"$gte": boundaries[0], "$lt": boundaries[-1]}}},
+        {"$bucket": {"groupBy": "$bucket", "boundaries": boundaries, "output": output}},
+    ]
+
+
+async def period_averages(unit_ID: int, start: datetime, end: datetime, period: str) -> List[dict]:
+    """Averages per local day, week or month, from the rollups.
+
+    The hourly rollup is used when every boundary falls on a whole UTC hour,
+    otherwise (e.g. a +05:30 zone) the minute rollup keeps boundaries exact.
+    """
+    boundaries = period_boundaries(start, end, period)
+    granularity = boundary_granularity(boundaries)
+    docs = await ROLLUP_COLLECTIONS[granularity].aggregate(period_pipeline(unit_ID, boundaries)).to_list(length=None)
+    by_start = {doc["_id"]: doc for doc in docs}
+
+    periods = []
+    for period_start, period_end in zip(boundaries, boundaries[1:]):
+        doc = by_start.get(period_start, {})
+        entry = {
+            "start": period_start.replace(tzinfo=timezone.utc).astimezone(SITE_TIMEZONE).isoformat(),
+            "end": period_end.replace(tzinfo=timezone.utc).astimezone(SITE_TIMEZONE).isoformat(),
+        }
+        for field in ROLLUP_FIELDS:
+            count = doc.get(f"{field}_count", 0)
+            entry[field] = {
+                "count": count,
+                "avg": _round(doc[f"{field}_sum"] / count) if count else None,
+                "min": doc.get(f"{field}_min") if count else None,
+                "max": doc.get(f"{field}_max") if count else None,
+            }
+        periods.append(entry)
+    return periods
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+import numpy as np
+from configuration.database import readings
+from backend.Graph.timeseries import MISSING, to_epoch_ms, to_float
+
+# Reading fields kept in the archive, next to created_at as epoch ms
+ARCHIVE_FIELDS = ("t", "h", "w", "eb", "ups", "x", "y")
+ARCHIVE_BATCH_SIZE = 50000
+
+
+def month_start(moment: datetime) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def to_columns(docs: List[dict]) -> Dict[str, np.ndarray]:
+    # Reading documents -> created_at (int64 ms) and int32 columns with MISSING gaps
+    columns = {"created_at": np.array([to_epoch_ms(doc["created_at"]) for doc in docs], dtype=np.int64)}
+    for field in ARCHIVE_FIELDS:
+        columns[field] = np.array(
+            [MISSING if doc.get(field) is None else doc[field] for doc in docs], dtype=np.int32
+        )
+    return columns
+
+
+def merge_columns(*parts: Optional[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    # Columns of several sources sorted by created_at; a reading present in more
+    # than one (same created_at and values) is kept once
+    parts = [part for part in parts if part is not None]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    rows = np.column_stack([columns["created_at"]] + [columns[field].astype(np.int64) for field in ARCHIVE_FIELDS])
+    _, index = np.unique(rows, axis=0, return_index=True)
+    return {name: values[index] for name, values in columns.items()}
+
+
+async def read_columns(unit_ID: int, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+    # Raw readings of [start, end) from MongoDB as archive columns
+    projection = {"_id": 0, "created_at": 1, **{field: 1 for field in ARCHIVE_FIELDS}}
+    cursor = readings.find(
+        {"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}}, projection
+    ).sort("created_at", 1).batch_size(ARCHIVE_BATCH_SIZE)
+
+    # Converted batch by batch, so a month never sits in memory as documents
+    parts = []
+    while True:
+        docs = await cursor.to_list(length=ARCHIVE_BATCH_SIZE)
+        if not docs:
+            break
+        parts.append(to_columns(docs))
+    if not parts:
+        return to_columns([])
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def to_docs(unit_ID: int, columns: Dict[str, np.ndarray], fields: Sequence[str]) -> List[dict]:
+    # Archived columns -> reading documents shaped like a Readings query result
+    created_at = columns["created_at"].astype("datetime64[ms]").astype(datetime).tolist()
+    values = {field: np.where(columns[field] == MISSING, None, columns[field].astype(object)).tolist() for field in fields}
+    return [
+        {"unit_ID": unit_ID, "created_at": moment, **{field: values[field][i] for field in fields}}
+        for i, moment in enumerate(created_at)
+    ]
+
+
+class ArchiveStore:
+    """Compressed per-unit, per-month files of readings removed from MongoDB.
+
+    Each file is ``<directory>/unit_<unit_ID>/<YYYY-MM>.npz`` holding sorted
+    columns.  Writing merges new rows into what the file already holds, and
+    rows archived before are kept once, so late readings of an archived month
+    add to it and an interrupted archive run can simply be repeated.  Recently
+    read files are kept decompressed in memory, up to ``cache_files``.
+    """
+
+    def __init__(self, directory: str, cache_files: int = 8):
+        self.directory = directory
+        self.cache_files = cache_files
+        self._cache: "OrderedDict[tuple, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()  # Reads and writes run on executor threads
+
+    def path(self, unit_ID: int, month: date) -> str:
+        return os.path.join(self.directory, f"unit_{unit_ID}", f"{month:%Y-%m}.npz")
+
+    def months(self, unit_ID: int) -> List[date]:
+        folder = os.path.join(self.directory, f"unit_{unit_ID}")
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            date(int(name[:4]), int(name[5:7]), 1) for name in os.listdir(folder) if name.endswith(".npz")
+        )
+
+    def load(self, unit_ID: int, month: date) -> Optional[Dict[str, np.ndarray]]:
+        path = self.path(unit_ID, month)
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            columns = self._cache.get(key)
+            if columns is not None:
+                self._cache.move_to_end(key)
+                return columns
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+        with self._lock:
+            self._cache[key] = columns
+            while len(self._cache) > self.cache_files:
+                self._cache.popitem(last=False)
+        return columns
+
+    def write(self, unit_ID: int, month: date, columns: Dict[str, np.ndarray]):
+        # Merge rows into the month file
+        columns = merge_columns(self.load(unit_ID, month), columns)
+
+        path = self.path(unit_ID, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written beside the target and renamed, so readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as output:
+            np.savez_compressed(output, **columns)
+        os.replace(output.name, path)
+
+    def read(self, unit_ID: int, start: datetime, end: datetime) -> Optional[Dict[str, np.ndarray]]:
+        # Archived columns in [start, end), or None when nothing is archived there
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        parts = []
+        for month in self.months(unit_ID):
+            if to_epoch_ms(datetime.combine(next_month(month), datetime.min.time())) <= start_ms:
+                continue
+            if to_epoch_ms(datetime.combine(month, datetime.min.time())) >= end_ms:
+                break
+            columns = self.load(unit_ID, month)
+            if columns is None:
+                continue
+            lo = np.searchsorted(columns["created_at"], start_ms, side="left")
+            hi = np.searchsorted(columns["created_at"], end_ms, side="left")
+            if hi > lo:
+                parts.append({name: values[lo:hi] for name, values in columns.items()})
+        if not parts:
+            return None
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def series(self, unit_ID: int, start: datetime, end: datetime):
+        # (ts_ms, h, t) like the graph series, or None
+        columns = self.read(unit_ID, start, end)
+        if columns is None:
+            return None
+        return columns["created_at"], to_float(columns["h"]), to_float(columns["t"])
+
+    def iter_docs(self, unit_ID: int, start: datetime, end: datetime, fields: Sequence[str], batch_size: int = 10000) -> Iterator[List[dict]]:
+        # Archived readings as documents, in batches
+        columns = self.read(unit_ID, start, end)
+        if columns is None:
+            return
+        for offset in range(0, len(columns["created_at"]), batch_size):
+            yield to_docs(unit_ID, {name: values[offset:offset + batch_size] for name, values in columns.items()}, fields)
+
+    def nbytes(self) -> int:
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in names if name.endswith(".npz"))
+        return total
+
+
+archive_store = ArchiveStore(
+    directory=os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")),
+    cache_files=int(os.getenv("ARCHIVE_CACHE_FILES", "8")),
+)
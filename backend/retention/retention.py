@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from configuration.database import readings
+from backend.Settings.registry import unit_registry
+from backend.rollup.rollups import backfill_rollups, bucket_start
+from backend.retention.archive import archive_store, read_columns, month_start, next_month
+
+logger = logging.getLogger("my_logger")
+
+# Days of raw readings kept in MongoDB for units without their own
+# retention_days setting; 0 keeps raw readings forever
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+# How often the app runs retention itself; 0 leaves it to the CLI (e.g. cron)
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "0"))
+
+
+def retention_days(unit: dict) -> int:
+    days = unit.get("retention_days")
+    return RETENTION_DAYS if days is None else int(days)
+
+
+def retention_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    # Whole UTC days only, so compaction never rebuilds a partly archived day
+    now = now or datetime.utcnow()
+    return bucket_start(now - timedelta(days=days), "1d")
+
+
+async def archive_unit(unit_ID: int, cutoff: datetime, compact: bool = True) -> int:
+    """Move raw readings of one unit older than ``cutoff`` into the archive.
+
+    Works one month at a time: the rollups of the month are rebuilt (from
+    the archive plus the raw rows where the month was archived before), the
+    rows are merged into the month's archive file and only then deleted from
+    MongoDB.
+    """
+    oldest = await readings.find_one({"unit_ID": unit_ID}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)])
+    if oldest is None or oldest["created_at"] >= cutoff:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    archived = 0
+    start = bucket_start(oldest["created_at"], "1d")
+    while start < cutoff:
+        month = month_start(start)
+        end = min(datetime.combine(next_month(month), datetime.min.time()), cutoff)
+
+        columns = await read_columns(unit_ID, start, end)
+        rows = len(columns["created_at"])
+        if rows:
+            if compact:
+                await backfill_rollups(unit_ID, start, end)
+            await loop.run_in_executor(None, archive_store.write, unit_ID, month, columns)
+            await readings.delete_many({"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}})
+            logger.info(f"Archived {rows} readings of unit {unit_ID} for {month:%Y-%m}")
+        archived += rows
+        start = end
+    return archived
+
+
+async def run_retention(now: Optional[datetime] = None, compact: bool = True) -> Dict[int, int]:
+    # Archive every unit past its retention; returns readings archived per unit
+    archived = {}
+    for unit_ID, unit in (await unit_registry.units()).items():
+        days = retention_days(unit)
+        if days > 0:
+            archived[unit_ID] = await archive_unit(unit_ID, retention_cutoff(days, now), compact)
+    return archived
+
+
+class RetentionTask:
+    """Runs ``run_retention`` every ``interval`` hours inside the app.
+
+    Enable it on one worker only; the others can leave
+    RETENTION_INTERVAL_HOURS at 0.
+    """
+
+    def __init__(self, interval_hours: float = RETENTION_INTERVAL_HOURS):
+        self.interval = interval_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_retention()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+retention_task = RetentionTask()
@@ -0,0 +1,39 @@
+"""Archive raw readings older than each unit's retention period.
+
+    python -m backend.retention.run
+    python -m backend.retention.run --unit 2 --days 30
+
+Units use their Setting document's ``retention_days`` or RETENTION_DAYS.
+The hourly and daily rollups of the archived range are rebuilt from the raw
+rows first, then the rows are written to monthly files under ARCHIVE_DIR and
+deleted from MongoDB.  Cutoffs are whole UTC days and archive files replace
+the range they are written for, so the command can be re-run safely.
+"""
+import argparse
+import asyncio
+from backend.Settings.registry import unit_registry
+from backend.retention.retention import archive_unit, retention_cutoff, retention_days
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Archive raw readings older than each unit's retention period.")
+    parser.add_argument("--unit", type=int, action="append", help="unit_ID to archive (repeatable, default all)")
+    parser.add_argument("--days", type=int, help="retention in days, overriding the unit settings")
+    parser.add_argument("--no-compact", action="store_true", help="skip rebuilding the rollups before archiving")
+    args = parser.parse_args()
+
+    units = await unit_registry.units()
+    for unit_ID in args.unit or sorted(units):
+        if unit_ID not in units:
+            raise SystemExit(f"Invalid unit_ID: {unit_ID}")
+        days = args.days if args.days is not None else retention_days(units[unit_ID])
+        if days <= 0:
+            print(f"Unit {unit_ID} keeps raw readings forever")
+            continue
+        cutoff = retention_cutoff(days)
+        archived = await archive_unit(unit_ID, cutoff, compact=not args.no_compact)
+        print(f"Archived {archived} readings of unit {unit_ID} older than {cutoff:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+"""Rebuild rollup collections from raw board history.
+
+    python -m backend.rollup.backfill --start 2024-10-01 --end 2024-11-01
+    python -m backend.rollup.backfill --unit 2 --start 2024-10-01
+
+Ranges are widened to whole days and the affected buckets are replaced, so
+the command can be re-run safely.  By default it stops at the start of today
+so buckets still receiving live readings are left alone.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from backend.Settings.registry import unit_registry
+from backend.rollup.rollups import backfill_rollups, bucket_start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild rollup collections from raw board history.")
+    parser.add_argument("--unit", type=int, action="append", help="unit_ID to backfill (repeatable, default all)")
+    parser.add_argument("--start", required=True, help="first day to rebuild, YYYY-MM-DD")
+    parser.add_argument("--end", help="day after the last day to rebuild, YYYY-MM-DD (default today)")
+    args = parser.parse_args()
+
+    start = datetime.fromisoformat(args.start)
+    end = datetime.fromisoformat(args.end) if args.end else bucket_start(datetime.utcnow(), "1d")
+    units = args.unit or await unit_registry.unit_ids()
+
+    for unit_ID in units:
+        if not await unit_registry.exists(unit_ID):
+            raise SystemExit(f"Invalid unit_ID: {unit_ID}")
+        print(f"Backfilling rollups for unit {unit_ID} from {start} to {end}")
+        await backfill_rollups(unit_ID, start, end)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
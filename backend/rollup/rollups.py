@@ -0,0 +1,256 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+from configuration.database import readings, Rollup_1m, Rollup_1h, Rollup_1d
+from backend.Graph.timeseries import MISSING, to_epoch_ms
+from backend.retention.archive import archive_store, merge_columns, month_start, next_month, read_columns
+
+# Rollup granularities, finest first
+GRANULARITIES = OrderedDict([
+    ("1m", timedelta(minutes=1)),
+    ("1h", timedelta(hours=1)),
+    ("1d", timedelta(days=1)),
+])
+
+ROLLUP_COLLECTIONS = {
+    "1m": Rollup_1m,
+    "1h": Rollup_1h,
+    "1d": Rollup_1d,
+}
+
+# Reading fields that are aggregated
+ROLLUP_FIELDS = ("t", "h", "w")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(created_at: datetime, granularity: str) -> datetime:
+    # Floor a stored timestamp to the start of its bucket
+    width = GRANULARITIES[granularity]
+    created_at = created_at.replace(tzinfo=None)
+    return created_at - ((created_at - EPOCH) % width)
+
+
+def choose_granularity(start: datetime, end: datetime, max_points: int) -> Optional[str]:
+    # Coarsest rollup that still yields at least max_points buckets over the range
+    span = end - start
+    chosen = None
+    for granularity, width in GRANULARITIES.items():
+        if span / width >= max_points:
+            chosen = granularity
+    return chosen
+
+
+def _accumulate(buckets: Dict, key, entry: dict):
+    stats = buckets.setdefault(key, {})
+    for field in ROLLUP_FIELDS:
+        value = entry.get(field)
+        if value is None:
+            continue
+        if field not in stats:
+            stats[field] = [value, value, 0, 0]
+        field_stats = stats[field]
+        field_stats[0] = min(field_stats[0], value)
+        field_stats[1] = max(field_stats[1], value)
+        field_stats[2] += value
+        field_stats[3] += 1
+
+
+def _rollup_update(stats: dict) -> dict:
+    update = {"$min": {}, "$max": {}, "$inc": {}}
+    for field, (low, high, total, count) in stats.items():
+        update["$min"][f"{field}_min"] = low
+        update["$max"][f"{field}_max"] = high
+        update["$inc"][f"{field}_sum"] = total
+        update["$inc"][f"{field}_count"] = count
+    return update
+
+
+# Fold newly stored readings into every rollup (or the given granularities)
+# with one bulk write per granularity
+async def update_rollups(entries: Iterable[dict], granularities: Iterable[str] = GRANULARITIES):
+    entries = list(entries)
+    for granularity in granularities:
+        collection = ROLLUP_COLLECTIONS[granularity]
+        buckets: Dict = OrderedDict()
+        for entry in entries:
+            _accumulate(buckets, (entry["unit_ID"], bucket_start(entry["created_at"], granularity)), entry)
+
+        operations = [
+            UpdateOne({"unit_ID": unit_ID, "bucket": bucket}, _rollup_update(stats), upsert=True)
+            for (unit_ID, bucket), stats in buckets.items() if stats
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+
+async def fetch_rollups(unit_ID: int, start: datetime, end: datetime, granularity: str) -> List[dict]:
+    collection = ROLLUP_COLLECTIONS[granularity]
+    data = collection.find(
+        {"unit_ID": unit_ID, "bucket": {"$gte": start, "$lt": end}},
+        {"_id": 0},
+    ).sort("bucket", 1)
+    return await data.to_list(length=None)
+
+
+def _column(docs: List[dict], name: str) -> np.ndarray:
+    return np.array([doc.get(name, np.nan) for doc in docs], dtype=np.float64)
+
+
+async def rollup_series(unit_ID: int, start: datetime, end: datetime, granularity: str, mode: str = "avg"):
+    # (ts_ms, h, t) arrays built from rollup buckets
+    docs = await fetch_rollups(unit_ID, start, end, granularity)
+    ts = np.array([to_epoch_ms(doc["bucket"]) for doc in docs], dtype=np.int64)
+
+    if mode == "min-max":
+        # Two points per bucket: the low values, then the high values half a bucket later
+        half = int(GRANULARITIES[granularity].total_seconds() * 1000) // 2
+        out_ts = np.empty(len(ts) * 2, dtype=np.int64)
+        out_ts[0::2], out_ts[1::2] = ts, ts + half
+        h = np.empty(len(ts) * 2)
+        t = np.empty(len(ts) * 2)
+        h[0::2], h[1::2] = _column(docs, "h_min"), _column(docs, "h_max")
+        t[0::2], t[1::2] = _column(docs, "t_min"), _column(docs, "t_max")
+        return out_ts, h, t
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = np.round(_column(docs, "h_sum") / _column(docs, "h_count"), 2)
+        t = np.round(_column(docs, "t_sum") / _column(docs, "t_count"), 2)
+    return ts, h, t
+
+
+async def rollup_totals(unit_ID: int, start: datetime, end: datetime, granularity: str) -> Dict[str, dict]:
+    # Combine buckets into min/max/sum/count/avg per field
+    totals: Dict[str, dict] = {}
+    for doc in await fetch_rollups(unit_ID, start, end, granularity):
+        for field in ROLLUP_FIELDS:
+            count = doc.get(f"{field}_count", 0)
+            if not count:
+                continue
+            field_totals = totals.setdefault(field, {"min": doc[f"{field}_min"], "max": doc[f"{field}_max"], "sum": 0, "count": 0})
+            field_totals["min"] = min(field_totals["min"], doc[f"{field}_min"])
+            field_totals["max"] = max(field_totals["max"], doc[f"{field}_max"])
+            field_totals["sum"] += doc[f"{field}_sum"]
+            field_totals["count"] += count
+
+    for field_totals in totals.values():
+        field_totals["avg"] = field_totals["sum"] / field_totals["count"]
+    return totals
+
+
+def bucket_width(start: datetime, end: datetime, max_points: int):
+    # Rollup granularity and a whole multiple of its width giving at most max_points buckets
+    target = (end - start) / max_points
+    granularity = "1m"
+    for name, width in GRANULARITIES.items():
+        if width <= target:
+            granularity = name
+    width = GRANULARITIES[granularity]
+    return granularity, width * max(1, -(-target // width))
+
+
+def group_pipeline(unit_IDs: List[int], start: datetime, end: datetime, width: timedelta) -> List[dict]:
+    # Buckets of every unit merged into wider buckets, numbered by their offset from start
+    offset = {"$subtract": ["$bucket", start]}
+    width_ms = int(width.total_seconds() * 1000)
+    group = {"_id": {"unit_ID": "$unit_ID", "offset": {"$subtract": [offset, {"$mod": [offset, width_ms]}]}}}
+    for field in ROLLUP_FIELDS:
+        group[f"{field}_min"] = {"$min": f"${field}_min"}
+        group[f"{field}_max"] = {"$max": f"${field}_max"}
+        group[f"{field}_sum"] = {"$sum": f"${field}_sum"}
+        group[f"{field}_count"] = {"$sum": f"${field}_count"}
+    return [
+        {"$match": {"unit_ID": {"$in": unit_IDs}, "bucket": {"$gte": start, "$lt": end}}},
+        {"$group": group},
+    ]
+
+
+async def group_rollups(unit_IDs: List[int], start: datetime, end: datetime, granularity: str, width: timedelta) -> List[dict]:
+    # One aggregation over one rollup collection for any number of units
+    collection = ROLLUP_COLLECTIONS[granularity]
+    return await collection.aggregate(group_pipeline(unit_IDs, start, end, width)).to_list(length=None)
+
+
+def backfill_pipeline(unit_ID: int, start: datetime, end: datetime, granularity: str, target: str) -> List[dict]:
+    # Server-side rebuild of one rollup granularity from raw readings
+    width_ms = int(GRANULARITIES[granularity].total_seconds() * 1000)
+    group = {"_id": {"$subtract": ["$created_at", {"$mod": [{"$toLong": "$created_at"}, width_ms]}]}}
+    for field in ROLLUP_FIELDS:
+        present = {"$ne": [{"$ifNull": [f"${field}", None]}, None]}
+        group[f"{field}_min"] = {"$min": f"${field}"}
+        group[f"{field}_max"] = {"$max": f"${field}"}
+        group[f"{field}_sum"] = {"$sum": f"${field}"}
+        group[f"{field}_count"] = {"$sum": {"$cond": [present, 1, 0]}}
+
+    return [
+        {"$match": {"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}}},
+        {"$group": group},
+        {"$addFields": {"unit_ID": unit_ID, "bucket": "$_id"}},
+        {"$project": {"_id": 0}},
+        {"$merge": {"into": target, "on": ["unit_ID", "bucket"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def column_rollups(unit_ID: int, columns: Dict[str, np.ndarray], granularity: str) -> List[dict]:
+    # Rollup documents of reading columns (created_at in epoch ms, MISSING gaps),
+    # shaped like the output of backfill_pipeline
+    width_ms = int(GRANULARITIES[granularity].total_seconds() * 1000)
+    created_at = columns["created_at"]
+    keys, inverse = np.unique(created_at - created_at % width_ms, return_inverse=True)
+    docs = [{"unit_ID": unit_ID, "bucket": bucket} for bucket in keys.astype("datetime64[ms]").astype(datetime).tolist()]
+
+    for field in ROLLUP_FIELDS:
+        values = columns[field].astype(np.int64)
+        present = values != MISSING
+        index, values = inverse[present], values[present]
+        count = np.bincount(index, minlength=len(keys))
+        total = np.zeros(len(keys), dtype=np.int64)
+        low = np.full(len(keys), np.iinfo(np.int64).max)
+        high = np.full(len(keys), np.iinfo(np.int64).min)
+        np.add.at(total, index, values)
+        np.minimum.at(low, index, values)
+        np.maximum.at(high, index, values)
+        for doc, n, s, lo, hi in zip(docs, count.tolist(), total.tolist(), low.tolist(), high.tolist()):
+            doc[f"{field}_min"] = lo if n else None
+            doc[f"{field}_max"] = hi if n else None
+            doc[f"{field}_sum"] = s
+            doc[f"{field}_count"] = n
+    return docs
+
+
+async def replace_rollups(unit_ID: int, columns: Dict[str, np.ndarray]):
+    # Replace every bucket the columns fall into, one bulk write per granularity
+    for granularity, rollup in ROLLUP_COLLECTIONS.items():
+        operations = [
+            ReplaceOne({"unit_ID": unit_ID, "bucket": doc["bucket"]}, doc, upsert=True)
+            for doc in column_rollups(unit_ID, columns, granularity)
+        ]
+        if operations:
+            await rollup.bulk_write(operations, ordered=False)
+
+
+async def backfill_rollups(unit_ID: int, start: datetime, end: datetime):
+    # Align to whole days so every rebuilt bucket is complete
+    start = bucket_start(start, "1d")
+    end = bucket_start(end, "1d") + (GRANULARITIES["1d"] if end != bucket_start(end, "1d") else timedelta(0))
+
+    for rollup in ROLLUP_COLLECTIONS.values():
+        await rollup.create_index([("unit_ID", 1), ("bucket", 1)], unique=True)
+
+    # Month by month: the pipeline only sees raw readings, so months that were
+    # archived are rebuilt from the archive plus the raw rows (late readings)
+    loop = asyncio.get_running_loop()
+    while start < end:
+        chunk_end = min(datetime.combine(next_month(month_start(start)), datetime.min.time()), end)
+        archived = await loop.run_in_executor(None, archive_store.read, unit_ID, start, chunk_end)
+        if archived is None:
+            for granularity, rollup in ROLLUP_COLLECTIONS.items():
+                pipeline = backfill_pipeline(unit_ID, start, chunk_end, granularity, rollup.name)
+                await readings.aggregate(pipeline).to_list(length=None)
+        else:
+            columns = merge_columns(archived, await read_columns(unit_ID, start, chunk_end))
+            await replace_rollups(unit_ID, columns)
+        start = chunk_end
@@ -0,0 +1,173 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timezone
+from typing import Dict, List
+import numpy as np
+from backend.rollup.rollups import ROLLUP_FIELDS, bucket_start, bucket_width, group_rollups
+from backend.Graph.timeseries import to_epoch_ms, to_optional_list
+from backend.Settings.registry import unit_registry
+from backend.report.stats import boundary_granularity, month_bounds
+from configuration.shift_day import format_local
+
+SiteRouter = APIRouter()
+
+
+async def resolve_units(unit_ID: List[str]) -> List[int]:
+    # "all" expands to every configured unit
+    if "all" in unit_ID:
+        return await unit_registry.unit_ids()
+    units = []
+    for value in unit_ID:
+        try:
+            unit = int(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid unit ID {value}")
+        if not await unit_registry.exists(unit):
+            raise HTTPException(status_code=404, detail=f"Invalid unit ID {unit}")
+        units.append(unit)
+    return sorted(set(units))
+
+
+def parse_fields(fields: str) -> List[str]:
+    names = [name for name in fields.split(",") if name]
+    if not names or any(name not in ROLLUP_FIELDS for name in names):
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {','.join(ROLLUP_FIELDS)}")
+    return names
+
+
+def parse_time(value: str) -> datetime:
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _stat(value: float):
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+class SiteTable:
+    """Grouped rollup buckets laid out as (unit, bucket) arrays per field."""
+
+    def __init__(self, units: List[int], buckets: int, fields: List[str]):
+        self.units = units
+        self.fields = fields
+        shape = (len(units), buckets)
+        self.sum = {field: np.zeros(shape) for field in fields}
+        self.count = {field: np.zeros(shape) for field in fields}
+        self.min = {field: np.full(shape, np.inf) for field in fields}
+        self.max = {field: np.full(shape, -np.inf) for field in fields}
+
+    def fill(self, docs: List[dict], width_ms: int):
+        if not docs:
+            return
+        rows = {unit: row for row, unit in enumerate(self.units)}
+        row = np.array([rows[doc["_id"]["unit_ID"]] for doc in docs])
+        column = (np.array([doc["_id"]["offset"] for doc in docs], dtype=np.float64) // width_ms).astype(np.int64)
+        for field in self.fields:
+            count = np.array([doc.get(f"{field}_count") or 0 for doc in docs], dtype=np.float64)
+            present = count > 0
+            self.count[field][row, column] = count
+            self.sum[field][row, column] = [doc.get(f"{field}_sum") or 0 for doc in docs]
+            self.min[field][row[present], column[present]] = [doc[f"{field}_min"] for doc in docs if doc.get(f"{field}_count")]
+            self.max[field][row[present], column[present]] = [doc[f"{field}_max"] for doc in docs if doc.get(f"{field}_count")]
+
+    def _summary(self, axis=None, rows=slice(None)) -> Dict[str, dict]:
+        summary = {"min": {}, "avg": {}, "max": {}}
+        for field in self.fields:
+            count = self.count[field][rows].sum(axis=axis)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                summary["avg"][field] = self.sum[field][rows].sum(axis=axis) / count
+            summary["min"][field] = self.min[field][rows].min(axis=axis)
+            summary["max"][field] = self.max[field][rows].max(axis=axis)
+        return summary
+
+    def series(self, rows=slice(None)) -> Dict[str, list]:
+        # Average per bucket, weighted by reading count when several units are merged
+        out = {}
+        for field in self.fields:
+            count = self.count[field][rows]
+            total = self.sum[field][rows]
+            if count.ndim == 2:
+                count, total = count.sum(axis=0), total.sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[field] = to_optional_list(np.round(total / count, 2))
+        return out
+
+    def unit_result(self, row: int) -> dict:
+        summary = self._summary(rows=row)
+        return {
+            "unit_ID": self.units[row],
+            **self.series(rows=row),
+            **{name: {field: _stat(value) for field, value in values.items()} for name, values in summary.items()},
+        }
+
+    def site_result(self) -> dict:
+        summary = self._summary()
+        return {
+            **self.series(),
+            **{name: {field: _stat(value) for field, value in values.items()} for name, values in summary.items()},
+        }
+
+
+async def site_table(units: List[int], start: datetime, end: datetime, max_points: int, fields: List[str]):
+    granularity, width = bucket_width(start, end, max_points)
+    start = bucket_start(start, granularity)
+    width_ms = int(width.total_seconds() * 1000)
+    buckets = max(1, -(-int((end - start).total_seconds() * 1000) // width_ms))
+
+    table = SiteTable(units, buckets, fields)
+    table.fill(await group_rollups(units, start, end, granularity, width), width_ms)
+    times = to_epoch_ms(start) + np.arange(buckets, dtype=np.int64) * width_ms
+    return table, granularity, width, times
+
+
+# Aligned, downsampled series of many units from one rollup aggregation
+# e.g. /api/v1/site/graphdata?unit_ID=all&start_time=2024-10-16T03:00:00Z&end_time=2024-10-17T03:00:00Z&max_points=200
+@SiteRouter.get("/api/v1/site/graphdata")
+async def get_site_graph_data(
+    unit_ID: List[str] = Query(["all"], description="Units to include; repeat, or 'all'"),
+    start_time: str = Query(...),
+    end_time: str = Query(...),
+    max_points: int = Query(500, ge=1, le=5000, description="Buckets per series at most"),
+    fields: str = Query("t,h", description="Comma separated subset of t,h,w"),
+):
+    units = await resolve_units(unit_ID)
+    names = parse_fields(fields)
+    start, end = parse_time(start_time), parse_time(end_time)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+
+    table, granularity, width, times = await site_table(units, start, end, max_points, names)
+    return {
+        "granularity": granularity,
+        "bucket_seconds": int(width.total_seconds()),
+        "times": format_local(times).tolist(),
+        "units": [table.unit_result(row) for row in range(len(units))],
+        "site": table.site_result(),
+    }
+
+
+# Monthly min/avg/max of many units over the local calendar month, in one aggregation
+@SiteRouter.get("/api/v1/site/average")
+async def get_site_average(
+    month: int = Query(..., ge=1, le=12),
+    year: int = Query(...),
+    unit_ID: List[str] = Query(["all"], description="Units to include; repeat, or 'all'"),
+):
+    units = await resolve_units(unit_ID)
+    start, end = month_bounds(year, month)
+
+    table = SiteTable(units, 1, list(ROLLUP_FIELDS))
+    docs = await group_rollups(units, start, end, boundary_granularity([start, end]), end - start)
+    table.fill(docs, int((end - start).total_seconds() * 1000))
+    result = table.site_result()
+    return {
+        "month": month,
+        "year": year,
+        "units": [
+            {key: value for key, value in table.unit_result(row).items() if key not in ROLLUP_FIELDS}
+            for row in range(len(units))
+        ],
+        "site": {key: value for key, value in result.items() if key not in ROLLUP_FIELDS},
+    }
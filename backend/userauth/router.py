@@ -1,53 +1,45 @@
 from fastapi import APIRouter, HTTPException, Query,Request,Depends
-from passlib.context import CryptContext
 from configuration.database import users
 from backend.userauth.schemas import User
+from backend.userauth.tokens import (
+    issue_token, token_verifier, revocations, require_user,
+    verify_password, hash_password, needs_rehash, AUTH_TOKEN_TTL,
+)
 from fastapi.security import OAuth2PasswordBearer
-import hashlib
 import logging
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 userRouter = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-active_tokens = set()
-
-def verify_sha256(password: str, hashed_password: str) -> bool:
-    return hashlib.sha256(password.encode()).hexdigest() == hashed_password
-
 @userRouter.get("/api/v1/login")
 async def login_user(username: str = Query(...), password: str = Query(...)):
-    existing_user = users.find_one({"username": username})
+    existing_user = await users.find_one({"username": username})
     
     if existing_user is None:
         raise HTTPException(status_code=400, detail="Invalid username or password")
     
     stored_password = existing_user["password"]
 
-    # Password verification logic
-    if stored_password.startswith("$"):  # Assuming a hashed password format
-        if not pwd_context.verify(password, stored_password):
-            raise HTTPException(status_code=400, detail="Invalid password!")
-    elif len(stored_password) == 64:  # Assuming SHA-256 hashed password
-        if not verify_sha256(password, stored_password):
+    # Password verification runs on the hashing thread pool (bcrypt or legacy SHA-256)
+    try:
+        if not await verify_password(password, stored_password):
             raise HTTPException(status_code=400, detail="Invalid password!")
-    else:
+    except ValueError:
         raise HTTPException(status_code=400, detail="Unsupported password format")
-    
-    # Generate a new token (this is a placeholder; implement actual token generation logic)
-    token = "your_generated_token"  # Replace with actual token generation
-    active_tokens.add(token)  # Add the token to the active tokens set
 
-    return {"status": "success", "access_token": token, "token_type": "bearer"}
+    # Upgrade legacy SHA-256 hashes to bcrypt now that the password is known
+    if needs_rehash(stored_password):
+        await users.update_one({"_id": existing_user["_id"]}, {"$set": {"password": await hash_password(password)}})
 
-#USER PAGE
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    # Signed token verified without a database lookup
+    issued = issue_token(existing_user)
+
+    return {"status": "success", "access_token": issued["token"], "token_type": "bearer", "expires_in": AUTH_TOKEN_TTL}
 
-@userRouter.get("/api/v1/users")
+#USER PAGE
+@userRouter.get("/api/v1/users", dependencies=[Depends(require_user)])
 async def get_all_users():
-    user_list = list(users.find())  
+    user_list = await users.find().to_list(length=None)  
 
     if not user_list:
         raise HTTPException(status_code=404, detail="No users found")
@@ -57,14 +49,19 @@ async def get_all_users():
     
     return {"users": user_list}
 
+# The first account can be created without a token, since nobody can log in
+# before it exists; every later one needs a login
 @userRouter.post("/api/v1/users/create")
 async def create_user(user: User, request: Request):
-    existing_user = users.find_one({"user_ID": user.user_ID})
+    if await users.count_documents({}, limit=1):
+        await require_user(request)
+
+    existing_user = await users.find_one({"user_ID": user.user_ID})
 
     if existing_user:
         raise HTTPException(status_code=400, detail="User ID already exists")
     try:
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password(user.password)
         new_user = {
             "user_ID": user.user_ID,
             "username": user.username,
@@ -73,7 +70,7 @@ async def create_user(user: User, request: Request):
             "phoneNo": user.phoneNo,
             "password": hashed_password,
         }  
-        users.insert_one(new_user)
+        await users.insert_one(new_user)
         
         return {"msg": "User registered successfully"}
     except Exception as e:
@@ -81,16 +78,16 @@ async def create_user(user: User, request: Request):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # Update an 
-@userRouter.put("/api/v1/users/update/{user_ID}")
+@userRouter.put("/api/v1/users/update/{user_ID}", dependencies=[Depends(require_user)])
 async def update_user(user_ID: str, user: User):
     logging.info(f"Received a PUT request for /update/{user_ID}")
     
-    existing_user = users.find_one({"user_ID": user_ID})
+    existing_user = await users.find_one({"user_ID": user_ID})
     
     if not existing_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     
     updated_user = {
         "username": user.username,
@@ -100,19 +97,19 @@ async def update_user(user_ID: str, user: User):
         "password": hashed_password,
     }
     
-    users.update_one({"user_ID": user_ID}, {"$set": updated_user})    
+    await users.update_one({"user_ID": user_ID}, {"$set": updated_user})    
     return {"msg": "User updated successfully"}
 
-@userRouter.delete("/api/v1/users/delete/{user_ID}")
+@userRouter.delete("/api/v1/users/delete/{user_ID}", dependencies=[Depends(require_user)])
 async def delete_user(user_ID: str):
     logging.info(f"Received a DELETE request for /delete/{user_ID}")
     
-    existing_user = users.find_one({"user_ID": user_ID})
+    existing_user = await users.find_one({"user_ID": user_ID})
     
     if not existing_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    users.delete_one({"user_ID": user_ID})
+    await users.delete_one({"user_ID": user_ID})
     
     logging.info(f"User with ID {user_ID} has been deleted.")
     return {"msg": "User deleted successfully"}
@@ -122,10 +119,11 @@ async def delete_user(user_ID: str):
 @userRouter.post("/api/v1/logout")
 async def logout_user(token: str = Depends(oauth2_scheme)):
     # Check if the token is valid
-    if token not in active_tokens:
+    claims = token_verifier.verify(token)
+    if claims is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    # Invalidate the token
-    active_tokens.remove(token)
+    # Revoke the token on every worker until it would have expired
+    await revocations.revoke(claims["jti"], claims["exp"])
 
     return {"status": "success", "message": "Logged out successfully"}
\ No newline at end of file
@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+from fastapi import HTTPException, WebSocketException, status
+from starlette.requests import HTTPConnection
+from passlib.context import CryptContext
+from configuration.database import revoked_tokens
+from backend.broadcast.bus import message_bus
+
+logger = logging.getLogger("my_logger")
+
+# Signing key shared by every worker; a random per-process key only suits a single worker
+AUTH_SECRET = os.getenv("AUTH_SECRET") or secrets.token_urlsafe(32)
+if not os.getenv("AUTH_SECRET"):
+    logger.warning("AUTH_SECRET is not set; tokens are only valid in this process")
+
+AUTH_ENABLED = os.getenv("AUTH_ENABLED", "1") not in ("0", "false", "False")
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(12 * 3600)))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_PASSWORD_CACHE_TTL = int(os.getenv("AUTH_PASSWORD_CACHE_TTL", "900"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "4"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt is CPU bound; run it off the event loop on a small dedicated pool
+hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="password-hash")
+
+_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(signing_input: bytes) -> bytes:
+    return _b64encode(hmac.new(AUTH_SECRET.encode(), signing_input, hashlib.sha256).digest())
+
+
+def issue_token(user: dict) -> Dict:
+    # Compact HS256 JWT carrying everything a request needs, so no lookup on use
+    now = int(time.time())
+    claims = {
+        "sub": user["user_ID"],
+        "name": user["username"],
+        "role": user.get("role"),
+        "iat": now,
+        "exp": now + AUTH_TOKEN_TTL,
+        "jti": uuid.uuid4().hex,
+    }
+    signing_input = _HEADER + b"." + _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return {"token": (signing_input + b"." + _sign(signing_input)).decode(), "claims": claims}
+
+
+def decode_token(token: str) -> Optional[dict]:
+    # Signature check only; expiry and revocation are checked by TokenVerifier
+    try:
+        header, payload, signature = token.split(".")
+        signing_input = f"{header}.{payload}".encode()
+        if not hmac.compare_digest(_sign(signing_input), signature.encode()):
+            return None
+        if json.loads(_b64decode(header)).get("alg") != "HS256":
+            return None
+        return json.loads(_b64decode(payload))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class RevocationList:
+    """Revoked token ids, shared through MongoDB and the broadcast bus.
+
+    Kept in memory so checks never query the database; each entry is held
+    until the token would have expired anyway.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.revoked: Dict[str, int] = {}
+
+    async def load(self):
+        now = datetime.utcnow()
+        async for doc in self.collection.find({"expires_at": {"$gt": now}}, {"_id": 0, "jti": 1, "exp": 1}):
+            self.revoked[doc["jti"]] = doc["exp"]
+
+    def add(self, jti: str, exp: int):
+        self.revoked[jti] = exp
+        if len(self.revoked) % 1000 == 0:
+            now = time.time()
+            self.revoked = {k: v for k, v in self.revoked.items() if v > now}
+
+    async def revoke(self, jti: str, exp: int):
+        self.add(jti, exp)
+        await self.collection.update_one(
+            {"jti": jti},
+            {"$set": {"jti": jti, "exp": exp, "expires_at": datetime.utcfromtimestamp(exp)}},
+            upsert=True,
+        )
+        await message_bus.publish("revoked", {"jti": jti, "exp": exp})
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self.revoked
+
+
+class TokenVerifier:
+    # Caches decoded claims per token so repeat requests skip the HMAC and JSON work
+    def __init__(self, revocations: RevocationList, max_entries: int):
+        self.revocations = revocations
+        self.max_entries = max_entries
+        self.cache: "OrderedDict[str, dict]" = OrderedDict()
+
+    def verify(self, token: str) -> Optional[dict]:
+        claims = self.cache.get(token)
+        if claims is None:
+            claims = decode_token(token)
+            if claims is None:
+                return None
+            self.cache[token] = claims
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        if claims.get("exp", 0) <= time.time() or claims.get("jti") in self.revocations:
+            self.cache.pop(token, None)
+            return None
+        return claims
+
+
+revocations = RevocationList(revoked_tokens)
+token_verifier = TokenVerifier(revocations, AUTH_TOKEN_CACHE_SIZE)
+
+
+async def receive_revoked(payload: dict):
+    revocations.add(payload["jti"], payload["exp"])
+
+message_bus.subscribe("revoked", receive_revoked)
+
+
+def bearer_token(connection: HTTPConnection) -> Optional[str]:
+    # Authorization header, or ?token= for WebSockets, which browsers cannot give headers
+    authorization = connection.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return connection.query_params.get("token")
+
+
+async def require_user(connection: HTTPConnection) -> Optional[dict]:
+    # Dependency for protected routes; returns the token claims
+    if not AUTH_ENABLED:
+        return None
+    token = bearer_token(connection)
+    claims = token_verifier.verify(token) if token else None
+    if claims is None:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+class PasswordCache:
+    # Remembers recent successful checks, keyed by an HMAC of the stored hash
+    # and the password, so repeated logins skip bcrypt; a new hash misses
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, float]" = OrderedDict()
+
+    def _key(self, password: str, stored: str) -> bytes:
+        return hmac.new(AUTH_SECRET.encode(), f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def hit(self, password: str, stored: str) -> bool:
+        key = self._key(password, stored)
+        verified_at = self.entries.get(key)
+        if verified_at is None or time.monotonic() - verified_at > self.ttl:
+            self.entries.pop(key, None)
+            return False
+        return True
+
+    def add(self, password: str, stored: str):
+        self.entries[self._key(password, stored)] = time.monotonic()
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+password_cache = PasswordCache(AUTH_PASSWORD_CACHE_TTL)
+
+
+def _verify_password(password: str, stored: str) -> bool:
+    if stored.startswith("$"):  # bcrypt
+        return pwd_context.verify(password, stored)
+    if len(stored) == 64:  # Legacy unsalted SHA-256
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    raise ValueError("Unsupported password format")
+
+
+async def verify_password(password: str, stored: str) -> bool:
+    if password_cache.hit(password, stored):
+        return True
+    loop = asyncio.get_running_loop()
+    verified = await loop.run_in_executor(hash_executor, _verify_password, password, stored)
+    if verified:
+        password_cache.add(password, stored)
+    return verified
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, pwd_context.hash, password)
+
+
+def needs_rehash(stored: str) -> bool:
+    return not stored.startswith("$") or pwd_context.needs_update(stored)
@@ -0,0 +1,53 @@
+"""Per-request cost of token authentication.
+
+    python -m benchmarks.auth_tokens --iterations 100000
+
+Times issuing a token, verifying it the first time (HMAC and JSON decode),
+and verifying it again from the decoded-claims cache, in microseconds.
+Results are appended to ``benchmarks/results``.
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.load_dashboard import RESULTS_DIR
+from backend.userauth.tokens import AUTH_TOKEN_CACHE_SIZE, TokenVerifier, decode_token, issue_token, revocations
+
+USER = {"user_ID": "bench", "username": "bench", "role": "admin"}
+
+
+def per_call_us(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - started) / iterations * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    args = parser.parse_args()
+
+    token = issue_token(USER)["token"]
+    verifier = TokenVerifier(revocations, AUTH_TOKEN_CACHE_SIZE)
+    verifier.verify(token)
+
+    result = {
+        "issue_us": per_call_us(lambda: issue_token(USER), args.iterations),
+        "verify_uncached_us": per_call_us(lambda: decode_token(token), args.iterations),
+        "verify_cached_us": per_call_us(lambda: verifier.verify(token), args.iterations),
+    }
+    for name, value in result.items():
+        print(f"{name:20s} {value:8.3f} us")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"auth_tokens_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump({"label": args.label, "iterations": args.iterations, **result}, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
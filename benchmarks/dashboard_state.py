@@ -0,0 +1,132 @@
+"""Dashboard state read latency as board history grows.
+
+Runs against a MongoDB server (``MONGO_URI``) in a scratch database that is
+dropped afterwards::
+
+    python -m benchmarks.dashboard_state --sizes 0,10000,100000,1000000
+
+For each history size it times reading the latest state of a unit:
+
+* ``shared_unindexed``: newest row of a collection holding state and history,
+  with no index (how the per-board collections were stored)
+* ``shared_indexed``: the same query with a ``(unit_ID, created_at)`` index
+* ``state_store``: ``BoardStateStore.get`` with caching disabled
+* ``state_store_cached``: ``BoardStateStore.get`` with its in-process cache
+
+Results are appended to ``benchmarks/results``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.load_dashboard import RESULTS_DIR, percentile
+from backend.externalservice.state import BoardStateStore
+from configuration.database import MONGO_URI
+
+INSERT_BATCH = 10000
+
+
+def history_rows(unit_ids, count, start):
+    for i in range(count):
+        yield {
+            "unit_ID": random.choice(unit_ids),
+            "t": random.randint(15, 40),
+            "h": random.randint(20, 90),
+            "w": random.randint(0, 100),
+            "created_at": start + timedelta(seconds=5 * i),
+        }
+
+
+async def grow(collection, unit_ids, count, start):
+    batch = []
+    for row in history_rows(unit_ids, count, start):
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def time_reads(read, unit_ids, reads):
+    latencies = []
+    for _ in range(reads):
+        unit_ID = random.choice(unit_ids)
+        started = time.perf_counter()
+        await read(unit_ID)
+        latencies.append(time.perf_counter() - started)
+    return {
+        "reads": reads,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="0,10000,100000,1000000", help="comma separated history sizes")
+    parser.add_argument("--units", type=int, default=3, help="number of units sharing the history")
+    parser.add_argument("--reads", type=int, default=2000, help="reads per indexed measurement")
+    parser.add_argument("--scan-reads", type=int, default=20, help="reads per unindexed measurement")
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URI)
+    db_name = f"bench_dashboard_state_{os.getpid()}"
+    db = client[db_name]
+    unit_ids = list(range(1, args.units + 1))
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    unindexed, indexed, states = db["SharedUnindexed"], db["SharedIndexed"], db["BoardState"]
+    await indexed.create_index([("unit_ID", 1), ("created_at", 1)])
+    await states.create_index("unit_ID", unique=True)
+    for unit_ID in unit_ids:
+        state = {"unit_ID": unit_ID, "t": 0, "h": 0, "w": 0, "eb": 0, "ups": 0, "x": 0, "y": 0}
+        await unindexed.insert_one(dict(state))
+        await indexed.insert_one(dict(state))
+        await states.insert_one(dict(state))
+    uncached, cached = BoardStateStore(states, ttl=0), BoardStateStore(states, ttl=60)
+
+    def newest(collection):
+        return lambda unit_ID: collection.find_one({"unit_ID": unit_ID}, sort=[("created_at", -1)])
+
+    results = []
+    current, start = 0, datetime(2024, 1, 1)
+    try:
+        for size in sizes:
+            added = size - current
+            if added > 0:
+                await grow(unindexed, unit_ids, added, start + timedelta(seconds=5 * current))
+                await grow(indexed, unit_ids, added, start + timedelta(seconds=5 * current))
+                current = size
+
+            result = {
+                "history": current,
+                "shared_unindexed": await time_reads(newest(unindexed), unit_ids, args.scan_reads),
+                "shared_indexed": await time_reads(newest(indexed), unit_ids, args.reads),
+                "state_store": await time_reads(uncached.get, unit_ids, args.reads),
+                "state_store_cached": await time_reads(cached.get, unit_ids, args.reads),
+            }
+            results.append(result)
+            print(f"history={current:9d}  " + "  ".join(
+                f"{name} p50 {result[name]['p50_ms']:8.3f} ms"
+                for name in ("shared_unindexed", "shared_indexed", "state_store", "state_store_cached")
+            ))
+    finally:
+        await client.drop_database(db_name)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"dashboard_state_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump({"label": args.label, "units": args.units, "sizes": results}, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
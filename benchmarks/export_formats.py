@@ -0,0 +1,91 @@
+"""Size and encode time of the bulk export formats against the graph JSON path.
+
+    python -m benchmarks.export_formats --rows 1000000
+
+Builds synthetic readings in memory (no database), then encodes them the way
+``/api/v1/graphdata`` does (IST rows serialized as one JSON body) and through
+each ``/api/v1/export`` writer in ``EXPORT_BATCH_SIZE`` batches.  Results are
+appended to ``benchmarks/results``.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.load_dashboard import RESULTS_DIR
+from backend.Graph.timeseries import graph_rows, to_epoch_ms
+from backend.export.router import EXPORT_BATCH_SIZE
+from backend.export.writers import EXPORT_FORMATS, pa
+
+
+def synthetic_docs(rows):
+    # Readings every 5 seconds with slowly drifting values, like the boards send
+    start = datetime(2024, 1, 1)
+    t, h, w = 25, 55, 50
+    docs = []
+    for i in range(rows):
+        t = min(40, max(15, t + random.choice((-1, 0, 0, 0, 0, 0, 1))))
+        h = min(90, max(20, h + random.choice((-1, 0, 0, 0, 0, 0, 1))))
+        w = min(100, max(0, w + random.choice((-1, 0, 0, 0, 0, 0, 0, 0, 1))))
+        docs.append({"unit_ID": 1, "created_at": start + timedelta(seconds=5 * i), "t": t, "h": h, "w": w, "eb": 1, "ups": 0})
+    return docs
+
+
+def encode_json(docs):
+    ts = np.array([to_epoch_ms(doc["created_at"]) for doc in docs], dtype=np.int64)
+    h = np.array([doc["h"] for doc in docs], dtype=np.float64)
+    t = np.array([doc["t"] for doc in docs], dtype=np.float64)
+    response = [["Time", "Humidity", "Temperature"]]
+    response.extend(graph_rows(ts, h, t))
+    return json.dumps({"data": response}).encode()
+
+
+def encode_export(fmt, docs):
+    writer = EXPORT_FORMATS[fmt][0]()
+    size = 0
+    for offset in range(0, len(docs), EXPORT_BATCH_SIZE):
+        size += len(writer.write(docs[offset:offset + EXPORT_BATCH_SIZE]))
+    return size + len(writer.close())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    args = parser.parse_args()
+
+    docs = synthetic_docs(args.rows)
+    results = {}
+
+    started = time.perf_counter()
+    size = len(encode_json(docs))
+    results["graph_json"] = {"bytes": size, "seconds": round(time.perf_counter() - started, 3)}
+
+    for fmt, (_, _, _, needs_arrow) in EXPORT_FORMATS.items():
+        if needs_arrow and pa is None:
+            print(f"{fmt}: skipped, pyarrow is not installed")
+            continue
+        started = time.perf_counter()
+        size = encode_export(fmt, docs)
+        results[fmt] = {"bytes": size, "seconds": round(time.perf_counter() - started, 3)}
+
+    baseline = results["graph_json"]
+    for name, result in results.items():
+        print(
+            f"{name:10s} {result['bytes'] / 1e6:9.2f} MB  {result['seconds']:7.3f} s  "
+            f"{baseline['bytes'] / result['bytes']:6.1f}x smaller  {baseline['seconds'] / result['seconds']:6.1f}x faster"
+        )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"export_formats_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump({"label": args.label, "rows": args.rows, "formats": results}, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""CPU time and bytes per point of the graph wire formats.
+
+    python -m benchmarks.graph_encodings --points 20000 --repeat 20
+
+Builds a synthetic shift-day series in memory (no database) and encodes it
+the way the graph snapshot is sent: the previous stdlib-json rows, and each
+``backend.Graph.frames`` format.  Results are written to
+``benchmarks/results``.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.load_dashboard import RESULTS_DIR
+from backend.broadcast.encoding import msgpack, orjson
+from backend.Graph.frames import encode_series, GRAPH_FORMATS, GRAPH_HEADER
+from backend.Graph.timeseries import graph_rows
+
+
+def synthetic_series(points):
+    # Readings every 5 seconds with slowly drifting whole-number values
+    rng = np.random.default_rng(1)
+    ts = 1727740800000 + 5000 * np.arange(points, dtype=np.int64)
+    h = np.clip(55 + np.cumsum(rng.integers(-1, 2, points)), 20, 90).astype(np.float64)
+    t = np.clip(25 + np.cumsum(rng.integers(-1, 2, points)), 15, 40).astype(np.float64)
+    return ts, h, t
+
+
+def encode_stdlib(series):
+    # The encoding used before: rows through json.dumps
+    rows = [GRAPH_HEADER] + graph_rows(*series)
+    return json.dumps({"data": rows}, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def measure(encode, series, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = encode(series)
+    return len(body), (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    args = parser.parse_args()
+
+    series = synthetic_series(args.points)
+    encoders = {"stdlib_json": encode_stdlib}
+    for fmt in GRAPH_FORMATS:
+        if fmt == "msgpack" and msgpack is None:
+            print("msgpack: skipped, msgpack is not installed")
+            continue
+        encoders[fmt] = lambda series, fmt=fmt: encode_series({}, series, fmt)
+    if orjson is None:
+        print("json: orjson is not installed, measuring the stdlib fallback")
+
+    results = {}
+    for name, encode in encoders.items():
+        size, seconds = measure(encode, series, args.repeat)
+        results[name] = {"bytes_per_point": round(size / args.points, 2), "us_per_point": round(seconds / args.points * 1e6, 4)}
+
+    baseline = results["stdlib_json"]
+    for name, result in results.items():
+        print(
+            f"{name:12s} {result['bytes_per_point']:7.2f} B/pt  {result['us_per_point']:8.4f} us/pt  "
+            f"{baseline['bytes_per_point'] / result['bytes_per_point']:6.1f}x smaller  "
+            f"{baseline['us_per_point'] / result['us_per_point']:6.1f}x faster"
+        )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"graph_encodings_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump({"label": args.label, "points": args.points, "formats": results}, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""End-to-end load harness that boots ``main.app`` against a local database.
+
+No MongoDB server is needed: by default the app runs on mongomock (``pip
+install mongomock-motor``); ``--db mongod`` starts a throwaway ``mongod``
+on a temporary directory and ``--db uri`` uses an existing server::
+
+    python -m benchmarks.harness --boards 20 --rate 2 --ws-clients 50 --label after
+    python -m benchmarks.harness --db mongod --duration 60 --baseline before --label after
+
+The app runs in a child uvicorn process with authentication on.  While N
+simulated boards send ``/api/v1/dashboard/{unit_ID}`` at a fixed rate, M
+dashboard (``/ws``) and M graph (``/ws/graphdata/{unit_ID}``) WebSocket clients
+stay connected and readers request graph data, monthly averages and reports.
+Throughput, p50/p99 latency, WebSocket delivery lag and the server's resident
+memory are printed and written to ``benchmarks/results/harness_<label>.json``.
+``--baseline`` compares against an earlier result file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import websockets
+
+from benchmarks.load_dashboard import RESULTS_DIR, percentile, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Thresholds wide enough that the simulated readings rarely raise alerts
+UNIT_SETTINGS = {
+    "humidity_high": 95, "humidity_low": 5,
+    "temp_high": 60, "temp_low": 0,
+    "water_level_high": 100, "water_level_low": 0,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"process exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"port {port} did not open within {timeout} seconds")
+
+
+def rss_bytes(pid: int):
+    # Resident memory of a process from /proc; None where /proc is unavailable
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- server side (child process) ---------------------------------------------
+
+def install_mongomock():
+    # Must run before main is imported: the routers bind collections at import time
+    from concurrent.futures import ThreadPoolExecutor
+    from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+    from motor.motor_asyncio import AsyncIOMotorCollection
+    from pymongo import ReplaceOne
+    import configuration.database as database
+
+    database.client = AsyncMongoMockClient()
+    database.db = database.client[database.MONGO_DB_NAME]
+    for name, value in list(vars(database).items()):
+        if isinstance(value, AsyncIOMotorCollection):
+            setattr(database, name, database.db[value.name])
+
+    # Report workers read through the same in-memory store
+    database._sync_db = database.client._AsyncMongoMockClient__client[database.MONGO_DB_NAME]
+
+    # mongomock lags pymongo's bulk_write signature; apply the operations one by one
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        for request in requests:
+            if isinstance(request, ReplaceOne):
+                await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+            else:
+                await self.update_one(request._filter, request._doc, upsert=request._upsert)
+    AsyncMongoMockCollection.bulk_write = bulk_write
+
+    return ThreadPoolExecutor
+
+
+def serve(args):
+    executor_class = install_mongomock() if args.db == "mongomock" else None
+
+    import uvicorn
+    import main
+    from backend.report.router import report_jobs
+
+    if executor_class is not None:
+        # Process workers could not see the in-memory database; render on threads
+        report_jobs._executor = executor_class(max_workers=report_jobs.max_workers)
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- load side (parent process) ----------------------------------------------
+
+class Server:
+    """The app (and a throwaway mongod when asked) in child processes."""
+
+    def __init__(self, args):
+        self.args = args
+        self.port = free_port()
+        self.process = None
+        self.mongod = None
+        self.mongod_dir = None
+
+    def start(self, env: dict):
+        env = dict(os.environ, **env)
+        if self.args.db == "mongod":
+            binary = self.args.mongod_bin or shutil.which("mongod")
+            if binary is None:
+                raise SystemExit("mongod not found; pass --mongod-bin or use --db mongomock")
+            mongo_port = free_port()
+            self.mongod_dir = tempfile.mkdtemp(prefix="humidity-bench-")
+            self.mongod = subprocess.Popen(
+                [binary, "--dbpath", self.mongod_dir, "--port", str(mongo_port), "--bind_ip", "127.0.0.1", "--quiet"],
+                stdout=subprocess.DEVNULL,
+            )
+            wait_for_port(mongo_port, 30, self.mongod)
+            env["MONGO_URI"] = f"mongodb://127.0.0.1:{mongo_port}/"
+        elif self.args.db == "uri":
+            env["MONGO_URI"] = self.args.mongo_uri
+            env["MONGO_DB_NAME"] = self.args.db_name
+
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.harness", "--serve", "--db", self.args.db, "--port", str(self.port)],
+            cwd=ROOT, env=env,
+        )
+        wait_for_port(self.port, 60, self.process)
+
+    def stop(self):
+        for process in (self.process, self.mongod):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self.mongod_dir:
+            shutil.rmtree(self.mongod_dir, ignore_errors=True)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def time(self, name: str, seconds: float):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def error(self, name: str):
+        self.errors.setdefault(name, []).append(1)
+
+    def summary(self, duration: float) -> dict:
+        names = sorted(set(self.latencies) | set(self.errors))
+        return {name: summarize(name, self.latencies.get(name, []), self.errors.get(name, []), duration) for name in names}
+
+
+async def timed_get(client, recorder, name, url, params=None):
+    started = time.perf_counter()
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        recorder.time(name, time.perf_counter() - started)
+    except httpx.HTTPError:
+        recorder.error(name)
+
+
+async def seed(client, unit_ids, history_hours, interval):
+    for unit_ID in unit_ids:
+        response = await client.post("/api/v1/settings/add_server", json=dict(UNIT_SETTINGS, unit_ID=unit_ID))
+        response.raise_for_status()
+
+    # Backfill through the batch route, so rollups and buffers are built as in production
+    end = datetime.now(timezone.utc)
+    steps = int(history_hours * 3600 / interval)
+    batch = []
+    for step in range(steps):
+        created_at = (end - timedelta(seconds=interval * (steps - step))).isoformat()
+        for unit_ID in unit_ids:
+            batch.append({"unit_ID": unit_ID, "t": random.randint(18, 35), "h": random.randint(30, 80),
+                          "w": random.randint(10, 90), "eb": 1, "ups": 0, "created_at": created_at})
+        if len(batch) >= 5000 or step == steps - 1:
+            response = await client.post("/api/v1/dashboard/batch", json=batch)
+            response.raise_for_status()
+            batch = []
+    await asyncio.sleep(1.5)  # Let the ingest buffer flush
+
+
+async def board(client, recorder, unit_ID, rate, deadline):
+    # Open-loop pacing: a slow response delays nothing but its own sample
+    interval = 1.0 / rate
+    next_at = time.perf_counter() + random.random() * interval
+    pending = set()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        params = {"t": random.randint(18, 35), "h": random.randint(30, 80), "w": random.randint(10, 90), "eb": 1, "ups": 0}
+        task = asyncio.create_task(timed_get(client, recorder, "dashboard", f"/api/v1/dashboard/{unit_ID}", params))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        next_at += interval
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def reader(client, recorder, name, deadline, request):
+    while time.perf_counter() < deadline:
+        url, params = request()
+        await timed_get(client, recorder, name, url, params)
+
+
+async def dashboard_socket(url, stats, deadline):
+    try:
+        async with websockets.connect(url, max_size=None) as socket_:
+            stats["connected"] += 1
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(socket_.recv(), remaining)
+                except asyncio.TimeoutError:
+                    return
+                stats["messages"] += 1
+    except (OSError, websockets.WebSocketException):
+        stats["disconnects"] += 1
+
+
+async def graph_socket(url, stats, deadline):
+    # Snapshot time from connect, then per-delta lag from the reading's timestamp
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as socket_:
+            stats["connected"] += 1
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    message = json.loads(await asyncio.wait_for(socket_.recv(), remaining))
+                except asyncio.TimeoutError:
+                    return
+                stats["messages"] += 1
+                if message.get("type") == "snapshot":
+                    stats["snapshot"].append(time.perf_counter() - started)
+                elif message.get("type") == "delta":
+                    now = datetime.now(timezone.utc)
+                    for row in message["data"]:
+                        stats["lag"].append((now - datetime.fromisoformat(row[0])).total_seconds())
+    except (OSError, websockets.WebSocketException):
+        stats["disconnects"] += 1
+
+
+def socket_summary(stats, duration) -> dict:
+    summary = {
+        "clients": stats["clients"],
+        "connected": stats["connected"],
+        "disconnects": stats["disconnects"],
+        "messages": stats["messages"],
+        "messages_per_s": round(stats["messages"] / duration, 1),
+    }
+    for name in ("snapshot", "lag"):
+        if name in stats:
+            summary[f"{name}_p50_ms"] = round(percentile(stats[name], 50) * 1000, 2)
+            summary[f"{name}_p99_ms"] = round(percentile(stats[name], 99) * 1000, 2)
+    return summary
+
+
+async def sample_memory(pid, samples, deadline):
+    while time.perf_counter() < deadline:
+        rss = rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(0.5)
+
+
+async def run(args, server: Server, token: str) -> dict:
+    base_url = f"http://127.0.0.1:{server.port}"
+    ws_url = f"ws://127.0.0.1:{server.port}"
+    unit_ids = list(range(1, args.boards + 1))
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=args.boards * 4 + 50)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        await seed(client, unit_ids, args.history_hours, args.history_interval)
+        memory = {"start": rss_bytes(server.process.pid)}
+
+        now = datetime.now(timezone.utc)
+        graph_params = {"start_time": (now - timedelta(hours=args.history_hours)).isoformat(), "end_time": now.isoformat()}
+        recorder = Recorder()
+        dashboard_stats = {"clients": args.ws_clients, "connected": 0, "disconnects": 0, "messages": 0}
+        graph_stats = {"clients": args.ws_clients, "connected": 0, "disconnects": 0, "messages": 0, "snapshot": [], "lag": []}
+        samples = []
+
+        deadline = time.perf_counter() + args.duration
+        tasks = [sample_memory(server.process.pid, samples, deadline)]
+        for unit_ID in unit_ids:
+            tasks.append(board(client, recorder, unit_ID, args.rate, deadline))
+        for index in range(args.ws_clients):
+            tasks.append(dashboard_socket(f"{ws_url}/ws?token={token}", dashboard_stats, deadline))
+            unit_ID = unit_ids[index % len(unit_ids)]
+            tasks.append(graph_socket(f"{ws_url}/ws/graphdata/{unit_ID}?token={token}", graph_stats, deadline))
+        for _ in range(args.graph_readers):
+            tasks.append(reader(client, recorder, "graph", deadline, lambda: (
+                f"/api/v1/graphdata/{random.choice(unit_ids)}", dict(graph_params, max_points=args.max_points))))
+        for _ in range(args.average_readers):
+            tasks.append(reader(client, recorder, "average", deadline, lambda: (
+                f"/average/{random.choice(unit_ids)}", {"month": now.month, "year": now.year})))
+        for _ in range(args.report_readers):
+            tasks.append(reader(client, recorder, "report", deadline, lambda: (
+                f"/download/{random.choice(['excel', 'pdf'])}/{random.choice(unit_ids)}", None)))
+        await asyncio.gather(*tasks)
+
+    memory["peak"] = max(samples, default=None)
+    memory["end"] = rss_bytes(server.process.pid)
+    return {
+        "http": recorder.summary(args.duration),
+        "ws_dashboard": socket_summary(dashboard_stats, args.duration),
+        "ws_graph": socket_summary(graph_stats, args.duration),
+        "server_rss_mb": {name: round(value / 2 ** 20, 1) if value else None for name, value in memory.items()},
+    }
+
+
+def print_result(result: dict, baseline: dict = None):
+    def change(section, name, field):
+        if not baseline:
+            return ""
+        old = baseline.get(section, {}).get(name, {}).get(field)
+        new = result[section][name][field]
+        if not old:
+            return ""
+        return f" ({(new - old) / old * 100:+.1f}%)"
+
+    for name, stats in result["http"].items():
+        print(
+            f"{name:10s} {stats['requests']:7d} req {stats['errors']:5d} err  "
+            f"{stats['throughput_rps']:8.1f} rps{change('http', name, 'throughput_rps')}  "
+            f"p50 {stats['p50_ms']:8.2f} ms{change('http', name, 'p50_ms')}  "
+            f"p99 {stats['p99_ms']:8.2f} ms{change('http', name, 'p99_ms')}"
+        )
+    for section in ("ws_dashboard", "ws_graph"):
+        stats = result[section]
+        line = f"{section:12s} {stats['connected']}/{stats['clients']} connected  {stats['messages_per_s']:8.1f} msg/s"
+        if "lag_p99_ms" in stats:
+            line += f"  lag p50 {stats['lag_p50_ms']:.2f} ms p99 {stats['lag_p99_ms']:.2f} ms"
+        print(line)
+    print(f"server rss  {result['server_rss_mb']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", choices=("mongomock", "mongod", "uri"), default="mongomock")
+    parser.add_argument("--mongod-bin", help="mongod executable for --db mongod (default: from PATH)")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/", help="server for --db uri")
+    parser.add_argument("--db-name", default="HumidityBenchmark", help="database for --db uri; it is not dropped")
+    parser.add_argument("--boards", type=int, default=10, help="simulated boards, one unit each")
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second per board")
+    parser.add_argument("--ws-clients", type=int, default=20, help="dashboard and graph WebSocket clients (each)")
+    parser.add_argument("--graph-readers", type=int, default=2)
+    parser.add_argument("--average-readers", type=int, default=1)
+    parser.add_argument("--report-readers", type=int, default=1)
+    parser.add_argument("--max-points", type=int, default=500, help="max_points of the graph requests")
+    parser.add_argument("--history-hours", type=float, default=6.0, help="history seeded before the run")
+    parser.add_argument("--history-interval", type=float, default=30.0, help="seconds between seeded readings")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    parser.add_argument("--baseline", help="label of an earlier run to compare with")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    # One signing key for the server and the token issued here
+    secret = os.environ.get("AUTH_SECRET") or secrets.token_hex(32)
+    os.environ["AUTH_SECRET"] = secret
+    from backend.userauth.tokens import issue_token
+    token = issue_token({"user_ID": 0, "username": "benchmark", "role": "admin"})["token"]
+
+    server = Server(args)
+    try:
+        server.start({"AUTH_SECRET": secret, "AUTH_ENABLED": "1"})
+        result = asyncio.run(run(args, server, token))
+    finally:
+        server.stop()
+
+    result.update({
+        "label": args.label,
+        "revision": git_revision(),
+        "db": args.db,
+        "config": {name: value for name, value in vars(args).items() if name not in ("serve", "port", "baseline")},
+    })
+
+    baseline = None
+    if args.baseline:
+        with open(os.path.join(RESULTS_DIR, f"harness_{args.baseline}.json")) as fh:
+            baseline = json.load(fh)
+    print_result(result, baseline)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"harness_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
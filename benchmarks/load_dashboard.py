@@ -0,0 +1,126 @@
+"""Concurrent load benchmark for dashboard ingest and graph queries.
+
+Runs against a live server, so the same script measures any version of the
+service (e.g. the blocking pymongo build and the Motor build)::
+
+    uvicorn main:app --port 9001
+    python -m benchmarks.load_dashboard --base-url http://localhost:9001 --label motor
+
+For each concurrency level the script keeps N dashboard writers and N graph
+readers busy for a fixed duration and reports completed requests per second
+and latency percentiles.  Results are appended to ``benchmarks/results``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def dashboard_writer(client, unit_ids, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        unit_ID = random.choice(unit_ids)
+        params = {"t": random.randint(15, 40), "h": random.randint(20, 90), "w": random.randint(0, 100)}
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"/api/v1/dashboard/{unit_ID}", params=params)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError:
+            errors.append(1)
+
+
+async def graph_reader(client, unit_ids, deadline, latencies, errors):
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=1)
+    params = {"start_time": start.isoformat(), "end_time": end.isoformat()}
+    while time.perf_counter() < deadline:
+        unit_ID = random.choice(unit_ids)
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"/api/v1/graphdata/{unit_ID}", params=params)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError:
+            errors.append(1)
+
+
+def summarize(name, latencies, errors, duration):
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def run_level(base_url, unit_ids, concurrency, duration, token=None):
+    limits = httpx.Limits(max_connections=concurrency * 2 + 10)
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, headers=headers) as client:
+        write_latencies, write_errors = [], []
+        read_latencies, read_errors = [], []
+        deadline = time.perf_counter() + duration
+        tasks = []
+        for _ in range(concurrency):
+            tasks.append(dashboard_writer(client, unit_ids, deadline, write_latencies, write_errors))
+            tasks.append(graph_reader(client, unit_ids, deadline, read_latencies, read_errors))
+        await asyncio.gather(*tasks)
+
+    return {
+        "concurrency": concurrency,
+        "dashboard": summarize("dashboard", write_latencies, write_errors, duration),
+        "graph": summarize("graph", read_latencies, read_errors, duration),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:9001")
+    parser.add_argument("--units", default="1,2,3", help="comma separated unit_IDs")
+    parser.add_argument("--levels", default="1,10,50,100", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    parser.add_argument("--token", help="access token from /api/v1/login for the graph queries")
+    args = parser.parse_args()
+
+    unit_ids = [int(u) for u in args.units.split(",")]
+    levels = [int(level) for level in args.levels.split(",")]
+
+    results = []
+    for concurrency in levels:
+        result = await run_level(args.base_url, unit_ids, concurrency, args.duration, args.token)
+        results.append(result)
+        print(
+            f"concurrency={concurrency:4d}  "
+            f"dashboard {result['dashboard']['throughput_rps']:8.1f} rps p99 {result['dashboard']['p99_ms']:8.2f} ms  "
+            f"graph {result['graph']['throughput_rps']:8.1f} rps p99 {result['graph']['p99_ms']:8.2f} ms"
+        )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"load_dashboard_{args.label}.json")
+    with open(path, "w") as fh:
+        json.dump({"label": args.label, "base_url": args.base_url, "levels": results}, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
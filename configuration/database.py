@@ -1,12 +1,61 @@
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
+from backend.metrics.monitors import mongo_listeners
 
-client = MongoClient('mongodb://localhost:27017/')
+# Connection settings (override through the environment)
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "Humidity")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
 
-db = client['Humidity']
+# Async client shared by all routers; every call must be awaited
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=mongo_listeners(),  # Command latency for /metrics
+)
+
+db = client[MONGO_DB_NAME]
 users = db['Users']
-Board_1 = db['Board_1']    
-Board_2 = db['Board_2']
-Board_3 = db["Board_3"]
+# Time-series readings of every unit, keyed by unit_ID and created_at
+readings = db['Readings']
+# Latest state of every board, one document per unit_ID
+board_state = db['BoardState']
 setting= db['Setting']
+# Threshold alerts raised and cleared per unit
+alert_events = db['AlertEvents']
+# Revoked login tokens, removed once they expire
+revoked_tokens = db['RevokedTokens']
+# Short-lived events shared between workers when BROADCAST_BUS=mongo
+broadcast_events = db['BroadcastEvents']
+
+# Pre-aggregated min/max/sum/count of t, h and w per unit
+Rollup_1m = db['Rollup_1m']
+Rollup_1h = db['Rollup_1h']
+Rollup_1d = db['Rollup_1d']
 
+_sync_db = None
 
+# Blocking client for worker processes that run outside the event loop
+def get_sync_db():
+    global _sync_db
+    if _sync_db is None:
+        sync_client = MongoClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        )
+        _sync_db = sync_client[MONGO_DB_NAME]
+    return _sync_db
@@ -0,0 +1,98 @@
+import logging
+import os
+from typing import List
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+import configuration.database as database
+
+logger = logging.getLogger("my_logger")
+
+# Build indexes on startup (turn off where index builds are managed elsewhere)
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") not in ("0", "false", "False")
+
+# (collection attribute, keys, options) for every index the queries rely on
+INDEXES = [
+    # History range scans per unit
+    ("readings", [("unit_ID", ASCENDING), ("created_at", ASCENDING)], {"name": "unit_ID_created_at"}),
+    ("board_state", [("unit_ID", ASCENDING)], {"name": "unit_ID", "unique": True}),
+    ("setting", [("unit_ID", ASCENDING)], {"name": "unit_ID"}),
+    ("users", [("username", ASCENDING)], {"name": "username"}),
+    ("users", [("user_ID", ASCENDING)], {"name": "user_ID"}),
+    ("alert_events", [("unit_ID", ASCENDING), ("created_at", ASCENDING)], {"name": "unit_ID_created_at"}),
+    ("revoked_tokens", [("expires_at", ASCENDING)], {"name": "expires_at", "expireAfterSeconds": 0}),
+    ("Rollup_1m", [("unit_ID", ASCENDING), ("bucket", ASCENDING)], {"name": "unit_ID_bucket", "unique": True}),
+    ("Rollup_1h", [("unit_ID", ASCENDING), ("bucket", ASCENDING)], {"name": "unit_ID_bucket", "unique": True}),
+    ("Rollup_1d", [("unit_ID", ASCENDING), ("bucket", ASCENDING)], {"name": "unit_ID_bucket", "unique": True}),
+]
+
+
+async def ensure_indexes() -> List[str]:
+    # create_index is a no-op for indexes that already exist
+    created = []
+    for attr, keys, options in INDEXES:
+        collection = getattr(database, attr)
+        try:
+            created.append(f"{collection.name}.{await collection.create_index(keys, **options)}")
+        except PyMongoError as e:
+            logger.error(f"Could not create index {options['name']} on {collection.name}: {e}")
+    logger.info(f"Indexes ready: {', '.join(created)}")
+    return created
+
+
+def _plan_stages(plan: dict) -> List[dict]:
+    # Flatten a winning plan tree into its stages, outermost first
+    plan = plan.get("queryPlan", plan)  # slot-based engine wraps the classic plan
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        stages.append({key: node[key] for key in ("stage", "indexName", "direction") if key in node})
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages
+
+
+def summarize_explain(name: str, collection: str, query: dict, explain: dict) -> dict:
+    planner = explain.get("queryPlanner", {})
+    stages = _plan_stages(planner.get("winningPlan", {}))
+    stats = explain.get("executionStats", {})
+    return {
+        "name": name,
+        "collection": collection,
+        "filter": query,
+        "stages": stages,
+        "indexes": [stage["indexName"] for stage in stages if "indexName" in stage],
+        "collection_scan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+        "in_memory_sort": any(stage.get("stage") == "SORT" for stage in stages),
+        "returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "time_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def main_queries(unit_ID: int, start, end) -> List[tuple]:
+    # (name, collection, filter, sort, limit) mirroring the hot API queries
+    history = {"unit_ID": unit_ID, "created_at": {"$gte": start, "$lt": end}}
+    return [
+        ("graph_history", database.readings, history, [("created_at", ASCENDING)], 0),
+        ("newest_reading", database.readings, history, [("created_at", DESCENDING)], 1),
+        ("board_state", database.board_state, {"unit_ID": unit_ID}, None, 1),
+        ("rollup_range", database.Rollup_1m, {"unit_ID": unit_ID, "bucket": {"$gte": start, "$lt": end}}, [("bucket", ASCENDING)], 0),
+        ("unit_setting", database.setting, {"unit_ID": unit_ID}, None, 1),
+        ("user_by_username", database.users, {"username": ""}, None, 1),
+        ("user_by_user_ID", database.users, {"user_ID": ""}, None, 1),
+    ]
+
+
+async def explain_queries(unit_ID: int, start, end) -> List[dict]:
+    plans = []
+    for name, collection, query, sort, limit in main_queries(unit_ID, start, end):
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        plans.append(summarize_explain(name, collection.name, query, await cursor.explain()))
+    return plans
@@ -0,0 +1,78 @@
+"""Copy the legacy per-board collections into Readings and BoardState.
+
+    python -m configuration.migrate_boards
+    python -m configuration.migrate_boards --board Board_1 --board Board_2 --drop-legacy
+
+History rows (those with a created_at) keep their _id and are upserted into
+Readings; the state document of each board is upserted into BoardState by
+unit_ID, so the command can be re-run safely.  State documents left in
+Readings by earlier versions are moved as well.  Boards whose unit has no
+Setting document are reported, since the API only serves units the Settings
+collection knows about.
+"""
+import argparse
+import asyncio
+import re
+from pymongo import ReplaceOne
+from configuration.database import db, readings, board_state, setting
+from configuration.indexes import ensure_indexes
+
+LEGACY_PATTERN = re.compile(r"^Board_\d+$")
+BATCH_SIZE = 1000
+
+
+async def copy_states(source) -> int:
+    operations = []
+    async for doc in source.find({"created_at": {"$exists": False}}, {"_id": 0}):
+        operations.append(ReplaceOne({"unit_ID": doc["unit_ID"]}, doc, upsert=True))
+    if operations:
+        await board_state.bulk_write(operations, ordered=True)  # Last state wins
+    return len(operations)
+
+
+async def copy_history(name: str) -> int:
+    copied = 0
+    operations = []
+    async for doc in db[name].find({"created_at": {"$exists": True}}):
+        operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(operations) >= BATCH_SIZE:
+            await readings.bulk_write(operations, ordered=False)
+            copied += len(operations)
+            operations = []
+    if operations:
+        await readings.bulk_write(operations, ordered=False)
+        copied += len(operations)
+    return copied
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Copy legacy Board_N collections into Readings and BoardState.")
+    parser.add_argument("--board", action="append", help="legacy collection to copy (repeatable, default all Board_N)")
+    parser.add_argument("--drop-legacy", action="store_true", help="drop each legacy collection after it is copied")
+    args = parser.parse_args()
+
+    names = args.board or sorted(n for n in await db.list_collection_names() if LEGACY_PATTERN.match(n))
+    await ensure_indexes()
+
+    moved = await copy_states(readings)
+    if moved:
+        await readings.delete_many({"created_at": {"$exists": False}})
+        print(f"Moved {moved} state documents from {readings.name}")
+
+    configured = {doc["unit_ID"] for doc in await setting.find({}, {"unit_ID": 1}).to_list(length=None) if "unit_ID" in doc}
+    for name in names:
+        copied = await copy_history(name)
+        states = await copy_states(db[name])
+        print(f"Copied {copied} readings and {states} state documents from {name}")
+
+        for unit_ID in await db[name].distinct("unit_ID"):
+            if unit_ID not in configured:
+                print(f"Warning: unit {unit_ID} from {name} has no Setting document")
+
+        if args.drop_legacy:
+            await db[name].drop()
+            print(f"Dropped {name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
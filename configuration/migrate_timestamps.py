@@ -0,0 +1,90 @@
+"""Convert readings stored as site-local wall time into UTC.
+
+    python -m configuration.migrate_timestamps --before 2024-11-01T06:00:00
+
+Earlier versions stored ``created_at``/``updated_at`` of readings as naive
+site-local time while every query treated stored times as UTC.  Readings
+inserted before ``--before`` (a UTC time, normally when this version was
+deployed) are converted on the server with the ``SITE_TIMEZONE`` rules, so
+daylight-saving changes are honoured.  Rows are selected by the insertion
+time in their ObjectId, since a stored ``created_at`` cannot tell a
+local-time row from a UTC one written just after the deploy.  The affected
+rollup buckets are then rebuilt.  A marker in the ``Migrations`` collection keeps the conversion from
+running twice; ``--force`` overrides it.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from configuration.database import db, readings
+from configuration.shift_day import SITE_TIMEZONE
+from backend.rollup.rollups import ROLLUP_COLLECTIONS, backfill_rollups, bucket_start
+
+MIGRATION_ID = "readings_utc"
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def local_to_utc(field: str, tz_name: str) -> dict:
+    # The stored parts are local wall time; rebuild the date in that zone
+    parts = {"$dateToParts": {"date": f"${field}"}}
+    return {"$cond": [
+        {"$eq": [{"$type": f"${field}"}, "date"]},
+        {"$let": {"vars": {"p": parts}, "in": {"$dateFromParts": {
+            "year": "$$p.year", "month": "$$p.month", "day": "$$p.day",
+            "hour": "$$p.hour", "minute": "$$p.minute", "second": "$$p.second",
+            "millisecond": "$$p.millisecond", "timezone": tz_name,
+        }}}},
+        f"${field}",
+    ]}
+
+
+async def rebuild_rollups(unit_ID: int, start: datetime, end: datetime):
+    # Buckets move by the zone offset, so clear a day of margin on both sides
+    start = bucket_start(start, "1d") - timedelta(days=1)
+    end = bucket_start(end, "1d") + timedelta(days=2)
+    for rollup in ROLLUP_COLLECTIONS.values():
+        await rollup.delete_many({"unit_ID": unit_ID, "bucket": {"$gte": start, "$lt": end}})
+    await backfill_rollups(unit_ID, start, end)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert local-time readings to UTC.")
+    parser.add_argument("--before", required=True, help="convert readings inserted before this UTC time (ISO 8601)")
+    parser.add_argument("--force", action="store_true", help="run even if the conversion was already recorded")
+    args = parser.parse_args()
+
+    before = datetime.fromisoformat(args.before)
+    migrations = db["Migrations"]
+    if not args.force and await migrations.find_one({"_id": MIGRATION_ID}):
+        print("Readings were already converted; use --force to run again")
+        return
+
+    # Rows written by the previous version, by insertion time; ObjectId.from_datetime reads naive as UTC
+    old_rows = {"_id": {"$lt": ObjectId.from_datetime(before)}}
+
+    # Range per unit before the conversion, for the rollup rebuild
+    ranges = await readings.aggregate([
+        {"$match": old_rows},
+        {"$group": {"_id": "$unit_ID", "start": {"$min": "$created_at"}, "end": {"$max": "$created_at"}}},
+    ]).to_list(length=None)
+
+    tz_name = SITE_TIMEZONE.zone
+    result = await readings.update_many(
+        old_rows,
+        [{"$set": {field: local_to_utc(field, tz_name) for field in TIMESTAMP_FIELDS}}],
+    )
+    print(f"Converted {result.modified_count} readings from {tz_name} to UTC")
+
+    for unit_range in ranges:
+        await rebuild_rollups(unit_range["_id"], unit_range["start"], unit_range["end"])
+        print(f"Rebuilt rollups of unit {unit_range['_id']}")
+
+    await migrations.replace_one(
+        {"_id": MIGRATION_ID},
+        {"_id": MIGRATION_ID, "before": before, "timezone": tz_name, "converted": result.modified_count, "ran_at": datetime.utcnow()},
+        upsert=True,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
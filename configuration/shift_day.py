@@ -0,0 +1,108 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pytz
+
+# Site-local time zone used for display and for the daily window
+SITE_TIMEZONE = pytz.timezone(os.getenv("SITE_TIMEZONE", "Asia/Kolkata"))
+# Local time at which each shift day (graph and report window) starts, HH:MM
+SHIFT_DAY_START = os.getenv("SHIFT_DAY_START", "08:30")
+
+# Short zone name for column headers and axis labels, e.g. "IST"
+LOCAL_TIME_LABEL = datetime.now(SITE_TIMEZONE).tzname()
+
+HOUR_MS = 3600 * 1000
+
+
+# Every timestamp is stored as naive UTC, the form MongoDB returns it in.
+# Naive input (e.g. a board clock) is read as site-local wall time.
+def to_utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = SITE_TIMEZONE.localize(dt)
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _offset_ms(ms: int) -> int:
+    moment = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    return int(moment.astimezone(SITE_TIMEZONE).utcoffset().total_seconds() * 1000)
+
+
+def local_offsets_ms(ms: np.ndarray) -> np.ndarray:
+    # UTC offset of each epoch-ms timestamp, looked up once per distinct hour
+    hours, inverse = np.unique(np.asarray(ms, dtype=np.int64) // HOUR_MS, return_inverse=True)
+    offsets = np.array([_offset_ms(int(hour) * HOUR_MS) for hour in hours], dtype=np.int64)
+    return offsets[inverse]
+
+
+def to_local_datetime64(ms: np.ndarray) -> np.ndarray:
+    # Epoch ms -> naive site-local datetime64[ms]
+    ms = np.asarray(ms, dtype=np.int64)
+    return (ms + local_offsets_ms(ms)).astype("datetime64[ms]")
+
+
+def _offset_suffix(offset_ms: int) -> str:
+    sign = "+" if offset_ms >= 0 else "-"
+    minutes = abs(offset_ms) // 60000
+    return f"{sign}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_local(ms: np.ndarray) -> np.ndarray:
+    # Vectorized epoch ms -> ISO-8601 strings in site-local time with offset
+    ms = np.asarray(ms, dtype=np.int64)
+    offsets = local_offsets_ms(ms)
+    text = np.datetime_as_string((ms + offsets).astype("datetime64[ms]"), unit="ms")
+    unique, inverse = np.unique(offsets, return_inverse=True)
+    suffixes = np.array([_offset_suffix(int(offset)) for offset in unique], dtype=object)[inverse]
+    return np.char.add(text, suffixes.astype(str)) if len(ms) else text
+
+
+def _parse_start(value: str) -> time:
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
+
+
+class ShiftDay:
+    """The daily window graphs and reports are built on.
+
+    A shift day starts at ``start`` local time and ends at the next day's
+    start; windows are half-open ``[start, end)`` in aware UTC.  Windows are
+    computed once per day and cached, including the one containing now.
+    """
+
+    def __init__(self, tz, start: time):
+        self.tz = tz
+        self.start = start
+        self._windows: Dict[date, Tuple[datetime, datetime]] = {}
+        self._current: Optional[Tuple[datetime, datetime]] = None
+
+    def window(self, day: Optional[date] = None) -> Tuple[datetime, datetime]:
+        # Window of the shift day that starts on ``day``, or the current one
+        if day is None:
+            return self.current()
+        window = self._windows.get(day)
+        if window is None:
+            if len(self._windows) > 1000:
+                self._windows.clear()
+            start = self.tz.localize(datetime.combine(day, self.start)).astimezone(timezone.utc)
+            end = self.tz.localize(datetime.combine(day + timedelta(days=1), self.start)).astimezone(timezone.utc)
+            window = self._windows[day] = (start, end)
+        return window
+
+    def day_of(self, moment: datetime) -> date:
+        local = moment.astimezone(self.tz)
+        return local.date() if local.time() >= self.start else local.date() - timedelta(days=1)
+
+    def current(self, now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+        now = now or datetime.now(timezone.utc)
+        window = self._current
+        if window is None or not window[0] <= now < window[1]:
+            window = self._current = self.window(self.day_of(now))
+        return window
+
+
+shift_day = ShiftDay(SITE_TIMEZONE, _parse_start(SHIFT_DAY_START))
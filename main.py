@@ -1,10 +1,20 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from backend.userauth.router import userRouter
-from backend.externalservice.router import BoardRouter
+from backend.externalservice.router import BoardRouter, ingest_buffer
 from backend.Graph.router import GraphRouter
 from backend.Settings.router import serverRouter
-from backend.report.router import ReportRouter
+from backend.report.router import ReportRouter, report_jobs
+from backend.diagnostics.router import DiagnosticsRouter
+from backend.alerts.router import AlertRouter
+from backend.export.router import ExportRouter
+from backend.metrics.router import MetricsRouter
+from backend.site.router import SiteRouter
+from backend.metrics.monitors import loop_lag_monitor
+from backend.retention.retention import retention_task
+from backend.broadcast.bus import message_bus
+from backend.userauth.tokens import require_user, revocations
+from configuration.indexes import MONGO_ENSURE_INDEXES, ensure_indexes
 
 app = FastAPI()
 
@@ -17,7 +27,32 @@ app.add_middleware(
 )
 
 app.include_router(userRouter)
-app.include_router(serverRouter)
+# Board ingest routes stay open for the devices; the rest need a login token
+app.include_router(serverRouter, dependencies=[Depends(require_user)])
 app.include_router(BoardRouter)
-app.include_router(GraphRouter)
-app.include_router(ReportRouter)
\ No newline at end of file
+app.include_router(GraphRouter, dependencies=[Depends(require_user)])
+app.include_router(ReportRouter, dependencies=[Depends(require_user)])
+app.include_router(DiagnosticsRouter, dependencies=[Depends(require_user)])
+app.include_router(AlertRouter, dependencies=[Depends(require_user)])
+app.include_router(ExportRouter, dependencies=[Depends(require_user)])
+app.include_router(SiteRouter, dependencies=[Depends(require_user)])
+# Scraped by Prometheus; guarded by METRICS_TOKEN instead of a login token
+app.include_router(MetricsRouter)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if MONGO_ENSURE_INDEXES:
+        await ensure_indexes()
+    await message_bus.start()
+    await revocations.load()
+    ingest_buffer.start()
+    loop_lag_monitor.start()
+    retention_task.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await retention_task.stop()
+    await loop_lag_monitor.stop()
+    await ingest_buffer.stop()
+    await message_bus.stop()
+    report_jobs.shutdown()
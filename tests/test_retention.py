@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from backend.retention.archive import ArchiveStore, merge_columns, month_start, to_columns
+from backend.rollup.rollups import column_rollups
+
+BASE = datetime(2024, 1, 1)
+
+
+def readings(minutes, t=200, h=500):
+    return [{"unit_ID": 1, "created_at": BASE + timedelta(minutes=m), "t": t + i, "h": h} for i, m in enumerate(minutes)]
+
+
+def test_late_reading_is_merged_into_archived_month(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    month = month_start(BASE)
+    store.write(1, month, to_columns(readings(range(100))))
+    store.write(1, month, to_columns([{"unit_ID": 1, "created_at": BASE + timedelta(minutes=30, seconds=5), "t": 999}]))
+
+    columns = store.read(1, BASE, BASE + timedelta(days=31))
+    assert len(columns["created_at"]) == 101
+    assert (columns["created_at"][1:] >= columns["created_at"][:-1]).all()
+
+
+def test_repeated_write_keeps_rows_once(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    month = month_start(BASE)
+    store.write(1, month, to_columns(readings(range(10))))
+    store.write(1, month, to_columns(readings(range(5, 15), t=205)))
+
+    columns = store.read(1, BASE, BASE + timedelta(days=31))
+    assert columns["created_at"].tolist() == sorted(set(columns["created_at"].tolist()))
+    assert len(columns["created_at"]) == 15
+
+
+def test_rollups_combine_archived_and_raw_rows():
+    archived = to_columns(readings(range(100)))
+    # A late reading plus a raw row that was archived already (interrupted run)
+    raw = to_columns([{"unit_ID": 1, "created_at": BASE + timedelta(minutes=30, seconds=5), "t": 999}] + readings([0]))
+
+    day, = column_rollups(1, merge_columns(archived, raw), "1d")
+    assert day["bucket"] == BASE
+    assert day["t_count"] == 101 and day["t_sum"] == sum(range(200, 300)) + 999
+    assert day["t_min"] == 200 and day["t_max"] == 999
+    assert day["h_count"] == 100 and day["w_count"] == 0 and day["w_min"] is None
+
+    minute = {doc["bucket"]: doc for doc in column_rollups(1, merge_columns(archived, raw), "1m")}
+    assert minute[BASE + timedelta(minutes=30)]["t_count"] == 2